@@ -1,48 +1,102 @@
+from datetime import timedelta
+
 from django.contrib import admin
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from import_export.admin import ImportExportModelAdmin
-from .models import Company, Director, Shareholder, ContactPerson, ComplianceInformation
+from .models import Company, Director, Shareholder, ContactPerson, ComplianceInformation, next_ar_due_date
 from import_export.admin import ExportMixin
 from import_export import resources, fields
+from import_export.instance_loaders import CachedInstanceLoader
 from django.forms.models import BaseInlineFormSet
-from import_export.widgets import ForeignKeyWidget
+from import_export.widgets import DateWidget, ForeignKeyWidget
 from django.utils.html import format_html
-from django.urls import reverse
-from .models import DocumentTemplate, EmailTemplate
+from django.utils import timezone
+from django.urls import path, reverse
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
+from django.contrib.admin import helpers
+from django.shortcuts import get_object_or_404, redirect, render
+from django.conf import settings
+from django.core.paginator import Paginator
+from .forms import BulkDocumentForm
+from .utils.doc_jobs import enqueue_bulk_document_job
+from .models import DocumentTemplate, EmailTemplate, DocumentJob, OutboxEmail, ReminderDispatch
+from .utils.email_templates import EMAIL_CONTEXT_SCHEMA
+from .utils.export_stream import EXPORT_FORMATS, streaming_export_response
+from .utils.shareholder_sync import remove_shareholders, sync_shareholders
 
 
 # --- INLINE ADMIN CONFIGS ---
 
-class DirectorInlineFormSet(BaseInlineFormSet):
-    def save_new(self, form, commit=True):
-        obj = super().save_new(form, commit)
-        if form.cleaned_data.get('is_shareholder'):
-            # Only create if not already a shareholder
-            existing = Shareholder.objects.filter(
-                company=obj.company,
-                full_name=obj.full_name,
-                ic_passport=obj.ic_passport
-            ).exists()
-            if not existing:
-                Shareholder.objects.create(
-                    company=obj.company,
-                    full_name=obj.full_name,
-                    ic_passport=obj.ic_passport,
-                    address_line1=obj.address_line1,
-                    address_line2=obj.address_line2,
-                    address_line3=obj.address_line3,
-                    postcode=obj.postcode,
-                    town=obj.town,
-                    state=obj.state,
-                    phone_number=obj.phone_number,
-                    email=obj.email,
-                    shareholding=0,  # You can change default
-                    shareholder_type='ordinary'
-                )
-        return obj
-    
-class DirectorInline(admin.StackedInline):
+class LazyRowsFormSet(BaseInlineFormSet):
+    """
+    Inline formset that, when `lazy_url` is set (see LazyRowsInlineMixin),
+    leaves the existing rows out of the change form: only the blank "add"
+    forms are rendered and posted, and existing rows are listed from
+    `lazy_url` after the page has loaded.
+    """
+    lazy_url = None
+    lazy_total = 0
+
+    def __init__(self, *args, **kwargs):
+        if self.lazy_url:
+            kwargs['queryset'] = self.model._default_manager.none()
+        super().__init__(*args, **kwargs)
+
+
+class LazyRowsInlineMixin:
+    """
+    For companies with more than ADMIN_INLINE_LAZY_THRESHOLD rows, render the
+    inline lazily: existing rows come page by page from the company's
+    related-rows endpoint and are edited on their own change pages.
+    """
+    template = "admin/companies/company/lazy_stacked_inline.html"
+    lazy_kind = None  # key of CompanyAdmin.LAZY_RELATED
+    count_attr = None  # annotated by CompanyAdmin.get_queryset
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        if obj is None or obj.pk is None:
+            return formset
+        total = getattr(obj, self.count_attr, None)
+        if total is None:
+            total = self.model._default_manager.filter(company=obj).count()
+        if total <= getattr(settings, "ADMIN_INLINE_LAZY_THRESHOLD", 10):
+            return formset
+        return type(f"Lazy{formset.__name__}", (formset,), {
+            "lazy_url": reverse('admin:companies_company_related', args=[obj.pk, self.lazy_kind]),
+            "lazy_total": total,
+        })
+
+
+def previous_identities(forms):
+    """{pk: (full_name, ic_passport) before the edit} for director forms that changed either."""
+    return {
+        form.instance.pk: (form.initial.get('full_name'), form.initial.get('ic_passport'))
+        for form in forms
+        if form.instance.pk and {'full_name', 'ic_passport'} & set(form.changed_data)
+    }
+
+
+class DirectorInlineFormSet(LazyRowsFormSet):
+    def save(self, commit=True):
+        saved = super().save(commit)
+        if commit:
+            # New and edited directors of the whole formset in one batch
+            sync_shareholders(
+                [(obj, None) for obj in self.new_objects] + list(self.changed_objects),
+                previous=previous_identities(self.initial_forms),
+            )
+            remove_shareholders(self.deleted_objects)
+        return saved
+
+
+class DirectorInline(LazyRowsInlineMixin, admin.StackedInline):
     model = Director
     formset = DirectorInlineFormSet
+    lazy_kind = 'directors'
+    count_attr = 'director_count'
     extra = 1
     show_change_link = True
     fieldsets = [
@@ -63,8 +117,11 @@ class DirectorInline(admin.StackedInline):
         }),
     ]
 
-class ShareholderInline(admin.StackedInline):
+class ShareholderInline(LazyRowsInlineMixin, admin.StackedInline):
     model = Shareholder
+    formset = LazyRowsFormSet
+    lazy_kind = 'shareholders'
+    count_attr = 'shareholder_count'
     extra = 0
     show_change_link = True
     fieldsets = [
@@ -130,7 +187,7 @@ class CompanyResource(resources.ModelResource):
     # Company fields
     company_name = fields.Field(attribute='company_name')
     ssm_number = fields.Field(attribute='ssm_number')
-    incorporation_date = fields.Field(attribute='incorporation_date')
+    incorporation_date = fields.Field(attribute='incorporation_date', widget=DateWidget())
     amr_cosec_branch = fields.Field(attribute='amr_cosec_branch')
 
     # Compliance info
@@ -143,6 +200,7 @@ class CompanyResource(resources.ModelResource):
     class Meta:
         model = Company
         import_id_fields = ['ssm_number']  # use this to check for existing records
+        instance_loader_class = CachedInstanceLoader  # existing companies in one query, not one per row
         skip_unchanged = True
         report_skipped = True
         fields = (
@@ -157,7 +215,12 @@ class CompanyResource(resources.ModelResource):
             'auditor',
             'tax_agent',
         )
-        
+
+    def before_import_row(self, row, **kwargs):
+        # SSM numbers are stored upper-case (Company.save); match them that way
+        if row.get('ssm_number'):
+            row['ssm_number'] = str(row['ssm_number']).strip().upper()
+
 
 # --- MAIN ADMIN REGISTRATION ---
 
@@ -167,6 +230,13 @@ class EmailTemplateAdmin(admin.ModelAdmin):
     search_fields = ("name", "subject", "body")
     ordering = ("-created_at",)
 
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        form.base_fields["body"].help_text = "Placeholders: " + ", ".join(
+            "{{ %s }}" % name for name in EMAIL_CONTEXT_SCHEMA
+        )
+        return form
+
 
 @admin.register(DocumentTemplate)
 class DocumentTemplateAdmin(admin.ModelAdmin):
@@ -183,13 +253,222 @@ class DocumentTemplateAdmin(admin.ModelAdmin):
     file_url_link.short_description = "Template Link"
 
 
+@admin.register(DocumentJob)
+class DocumentJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'company', 'template', 'action', 'status', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status', 'action')
+    search_fields = ('company__company_name', 'template__name')
+    ordering = ('-created_at',)
+    list_select_related = ('company', 'template')
+    readonly_fields = [f.name for f in DocumentJob._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(ReminderDispatch)
+class ReminderDispatchAdmin(admin.ModelAdmin):
+    list_display = ('company', 'stage', 'cycle_year', 'anniversary_date', 'test_mode', 'sent_at')
+    list_filter = ('stage', 'cycle_year', 'test_mode')
+    search_fields = ('company__company_name', 'company__ssm_number')
+    list_select_related = ('company',)
+    readonly_fields = [f.name for f in ReminderDispatch._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('id', 'subject', 'company', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'company__company_name')
+    list_select_related = ('company',)
+    readonly_fields = [f.name for f in OutboxEmail._meta.fields]
+    actions = ['retry_now']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Retry selected e-mails now")
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status=OutboxEmail.STATUS_SENT).update(
+            status=OutboxEmail.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now(), locked_until=None,
+        )
+        self.message_user(request, f"{updated} e-mail(s) queued for another attempt.")
+
+
+class ARDueFilter(admin.SimpleListFilter):
+    """Annual return due-date windows, matched on the indexed anniversary_md column."""
+    title = 'annual return due'
+    parameter_name = 'ar_due'
+
+    WINDOWS = {
+        'past30': ('Due in the last 30 days', -30, -1),
+        '7': ('Due in the next 7 days', 0, 7),
+        '30': ('Due in the next 30 days', 0, 30),
+        '60': ('Due in the next 60 days', 0, 60),
+        '90': ('Due in the next 90 days', 0, 90),
+    }
+
+    def lookups(self, request, model_admin):
+        return [(key, label) for key, (label, _, _) in self.WINDOWS.items()]
+
+    def queryset(self, request, queryset):
+        if self.value() not in self.WINDOWS:
+            return queryset
+        _, start, end = self.WINDOWS[self.value()]
+        today = timezone.localdate()
+        return queryset.ar_due_between(today + timedelta(days=start), today + timedelta(days=end))
+
+
 @admin.register(Company)
 class CompanyAdmin(ImportExportModelAdmin, ExportMixin, admin.ModelAdmin):
     resource_class = CompanyResource
 
-    list_display = ('company_name', 'ssm_number', 'incorporation_date', 'amr_cosec_branch', 'generate_doc_button')
+    list_display = (
+        'company_name', 'ssm_number', 'incorporation_date', 'amr_cosec_branch',
+        'director_count', 'shareholder_count', 'next_ar_due', 'latest_ar_filed', 'bo_declaration',
+        'generate_doc_button',
+    )
+    list_filter = ('amr_cosec_branch', ARDueFilter)
+    list_select_related = ('compliance_info',)
     search_fields = ('company_name', 'ssm_number')
     inlines = [DirectorInline, ShareholderInline, ContactPersonInline, ComplianceInformationInline]
+    actions = ['bulk_generate_documents']
+    # Adds streaming CSV/XLSX export links next to Import/Export
+    import_export_change_list_template = "admin/companies/company/change_list_import_export.html"
+
+    # Lazily listed inline rows: kind → (model, columns)
+    LAZY_RELATED = {
+        'directors': (Director, ('full_name', 'ic_passport', 'email', 'appointment_date', 'resignation_date', 'is_shareholder')),
+        'shareholders': (Shareholder, ('full_name', 'ic_passport', 'email', 'shareholding', 'shareholder_type')),
+    }
+
+    def get_urls(self):
+        return [
+            path(
+                'export-stream/<str:file_format>/',
+                self.admin_site.admin_view(self.stream_export_view),
+                name='companies_company_export_stream',
+            ),
+            path(
+                '<path:object_id>/related/<str:kind>/',
+                self.admin_site.admin_view(self.related_rows_view),
+                name='companies_company_related',
+            ),
+        ] + super().get_urls()
+
+    def related_rows_view(self, request, object_id, kind):
+        """One page of a company's directors or shareholders, as an HTML fragment for the lazy inline."""
+        if kind not in self.LAZY_RELATED:
+            raise Http404("Unknown related rows.")
+        company = get_object_or_404(Company.objects.only('pk'), pk=object_id)
+        if not self.has_view_or_change_permission(request, company):
+            raise PermissionDenied
+        model, columns = self.LAZY_RELATED[kind]
+        rows = model.objects.filter(company=company).only('pk', *columns).order_by('pk')
+        page = Paginator(rows, getattr(settings, "ADMIN_INLINE_PAGE_SIZE", 25)).get_page(request.GET.get('page'))
+        opts = model._meta
+        return render(request, 'admin/companies/company/related_rows.html', {
+            'page': page,
+            'headers': [opts.get_field(name).verbose_name for name in columns],
+            'rows': [
+                (reverse(f'admin:{opts.app_label}_{opts.model_name}_change', args=[obj.pk]),
+                 [getattr(obj, name) for name in columns])
+                for obj in page.object_list
+            ],
+            'add_url': f"{reverse(f'admin:{opts.app_label}_{opts.model_name}_add')}?company={company.pk}",
+            'verbose_name': opts.verbose_name,
+        })
+
+    def stream_export_view(self, request, file_format):
+        """The companies the changelist shows (search and filters applied), streamed as CSV or XLSX."""
+        if not self.has_export_permission(request):
+            raise PermissionDenied
+        if file_format not in EXPORT_FORMATS:
+            raise Http404("Unknown export format.")
+        queryset = self.get_changelist_instance(request).get_queryset(request)
+        # One JOIN instead of a query per company for the compliance_info__ columns
+        queryset = queryset.select_related('compliance_info')
+        return streaming_export_response(CompanyResource(), queryset, file_format, "companies")
+
+    @admin.action(description="Generate documents for selected companies")
+    def bulk_generate_documents(self, request, queryset):
+        companies_count = queryset.count()
+        if 'apply' in request.POST:
+            form = BulkDocumentForm(request.POST, companies_count=companies_count)
+            if form.is_valid():
+                company_ids = list(queryset.values_list('id', flat=True))
+                job = enqueue_bulk_document_job(
+                    company_ids,
+                    form.cleaned_data['template'],
+                    form.cleaned_data['output_format'],
+                    request.user,
+                )
+                self.message_user(request, f"Queued {form.cleaned_data['template'].name} for {len(company_ids)} companies (job #{job.id}).")
+                return redirect('document_job_status', job_id=job.id)
+        else:
+            form = BulkDocumentForm()
+
+        preview = list(queryset.order_by('company_name')[:20])
+        return render(request, 'admin/companies/company/bulk_generate.html', {
+            **self.admin_site.each_context(request),
+            'title': "Generate documents",
+            'opts': self.model._meta,
+            'form': form,
+            'queryset': queryset.select_related(None).only('pk'),
+            'companies_count': companies_count,
+            'preview': preview,
+            'preview_remaining': companies_count - len(preview),
+            'select_across': request.POST.get('select_across', '0'),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+
+    def get_queryset(self, request):
+        # Counts as correlated subqueries (no JOIN fan-out); each uses the (company, ...) index
+        def count_of(model):
+            return Coalesce(Subquery(
+                model.objects.filter(company=OuterRef('pk')).order_by()
+                .values('company').annotate(n=Count('pk')).values('n')
+            ), 0)
+
+        return super().get_queryset(request).annotate(
+            director_count=count_of(Director),
+            shareholder_count=count_of(Shareholder),
+        )
+
+    def director_count(self, obj):
+        return obj.director_count
+    director_count.short_description = "Directors"
+    director_count.admin_order_field = 'director_count'
+
+    def shareholder_count(self, obj):
+        return obj.shareholder_count
+    shareholder_count.short_description = "Shareholders"
+    shareholder_count.admin_order_field = 'shareholder_count'
+
+    def next_ar_due(self, obj):
+        return next_ar_due_date(obj.incorporation_date, timezone.localdate())
+    next_ar_due.short_description = "Next AR due"
+
+    def _compliance(self, obj):
+        try:
+            return obj.compliance_info
+        except ComplianceInformation.DoesNotExist:
+            return None
+
+    def latest_ar_filed(self, obj):
+        compliance = self._compliance(obj)
+        return compliance.latest_annual_return_filed if compliance else None
+    latest_ar_filed.short_description = "Latest AR filed"
+    latest_ar_filed.admin_order_field = 'compliance_info__latest_annual_return_filed'
+
+    def bo_declaration(self, obj):
+        compliance = self._compliance(obj)
+        return compliance.beneficial_owner_declaration if compliance else None
+    bo_declaration.short_description = "BO declaration"
+    bo_declaration.admin_order_field = 'compliance_info__beneficial_owner_declaration'
 
     def generate_doc_button(self, obj):
         url = reverse('choose_template', args=[obj.id])
@@ -207,25 +486,19 @@ class DirectorAdmin(ImportExportModelAdmin):
 
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
-
-        if obj.is_shareholder:
-            # Check if already exists to prevent duplication
-            if not Shareholder.objects.filter(company=obj.company, full_name=obj.full_name).exists():
-                Shareholder.objects.create(
-                    company=obj.company,
-                    full_name=obj.full_name,
-                    ic_passport=obj.ic_passport,
-                    address_line1=obj.address_line1,
-                    address_line2=obj.address_line2,
-                    address_line3=obj.address_line3,
-                    postcode=obj.postcode,
-                    town=obj.town,
-                    state=obj.state,
-                    phone_number=obj.phone_number,
-                    email=obj.email,
-                    shareholding=0,  # User needs to fill this later
-                    shareholder_type='ordinary'
-                )
+        if change:
+            sync_shareholders([(obj, form.changed_data)], previous=previous_identities([form]))
+        else:
+            sync_shareholders([(obj, None)])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        remove_shareholders([obj])
+
+    def delete_queryset(self, request, queryset):
+        directors = list(queryset)
+        super().delete_queryset(request, queryset)
+        remove_shareholders(directors)
 
 @admin.register(Shareholder)
 class ShareholderAdmin(ImportExportModelAdmin):
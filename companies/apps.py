@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CompaniesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'companies'
+
+    def ready(self):
+        # Registers the signal handlers that drop cached PDFs when company data changes
+        from .utils import pdf_cache  # noqa: F401
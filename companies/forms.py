@@ -1,5 +1,6 @@
 from django import forms
-from .models import Director
+from django.conf import settings
+from .models import Director, DocumentJob, DocumentTemplate
 
 class DirectorForm(forms.ModelForm):
     class Meta:
@@ -33,3 +34,31 @@ class DirectorForm(forms.ModelForm):
     class Meta:
         model = Director
         fields = '__all__'
+
+
+class BulkDocumentForm(forms.Form):
+    template = forms.ModelChoiceField(
+        queryset=DocumentTemplate.objects.order_by('category', 'name'),
+        label="Document template",
+    )
+    output_format = forms.ChoiceField(
+        choices=DocumentJob.OUTPUT_CHOICES,
+        initial="zip",
+        widget=forms.RadioSelect,
+        label="Output",
+    )
+
+    def __init__(self, *args, companies_count=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.companies_count = companies_count
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # A merged PDF is composed and converted in one piece; keep each job to a bounded run
+        max_companies = getattr(settings, "DOC_BULK_PDF_MAX_COMPANIES", 200)
+        if cleaned_data.get('output_format') == "pdf" and self.companies_count > max_companies:
+            raise forms.ValidationError(
+                f"A merged PDF can include at most {max_companies} companies "
+                f"({self.companies_count} selected). Choose ZIP or select fewer companies."
+            )
+        return cleaned_data
@@ -0,0 +1,71 @@
+import io
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from docxtpl import DocxTemplate
+
+from companies.utils.compiled_docx import CompiledDocxTemplate
+
+
+def _director_contexts(count):
+    directors = [{"name": f"DIRECTOR {i}", "ic": f"900101-14-{i:04d}"} for i in range(1, count + 1)]
+    base = {
+        "company_name": "BENCHMARK SDN. BHD.",
+        "ssm_number": "202301000001",
+        "today": "01 January 2025",
+        "generated_date": "01 January 2025",
+        "directors": directors,
+        "director_rows": [
+            {"left": {"name": d["name"]}, "right": None} for d in directors
+        ],
+    }
+    for d in directors:
+        ctx = dict(base)
+        ctx.update({"director_name": d["name"], "director_ic": d["ic"], "director_address": "", "director_email": ""})
+        yield ctx
+
+
+class Command(BaseCommand):
+    help = 'Compare per-director rendering: DocxTemplate per director vs one CompiledDocxTemplate'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--template',
+            default=os.path.join(settings.BASE_DIR, 'templates', 'docs', 'template.docx'),
+            help='Path to the .docx template (default: bundled templates/docs/template.docx)'
+        )
+        parser.add_argument(
+            '--counts',
+            default='1,5,10,25,50,100',
+            help='Comma-separated director counts to benchmark'
+        )
+
+    def handle(self, *args, **kwargs):
+        with open(kwargs['template'], 'rb') as f:
+            template_bytes = f.read()
+        counts = [int(c) for c in kwargs['counts'].split(',') if c.strip()]
+
+        started = time.perf_counter()
+        compiled = CompiledDocxTemplate(template_bytes)
+        compile_time = time.perf_counter() - started
+        self.stdout.write(f"Compile once: {compile_time * 1000:.1f} ms")
+        self.stdout.write(f"{'directors':>10} {'docxtpl (s)':>12} {'compiled (s)':>13} {'speedup':>8}")
+
+        for count in counts:
+            contexts = list(_director_contexts(count))
+
+            started = time.perf_counter()
+            for ctx in contexts:
+                doc = DocxTemplate(io.BytesIO(template_bytes))
+                doc.render(ctx)
+                doc.save(io.BytesIO())
+            naive = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for ctx in contexts:
+                compiled.render(ctx)
+            fast = time.perf_counter() - started
+
+            self.stdout.write(f"{count:>10} {naive:>12.3f} {fast:>13.3f} {naive / fast if fast else 0:>7.1f}x")
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from companies.models import Company, Director, Shareholder
+from companies.utils.compiled_docx import CompiledDocxTemplate
+from companies.utils.doc_context import CompanyDocumentContext, document_companies
+from companies.utils.parallel_render import render_documents
+from companies.utils.template_cache import TemplateCache
+from companies.utils.word_to_pdf import LibreOfficeError, convert_docx_to_pdf
+from companies.utils.zip_stream import stream_zip
+
+BENCHMARK_URL = "https://benchmark.invalid/template.docx"
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _synthetic_company(directors):
+    company = Company.objects.create(
+        company_name=f"BENCHMARK {directors} DIRECTORS SDN. BHD.",
+        ssm_number=f"BENCH-{directors}-{time.monotonic_ns()}",
+        incorporation_date=date(2015, 6, 1),
+        nature_of_business_1="BENCHMARK",
+    )
+    Director.objects.bulk_create([
+        Director(
+            company=company,
+            full_name=f"DIRECTOR {i}",
+            ic_passport=f"900101-14-{i:04d}",
+            email=f"director{i}@example.com",
+            appointment_date=date(2015, 6, 1),
+        )
+        for i in range(1, directors + 1)
+    ])
+    Shareholder.objects.bulk_create([
+        Shareholder(company=company, full_name=f"DIRECTOR {i}", ic_passport=f"900101-14-{i:04d}", shareholding=100)
+        for i in range(1, min(directors, 5) + 1)
+    ])
+    return company
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the document pipeline stage by stage on synthetic companies (offline; data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--template',
+            default=os.path.join(settings.BASE_DIR, 'templates', 'docs', 'template.docx'),
+            help='Path to the .docx template (default: bundled templates/docs/template.docx)'
+        )
+        parser.add_argument(
+            '--counts',
+            default='1,10,50,100,200',
+            help='Comma-separated director counts, one synthetic company each'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Runs per count; timings are the median (default: 3)'
+        )
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='Also time LibreOffice PDF conversion of the single document (needs soffice)'
+        )
+        parser.add_argument(
+            '--json',
+            dest='json_path',
+            help="Write results as JSON to this file ('-' for stdout)"
+        )
+
+    def handle(self, *args, **kwargs):
+        with open(kwargs['template'], 'rb') as f:
+            template_bytes = f.read()
+        counts = [int(c) for c in kwargs['counts'].split(',') if c.strip()]
+        repeat = max(1, kwargs['repeat'])
+
+        cache_dir = tempfile.mkdtemp(prefix="bench-template-cache-")
+        try:
+            results = self.run(template_bytes, counts, repeat, kwargs['convert'], cache_dir)
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+        report = {
+            "benchmark": "documents",
+            "created_at": timezone.now().isoformat(),
+            "template": os.path.basename(kwargs['template']),
+            "template_sha256": hashlib.sha256(template_bytes).hexdigest(),
+            "repeat": repeat,
+            "environment": {
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "platform": platform.platform(),
+                "database": connection.vendor,
+                "render_executor": getattr(settings, "DOC_RENDER_EXECUTOR", "thread"),
+                "render_workers": getattr(settings, "DOC_RENDER_WORKERS", 4),
+            },
+            "results": results,
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+        if kwargs['json_path'] == '-':
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.print_table(results)
+        if kwargs['json_path']:
+            with open(kwargs['json_path'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"✅ Results written to {kwargs['json_path']}"))
+
+    def run(self, template_bytes, counts, repeat, convert, cache_dir):
+        # Seed a private template cache so "fetch" measures the real (hit) path without the network
+        cache = TemplateCache(root=cache_dir, ttl=3600)
+        cache.put(BENCHMARK_URL, template_bytes)
+
+        results = []
+        try:
+            with transaction.atomic():
+                company_ids = {count: _synthetic_company(count).id for count in counts}
+                for count in counts:
+                    runs = [self.run_once(cache, company_ids[count], convert) for _ in range(repeat)]
+                    stages = {
+                        stage: round(statistics.median(run[stage] for run in runs), 4)
+                        for stage in runs[0]
+                    }
+                    peak = self.peak_memory(cache, company_ids[count])
+                    documents = count + 1  # one per director + the single company document
+                    total = sum(stages.values())
+                    results.append({
+                        "directors": count,
+                        "documents": documents,
+                        "stages_s": stages,
+                        "total_s": round(total, 4),
+                        "docs_per_second": round(documents / total, 1) if total else None,
+                        "render_docs_per_second": round(
+                            documents / (stages["render_single"] + stages["render_directors"]), 1
+                        ),
+                        "peak_memory_mb": round(peak / (1024 * 1024), 2),
+                    })
+                raise _Rollback
+        except _Rollback:
+            pass
+        return results
+
+    def run_once(self, cache, company_id, convert):
+        timings = {}
+
+        def timed(stage, fn):
+            started = time.perf_counter()
+            value = fn()
+            timings[stage] = time.perf_counter() - started
+            return value
+
+        template_bytes, digest = timed("fetch", lambda: cache.get(BENCHMARK_URL))
+        compiled = timed("compile", lambda: CompiledDocxTemplate(template_bytes, digest=digest))
+        context = timed("context", lambda: self.build_contexts(company_id))
+        single = timed("render_single", lambda: compiled.render(context.single))
+        jobs = [(f"director_{d.id}.docx", context.director(d)) for d in context.directors]
+        documents = timed("render_directors", lambda: list(render_documents(compiled, jobs)))
+        timed("zip", lambda: sum(len(chunk) for chunk in stream_zip(documents)))
+        if convert:
+            try:
+                timed("convert", lambda: convert_docx_to_pdf(single))
+            except LibreOfficeError as e:
+                self.stderr.write(f"⚠ Conversion skipped: {e}")
+                timings["convert"] = 0.0
+        return timings
+
+    @staticmethod
+    def build_contexts(company_id):
+        context = CompanyDocumentContext(document_companies().get(pk=company_id))
+        context.single
+        return context
+
+    def peak_memory(self, cache, company_id):
+        """Peak Python allocation for one full run (separate pass: tracing slows the timed runs)."""
+        tracemalloc.start()
+        try:
+            self.run_once(cache, company_id, convert=False)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def print_table(self, results):
+        stages = list(results[0]["stages_s"]) if results else []
+        header = f"{'directors':>9} " + " ".join(f"{s:>16}" for s in stages) + f" {'total (s)':>10} {'docs/s':>8} {'peak MB':>8}"
+        self.stdout.write(header)
+        for r in results:
+            row = f"{r['directors']:>9} " + " ".join(f"{r['stages_s'][s]:>16.4f}" for s in stages)
+            self.stdout.write(row + f" {r['total_s']:>10.3f} {r['docs_per_second']:>8} {r['peak_memory_mb']:>8}")
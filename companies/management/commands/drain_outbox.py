@@ -0,0 +1,63 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from companies.utils.outbox import claim_outbox_batch, deliver_outbox_batch, outbox_connection
+from companies.utils.timing import timing
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbox e-mails with retries (run one or more per deployment)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Deliver everything currently due, then exit'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between polls when nothing is due (default: 2)'
+        )
+
+    def handle(self, *args, **kwargs):
+        once = kwargs['once']
+        sleep = kwargs['sleep']
+        self._stopping = False
+
+        def stop(signum, frame):
+            # Finish the current batch, then exit
+            self._stopping = True
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        connection = outbox_connection()
+        self.stdout.write(self.style.SUCCESS("✅ Outbox worker started"))
+        while not self._stopping:
+            close_old_connections()
+            rows = claim_outbox_batch()
+
+            if not rows:
+                if once:
+                    break
+                time.sleep(sleep)
+                continue
+
+            with timing("outbox", emails=len(rows)):
+                deliver_outbox_batch(rows, connection)
+            for row in rows:
+                if row.status == row.STATUS_SENT:
+                    self.stdout.write(self.style.SUCCESS(f"✅ Email #{row.pk} sent to {', '.join(row.to)}"))
+                elif row.status == row.STATUS_FAILED:
+                    self.stdout.write(self.style.ERROR(f"❌ Email #{row.pk} failed after {row.attempts} attempt(s): {row.last_error}"))
+                else:
+                    self.stdout.write(self.style.WARNING(
+                        f"⚠ Email #{row.pk} will be retried at {row.next_attempt_at:%H:%M:%S}: {row.last_error}"
+                    ))
+
+        connection.close()
+        self.stdout.write("Outbox worker stopped")
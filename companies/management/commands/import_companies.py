@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from companies.utils.bulk_import import BulkCompanyImporter, load_workbook
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk import companies from an .xlsx workbook (sheets: companies, directors, '
+        'shareholders, compliance) or a companies .csv; related sheets name the company '
+        'in a company_ssm_number column'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Workbook (.xlsx) or companies sheet (.csv)')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would change without writing anything'
+        )
+        parser.add_argument(
+            '--diff',
+            action='store_true',
+            help='Print every new/changed row with its field changes'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Rows per bulk INSERT/UPDATE (default: BULK_IMPORT_BATCH_SIZE)'
+        )
+
+    def handle(self, *args, **kwargs):
+        try:
+            sheets = load_workbook(kwargs['path'])
+        except (OSError, ImportError, ValueError) as e:
+            raise CommandError(f"Could not read {kwargs['path']}: {e}")
+        if not sheets:
+            raise CommandError("No companies, directors, shareholders or compliance sheet found.")
+
+        report = BulkCompanyImporter(batch_size=kwargs['batch_size'], dry_run=kwargs['dry_run']).run(sheets)
+
+        if kwargs['diff'] or kwargs['dry_run']:
+            shown = report.diff if kwargs['diff'] else report.diff[:50]
+            for sheet, key, changes, new in shown:
+                self.stdout.write(f"{'+' if new else '~'} {sheet}: {key}")
+                if not new:
+                    for name, (old, value) in changes.items():
+                        self.stdout.write(f"    {name}: {old!r} → {value!r}")
+            if len(shown) < len(report.diff):
+                self.stdout.write(f"... {len(report.diff) - len(shown)} more (use --diff to list all)")
+
+        for sheet, number, message in report.errors:
+            self.stdout.write(self.style.ERROR(f"❌ {sheet} row {number}: {message}"))
+
+        self.stdout.write(f"📊 {report.summary()} ({report.elapsed:.1f}s)")
+        if report.errors:
+            raise CommandError(f"{len(report.errors)} row error(s); nothing was imported.")
+        if report.dry_run:
+            self.stdout.write(self.style.WARNING("⚠ Dry run: nothing was written."))
+        else:
+            self.stdout.write(self.style.SUCCESS("✅ Import complete"))
@@ -0,0 +1,72 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from companies.utils.doc_jobs import claim_next_job, purge_finished_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Process queued document generation jobs (run one per worker process)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process everything currently queued, then exit'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between polls when the queue is empty (default: 2)'
+        )
+
+    def handle(self, *args, **kwargs):
+        once = kwargs['once']
+        sleep = kwargs['sleep']
+        self._stopping = False
+
+        def stop(signum, frame):
+            # Finish the current job, then exit
+            self._stopping = True
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        purged = purge_finished_jobs()
+        if purged:
+            self.stdout.write(f"🧹 Purged {purged} old job(s)")
+        last_purge = time.monotonic()
+
+        self.stdout.write(self.style.SUCCESS("✅ Document worker started"))
+        while not self._stopping:
+            close_old_connections()
+            job = claim_next_job()
+
+            if job is None:
+                if once:
+                    break
+                if time.monotonic() - last_purge > 3600:
+                    purge_finished_jobs()
+                    last_purge = time.monotonic()
+                time.sleep(sleep)
+                continue
+
+            started = time.monotonic()
+            claimed_by = job.locked_by
+            run_job(job)
+            elapsed = time.monotonic() - started
+            if job.locked_by != claimed_by:
+                self.stdout.write(self.style.WARNING(
+                    f"⚠ Job #{job.pk} was taken over by another worker after {elapsed:.1f}s; result discarded"
+                ))
+            elif job.status == job.STATUS_SUCCEEDED:
+                self.stdout.write(self.style.SUCCESS(
+                    f"✅ Job #{job.pk} done in {elapsed:.1f}s: {job.result_name} "
+                    f"({job.documents_count} document(s), {job.documents_count / elapsed if elapsed else 0:.1f} docs/s)"
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f"❌ Job #{job.pk} failed after {elapsed:.1f}s: {job.error}"))
+
+        self.stdout.write("Document worker stopped")
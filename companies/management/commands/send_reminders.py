@@ -0,0 +1,166 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from datetime import timedelta
+
+from companies.utils.reminders import (
+    ReminderMailer,
+    build_reminders,
+    company_recipients,
+    due_anniversary,
+    next_anniversary,
+    record_dispatches,
+    reminder_companies,
+    reminder_stages,
+    run_stats,
+    sent_dispatches,
+)
+
+# Companies checked against the dispatch ledger per query and handed to the mailer together
+LEDGER_BATCH_SIZE = 200
+
+
+class Command(BaseCommand):
+    help = 'Send annual return reminders for every stage due today over one SMTP connection'
+
+    # Fixed by the send_<stage>_reminder commands; None = choose with --stage
+    STAGE = None
+
+    def add_arguments(self, parser):
+        if self.STAGE is None:
+            parser.add_argument(
+                '--stage',
+                action='append',
+                help='Stage to send (first, second, third, or any key in REMINDER_STAGES); repeatable, default: all'
+            )
+        parser.add_argument(
+            '--test',
+            action='store_true',
+            help='Send reminder regardless of date (for testing purposes)'
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Print the number of database queries and wall time for the run'
+        )
+        parser.add_argument(
+            '--catch-up',
+            type=int,
+            help='Also send reminders whose date fell in the last N days and were not sent yet (default: REMINDER_CATCH_UP_DAYS)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Send even if the dispatch ledger shows the reminder was already sent'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Messages sent per SMTP connection before it is reopened (default: REMINDER_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            help='Maximum messages per second, 0 for no limit (default: REMINDER_RATE_PER_SECOND)'
+        )
+        parser.add_argument(
+            '--retries',
+            type=int,
+            help='Retries per message on connection errors (default: REMINDER_MAX_RETRIES)'
+        )
+
+    def handle(self, *args, **kwargs):
+        keys = [self.STAGE] if self.STAGE else kwargs.get('stage')
+        try:
+            stages = reminder_stages(keys)
+        except KeyError as e:
+            raise CommandError(f"Unknown reminder stage: {e}")
+
+        mailer = ReminderMailer(
+            batch_size=kwargs['batch_size'],
+            rate=kwargs['rate'],
+            retries=kwargs['retries'],
+        )
+        catch_up = kwargs['catch_up']
+        if catch_up is None:
+            catch_up = getattr(settings, 'REMINDER_CATCH_UP_DAYS', 0)
+
+        with run_stats() as stats, mailer:
+            for stage in stages:
+                self.send_stage(stage, mailer, kwargs['test'], max(0, catch_up), kwargs['force'])
+
+        if kwargs['stats']:
+            self.stdout.write(stats.summary())
+            self.stdout.write(f"{mailer.report.summary()} over {mailer.connections_opened} connection(s)")
+
+    def send_stage(self, stage, mailer, test_mode, catch_up, force):
+        today = timezone.localtime(timezone.now()).date()
+
+        if test_mode:
+            # Directors and contact person come with the companies: no per-company queries
+            companies = reminder_companies()
+        else:
+            # Only the companies whose reminder date is in the window, via the indexed anniversary key
+            companies = reminder_companies().due_for_reminder(stage.offset_days, today, catch_up)
+
+        companies = list(companies)
+        for start in range(0, len(companies), LEDGER_BATCH_SIZE):
+            due = []
+            for company in companies[start:start + LEDGER_BATCH_SIZE]:
+                if not company.incorporation_date:
+                    self.stdout.write(self.style.WARNING(
+                        f"❌ Skipped {company.company_name}: No incorporation date"
+                    ))
+                    continue
+
+                if test_mode:
+                    anniversary = next_anniversary(company.incorporation_date, today)
+                    reminder_date = anniversary + timedelta(days=stage.offset_days)
+                    self.stdout.write(self.style.WARNING(
+                        f"⚠ TEST MODE: Sending {stage.key} reminder for {company.company_name} even though today ({today}) != reminder date ({reminder_date})"
+                    ))
+                else:
+                    anniversary = due_anniversary(company.incorporation_date, stage.offset_days, today, catch_up)
+                    if anniversary is None:
+                        continue
+                due.append((company, anniversary))
+
+            # One ledger lookup for the whole batch
+            already_sent = set() if force else sent_dispatches(
+                stage.key, [(company.id, anniversary.year) for company, anniversary in due]
+            )
+
+            outgoing = []
+            for company, anniversary in due:
+                if (company.id, anniversary.year) in already_sent:
+                    self.stdout.write(
+                        f"⏭ Already sent {stage.key} reminder for {company.company_name} ({anniversary.year})"
+                    )
+                    continue
+
+                # Collect recipients
+                recipients = company_recipients(company)
+
+                if not recipients:
+                    self.stdout.write(self.style.WARNING(
+                        f"⚠ No email found for {company.company_name}"
+                    ))
+                    continue
+
+                outgoing.append((company, anniversary, recipients))
+
+            # Sent together so a pooled backend can deliver the batch concurrently
+            errors = mailer.send_batch(build_reminders(stage, outgoing))
+            delivered = []
+            for (company, anniversary, recipients), error in zip(outgoing, errors):
+                if error is not None:
+                    self.stdout.write(self.style.ERROR(
+                        f"❌ Failed to send for {company.company_name}: {str(error)}"
+                    ))
+                    continue
+
+                delivered.append((company, anniversary, recipients))
+                self.stdout.write(self.style.SUCCESS(
+                    f"✅ Email sent to {company.company_name}: {', '.join(recipients)}"
+                ))
+            record_dispatches(stage.key, delivered, test_mode)
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0022_documentjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentjob',
+            name='company_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='documentjob',
+            name='documents_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='documentjob',
+            name='failed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='documentjob',
+            name='output_format',
+            field=models.CharField(choices=[('zip', 'ZIP of Word documents'), ('pdf', 'Single merged PDF')], default='zip', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='documentjob',
+            name='company',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='document_jobs', to='companies.company'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:21
+
+from django.db import migrations, models
+
+
+def fill_anniversary_md(apps, schema_editor):
+    Company = apps.get_model('companies', 'Company')
+    companies = list(Company.objects.exclude(incorporation_date=None).only('id', 'incorporation_date'))
+    for company in companies:
+        d = company.incorporation_date
+        company.anniversary_md = d.month * 100 + d.day
+    Company.objects.bulk_update(companies, ['anniversary_md'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0023_documentjob_bulk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='anniversary_md',
+            field=models.PositiveSmallIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_anniversary_md, migrations.RunPython.noop),
+    ]
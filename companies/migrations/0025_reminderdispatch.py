@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0024_company_anniversary_md'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderDispatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(max_length=20)),
+                ('cycle_year', models.PositiveSmallIntegerField()),
+                ('anniversary_date', models.DateField()),
+                ('recipients', models.TextField(blank=True)),
+                ('test_mode', models.BooleanField(default=False)),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminder_dispatches', to='companies.company')),
+            ],
+            options={
+                'ordering': ['-sent_at'],
+                'constraints': [models.UniqueConstraint(fields=('company', 'stage', 'cycle_year'), name='unique_reminder_dispatch')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:39
+
+from django.db import migrations, models
+
+# Admin search runs `icontains`, which Django compiles on PostgreSQL to
+# UPPER("col"::text) LIKE UPPER('%term%'); a B-tree cannot serve a leading
+# wildcard, a trigram GIN index on the same expression can. SQLite has no
+# equivalent, so there these stay table scans (the B-tree indexes below still
+# cover exact/prefix lookups and the director/shareholder dedupe).
+TRIGRAM_INDEXES = [
+    ('company_name_trgm', 'companies_company', 'company_name'),
+    ('company_ssm_trgm', 'companies_company', 'ssm_number'),
+    ('director_name_trgm', 'companies_director', 'full_name'),
+    ('director_ic_trgm', 'companies_director', 'ic_passport'),
+    ('shareholder_name_trgm', 'companies_shareholder', 'full_name'),
+    ('shareholder_ic_trgm', 'companies_shareholder', 'ic_passport'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _table, _column in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0026_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['company_name'], name='company_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='director',
+            index=models.Index(fields=['company', 'full_name', 'ic_passport'], name='director_identity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shareholder',
+            index=models.Index(fields=['company', 'full_name', 'ic_passport'], name='shareholder_identity_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0027_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['amr_cosec_branch', 'company_name'], name='company_branch_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0028_company_branch_index'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='reminderdispatch',
+            name='unique_reminder_dispatch',
+        ),
+        migrations.AddConstraint(
+            model_name='reminderdispatch',
+            constraint=models.UniqueConstraint(condition=models.Q(('test_mode', False)), fields=('company', 'stage', 'cycle_year'), name='unique_reminder_dispatch'),
+        ),
+    ]
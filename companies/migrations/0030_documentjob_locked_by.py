@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0029_reminderdispatch_real_sends_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentjob',
+            name='locked_by',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
@@ -1,6 +1,14 @@
+import calendar
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
 from django.core.validators import RegexValidator
 
+from .utils.email_templates import validate_template_text
+
 # Only digits and exactly 5 digits
 postcode_validator = RegexValidator(regex=r'^\d{5}$', message='Postcode must be exactly 5 digits.')
 
@@ -13,6 +21,74 @@ BRANCH_CHOICES = [
     ('KUANTAN', 'Kuantan'),
 ]
 
+def anniversary_key(d):
+    """Month-day of a date as MMDD (e.g. 31 March → 331), the indexed anniversary lookup key."""
+    return d.month * 100 + d.day if d else None
+
+
+def anniversary_in_year(incorporation_date, year):
+    """Anniversary of `incorporation_date` in `year`; 29 February falls on 28 February in non-leap years."""
+    if incorporation_date.month == 2 and incorporation_date.day == 29 and not calendar.isleap(year):
+        return date(year, 2, 28)
+    return incorporation_date.replace(year=year)
+
+
+# The annual return is due this many days after the incorporation anniversary
+AR_DUE_DAYS = 30
+
+
+def next_ar_due_date(incorporation_date, today):
+    """Earliest annual return due date (anniversary + AR_DUE_DAYS) on or after `today`."""
+    if not incorporation_date:
+        return None
+    since = today - timedelta(days=AR_DUE_DAYS)
+    # The first annual return is for the first anniversary
+    year = max(since.year, incorporation_date.year + 1)
+    anniversary = anniversary_in_year(incorporation_date, year)
+    if anniversary < since:
+        anniversary = anniversary_in_year(incorporation_date, year + 1)
+    return anniversary + timedelta(days=AR_DUE_DAYS)
+
+
+def anniversary_keys(first, last):
+    """anniversary_md keys of every day from `first` to `last`; 28 Feb of a non-leap year adds 29 Feb."""
+    keys = set()
+    for n in range((last - first).days + 1):
+        day = first + timedelta(days=n)
+        keys.add(anniversary_key(day))
+        if day.month == 2 and day.day == 28 and not calendar.isleap(day.year):
+            keys.add(229)
+    return sorted(keys)
+
+
+class CompanyQuerySet(models.QuerySet):
+    def due_for_reminder(self, offset_days, today, window_days=0):
+        """
+        Companies whose reminder falls on `today`, where the reminder date is
+        anniversary + `offset_days` (negative = before the anniversary).
+        With `window_days`, reminder dates from `today - window_days` up to
+        `today` match too (catch-up after missed runs).
+
+        The anniversary in question is `today - offset_days`, so the year-wrap
+        (a reminder in December for a January anniversary) is plain date
+        arithmetic. Matching uses the indexed `anniversary_md` column; on
+        28 February of a non-leap year, 29 February companies match too.
+        """
+        latest = today - timedelta(days=offset_days)
+        keys = anniversary_keys(latest - timedelta(days=window_days), latest)
+        return self.filter(anniversary_md__in=keys, incorporation_date__lt=latest)
+
+    def ar_due_between(self, start, end):
+        """
+        Companies with an annual return due (anniversary + AR_DUE_DAYS) from
+        `start` to `end` inclusive (less than a year apart), via anniversary_md.
+        """
+        first = start - timedelta(days=AR_DUE_DAYS)
+        last = end - timedelta(days=AR_DUE_DAYS)
+        # Incorporated before the window: its anniversary in the window is a real one
+        return self.filter(anniversary_md__in=anniversary_keys(first, last), incorporation_date__lt=first)
+
+
 # Company Model
 class Company(models.Model):
     company_name = models.CharField(max_length=255, blank=True, null=True)
@@ -36,29 +112,34 @@ class Company(models.Model):
     nature_of_business_2 = models.CharField(max_length=255, blank=True)
     nature_of_business_3 = models.CharField(max_length=255, blank=True)
 
+    # MMDD of incorporation_date, kept in sync by save(); lets reminders select by anniversary via an index
+    anniversary_md = models.PositiveSmallIntegerField(blank=True, null=True, db_index=True, editable=False)
+
+    objects = CompanyQuerySet.as_manager()
+
+    # Stored upper-case by save() (and by the bulk importer, which bypasses save)
+    UPPERCASE_FIELDS = (
+        'company_name', 'ssm_number', 'address_line1', 'address_line2', 'address_line3',
+        'postcode', 'town', 'state', 'nature_of_business_1', 'nature_of_business_2', 'nature_of_business_3',
+    )
+
+    class Meta:
+        # Trigram indexes for the admin's icontains search are added on PostgreSQL by migration 0027
+        indexes = [
+            models.Index(fields=['company_name'], name='company_name_idx'),
+            models.Index(fields=['amr_cosec_branch', 'company_name'], name='company_branch_idx'),
+        ]
+
     def save(self, *args, **kwargs):
-        if self.company_name:
-            self.company_name = self.company_name.upper()
-        if self.ssm_number:
-            self.ssm_number = self.ssm_number.upper()
-        if self.address_line1:
-            self.address_line1 = self.address_line1.upper()
-        if self.address_line2:
-            self.address_line2 = self.address_line2.upper()
-        if self.address_line3:
-            self.address_line3 = self.address_line3.upper()
-        if self.postcode:
-            self.postcode = self.postcode.upper()
-        if self.town:
-            self.town = self.town.upper()
-        if self.state:
-            self.state = self.state.upper()
-        if self.nature_of_business_1:
-            self.nature_of_business_1 = self.nature_of_business_1.upper()
-        if self.nature_of_business_2:
-            self.nature_of_business_2 = self.nature_of_business_2.upper()
-        if self.nature_of_business_3:
-            self.nature_of_business_3 = self.nature_of_business_3.upper()
+        for field in self.UPPERCASE_FIELDS:
+            value = getattr(self, field)
+            if value:
+                setattr(self, field, value.upper())
+
+        self.anniversary_md = anniversary_key(self.incorporation_date)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'incorporation_date' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'anniversary_md'}
 
         super().save(*args, **kwargs)
 
@@ -89,6 +170,11 @@ class Director(models.Model):
     is_shareholder = models.BooleanField(default=False)
     is_contact_person = models.BooleanField(default=False)  # ✅ NEW FIELD
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'full_name', 'ic_passport'], name='director_identity_idx'),
+        ]
+
     def __str__(self):
         return self.full_name
 
@@ -123,6 +209,12 @@ class Shareholder(models.Model):
         default='ordinary'
     )
 
+    class Meta:
+        # Director → shareholder dedupe looks up (company, full_name, ic_passport)
+        indexes = [
+            models.Index(fields=['company', 'full_name', 'ic_passport'], name='shareholder_identity_idx'),
+        ]
+
     def __str__(self):
         return self.full_name
 
@@ -163,6 +255,21 @@ class EmailTemplate(models.Model):
     body = models.TextField()  # use {{ placeholders }} if needed (like {{ company_name }})
     created_at = models.DateTimeField(auto_now_add=True)
 
+    def clean(self):
+        self.validate_placeholders()
+
+    def validate_placeholders(self):
+        # Placeholders must be ones the senders provide (see EMAIL_CONTEXT_SCHEMA);
+        # also run on every save, see email_templates.py
+        errors = {}
+        for field in ("subject", "body"):
+            try:
+                validate_template_text(getattr(self, field) or "")
+            except ValidationError as e:
+                errors[field] = e
+        if errors:
+            raise ValidationError(errors)
+
     def __str__(self):
         return self.name
 
@@ -211,3 +318,146 @@ class ComplianceInformation(models.Model):
     def __str__(self):
         return f"Compliance Info - {self.company.company_name}"
 
+
+
+class DocumentJob(models.Model):
+    """A document generation request processed in the background by `run_document_worker`."""
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    OUTPUT_CHOICES = [
+        ("zip", "ZIP of Word documents"),
+        ("pdf", "Single merged PDF"),
+    ]
+
+    # Single-company jobs set `company`; bulk jobs (action="bulk") list their companies in `company_ids`
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='document_jobs', blank=True, null=True)
+    company_ids = models.JSONField(default=list, blank=True)
+    template = models.ForeignKey(DocumentTemplate, on_delete=models.CASCADE, related_name='jobs')
+    director_id = models.CharField(max_length=20, default="all")  # "all" or a Director pk, as in the URL
+    action = models.CharField(max_length=20, default="generate")  # "generate" (Word/ZIP), "preview" (PDF) or "bulk"
+    output_format = models.CharField(max_length=10, choices=OUTPUT_CHOICES, default="zip")  # bulk jobs only
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    locked_until = models.DateTimeField(blank=True, null=True)  # a running job past this is considered abandoned
+    locked_by = models.CharField(max_length=100, blank=True)  # worker running the job; only it may finish it
+    error = models.TextField(blank=True)
+
+    result = models.FileField(upload_to="document_jobs/%Y/%m/", blank=True)
+    result_name = models.CharField(max_length=255, blank=True)
+    result_content_type = models.CharField(max_length=100, blank=True)
+    documents_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+
+    @property
+    def duration(self):
+        if self.started_at and self.finished_at:
+            return (self.finished_at - self.started_at).total_seconds()
+        return None
+
+    @property
+    def throughput(self):
+        """Documents per second for a finished job."""
+        if self.duration:
+            return round(self.documents_count / self.duration, 2)
+        return None
+
+    def __str__(self):
+        target = self.company if self.company_id else f"{len(self.company_ids)} companies"
+        return f"Job #{self.pk} - {self.template.name} for {target} ({self.status})"
+
+
+class ReminderDispatch(models.Model):
+    """One row per reminder e-mail sent: a stage is sent at most once per company per anniversary year."""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='reminder_dispatches')
+    stage = models.CharField(max_length=20)  # key in REMINDER_STAGES, e.g. "first"
+    cycle_year = models.PositiveSmallIntegerField()  # year of the anniversary the reminder is about
+    anniversary_date = models.DateField()
+    recipients = models.TextField(blank=True)
+    test_mode = models.BooleanField(default=False)
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-sent_at']
+        constraints = [
+            # --test sends are logged too but must not count as the year's real reminder
+            models.UniqueConstraint(
+                fields=['company', 'stage', 'cycle_year'],
+                condition=models.Q(test_mode=False),
+                name='unique_reminder_dispatch',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.stage} reminder {self.cycle_year} - {self.company}"
+
+
+class OutboxEmail(models.Model):
+    """
+    An e-mail queued by a web view and delivered by `manage.py drain_outbox`.
+
+    Subject, body and recipients are stored rendered; the PDF attachment is a
+    reference (company + document template) and is generated by the worker.
+    """
+    STATUS_PENDING = "pending"
+    STATUS_SENDING = "sending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_SENDING, "Sending"),
+        (STATUS_SENT, "Sent"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='outbox_emails', blank=True, null=True)
+    attachment_template = models.ForeignKey(DocumentTemplate, on_delete=models.SET_NULL, blank=True, null=True)
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True)
+
+    subject = models.TextField()
+    body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.JSONField(default=list)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(blank=True, null=True)  # a "sending" row past this is considered abandoned
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {', '.join(self.to)} ({self.status})"
@@ -1,3 +1,689 @@
-from django.test import TestCase
+import io
+import os
+import re
+import shutil
+import socket
+import tempfile
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import docx
+import tablib
+from django.conf import settings
+from django.contrib import admin
+from django.core import mail, serializers
+from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage
+from django.core.mail import EmailMessage
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.forms import modelform_factory
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .admin import DirectorAdmin
+from .models import (
+    Company, ComplianceInformation, Director, DocumentJob, DocumentTemplate, EmailTemplate, OutboxEmail,
+    ReminderDispatch, Shareholder,
+)
+from .utils import doc_jobs, parallel_render, pdf_cache, smtp_pool
+from .utils.bulk_import import BulkCompanyImporter, load_workbook
+from .utils.doc_generate import GeneratedDocument
+from .utils.office_pool import LibreOfficeError, OfficeWorker, _find_soffice, _find_uno_python
+from .utils.outbox import claim_outbox_batch, deliver_outbox_batch, outbox_connection, queue_email
+from .utils.reminders import ReminderMailer, due_anniversary, record_dispatches, sent_dispatches
+from .utils.shareholder_sync import remove_shareholders, sync_shareholders
+from .utils.template_cache import TemplateCache
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:  # test-only dependency
+    Controller = None
+
+# Admin search (icontains) can only use the pg_trgm GIN indexes of migration
+# 0027; on SQLite it stays a table scan
+TRIGRAM_CHECKS = [
+    ("Company search: company_name",
+     lambda: Company.objects.filter(company_name__icontains="SDN"), "company_name_trgm"),
+    ("Company search: ssm_number",
+     lambda: Company.objects.filter(ssm_number__icontains="123"), "company_ssm_trgm"),
+    ("Director search: full_name",
+     lambda: Director.objects.filter(full_name__icontains="TAN"), "director_name_trgm"),
+    ("Director search: ic_passport",
+     lambda: Director.objects.filter(ic_passport__icontains="900101"), "director_ic_trgm"),
+    ("Shareholder search: full_name",
+     lambda: Shareholder.objects.filter(full_name__icontains="TAN"), "shareholder_name_trgm"),
+    ("Shareholder search: ic_passport",
+     lambda: Shareholder.objects.filter(ic_passport__icontains="900101"), "shareholder_ic_trgm"),
+    ("Compliance search: company__company_name",
+     lambda: ComplianceInformation.objects.filter(company__company_name__icontains="SDN"), "company_name_trgm"),
+]
+
+# Lookups served by B-tree indexes on every database
+INDEX_CHECKS = [
+    ("Director lookup by identity",
+     lambda: Director.objects.filter(company_id=1, full_name="TAN AH KOW", ic_passport="900101-14-1234"),
+     "director_identity_idx"),
+    ("Shareholder lookup by identity",
+     lambda: Shareholder.objects.filter(company_id=1, full_name="TAN AH KOW", ic_passport="900101-14-1234"),
+     "shareholder_identity_idx"),
+    ("Changelist filter: branch",
+     lambda: Company.objects.filter(amr_cosec_branch="CHERAS").order_by("company_name"),
+     "company_branch_idx"),
+    ("Reminders: companies by anniversary",
+     lambda: Company.objects.filter(anniversary_md__in=[331, 401]),
+     "companies_company_anniversary_md_"),  # db_index=True, name generated by Django
+]
+
+# How the plan names an index it reads (SQLite, then PostgreSQL); a filter on
+# an indexed column mentions the column but not in this form
+INDEX_USE = r"(?:USING (?:COVERING )?INDEX|Index (?:Only )?Scan using|Bitmap Index Scan on) "
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN the admin search and lookup queries and check the expected index is used."""
+
+    def setUp(self):
+        if connection.vendor == "postgresql":
+            # The test tables are empty and would be scanned whatever the
+            # indexes; ask whether the index *can* serve the query (reset on rollback)
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertRegex(plan, INDEX_USE + re.escape(index), f"{index} not used")
+
+    @skipUnless(connection.vendor == "postgresql", "trigram indexes are PostgreSQL only")
+    def test_search_uses_trigram_indexes(self):
+        for label, queryset, index in TRIGRAM_CHECKS:
+            with self.subTest(label):
+                self.assertUsesIndex(queryset(), index)
+
+    def test_lookups_use_indexes(self):
+        for label, queryset, index in INDEX_CHECKS:
+            with self.subTest(label):
+                self.assertUsesIndex(queryset(), index)
+
+
+class BulkImportTests(TestCase):
+    def workbook(self, **sheets):
+        """Write `sheets` ({title: (headers, rows)}) to an .xlsx file and read it back with load_workbook."""
+        book = tablib.Databook()
+        for title, (headers, rows) in sheets.items():
+            book.add_sheet(tablib.Dataset(*rows, headers=headers, title=title))
+        fd, path = tempfile.mkstemp(suffix=".xlsx")
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, "wb") as f:
+            f.write(book.export("xlsx"))
+        return load_workbook(path)
+
+    def test_xlsx_workbook_round_trip(self):
+        sheets = self.workbook(
+            Companies=(["SSM Number", "Company Name", "Incorporation Date", "Nature Of Business 1"],
+                       [["123-a", "Acme Sdn Bhd", "15/03/2020", "Trading"]]),
+            Directors=(["company_ssm_number", "full_name", "ic_passport", "appointment_date", "is_shareholder"],
+                       [["123-A", "Tan Ah Kow", "900101-14-1234", date(2020, 3, 15), "yes"]]),
+            Shareholders=(["company_ssm_number", "full_name", "ic_passport", "shareholding"],
+                          [["123-A", "Lim Mei", "880202-10-2222", 500]]),
+        )
+        self.assertEqual(set(sheets), {"companies", "directors", "shareholders"})
+
+        report = BulkCompanyImporter().run(sheets)
+
+        self.assertEqual(report.errors, [])
+        company = Company.objects.get(ssm_number="123-A")
+        self.assertEqual(company.company_name, "ACME SDN BHD")
+        self.assertEqual(company.incorporation_date, date(2020, 3, 15))
+        self.assertEqual(company.director_set.get().appointment_date, date(2020, 3, 15))
+        self.assertEqual(
+            sorted(company.shareholder_set.values_list("full_name", "shareholding")),
+            [("Lim Mei", Decimal(500)), ("Tan Ah Kow", Decimal(0))],  # the director via shareholder sync
+        )
+
+    def test_missing_required_column_is_a_row_error(self):
+        Company.objects.create(ssm_number="123-A", nature_of_business_1="Trading")
+        sheets = {"directors": tablib.Dataset(["123-A", "Tan Ah Kow", "900101"],
+                                              headers=["company_ssm_number", "full_name", "ic_passport"])}
+
+        report = BulkCompanyImporter(dry_run=True).run(sheets)
+
+        self.assertEqual(report.errors, [("directors", 2, "new row is missing appointment_date")])
+        self.assertFalse(Director.objects.exists())
+
+    def test_missing_required_column_still_updates_existing_rows(self):
+        company = Company.objects.create(ssm_number="123-A", nature_of_business_1="Trading")
+        Director.objects.create(company=company, full_name="Tan Ah Kow", ic_passport="900101",
+                                appointment_date=date(2020, 1, 1))
+        sheets = {"directors": tablib.Dataset(["123-A", "Tan Ah Kow", "900101", "tan@example.com"],
+                                              headers=["company_ssm_number", "full_name", "ic_passport", "email"])}
+
+        report = BulkCompanyImporter().run(sheets)
+
+        self.assertEqual(report.errors, [])
+        self.assertEqual(Director.objects.get().email, "tan@example.com")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class _RecordingHandler:
+    """aiosmtpd handler keeping the client address (one per SMTP connection) of every message."""
+
+    def __init__(self):
+        self.peers = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.peers.append(session.peer)
+        return "250 OK"
+
+
+@skipUnless(Controller, "aiosmtpd is not installed")
+class PooledEmailTests(TestCase):
+    """The outbox and reminder senders against a local aiosmtpd server."""
+
+    def setUp(self):
+        self.port = _free_port()
+        self.handler = _RecordingHandler()
+        overrides = override_settings(
+            EMAIL_HOST="127.0.0.1",
+            EMAIL_PORT=self.port,
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER="",
+            EMAIL_HOST_PASSWORD="",
+            DEFAULT_FROM_EMAIL="office@example.com",
+            EMAIL_POOL_SIZE=2,
+            EMAIL_POOL_MAX_RETRIES=0,
+            EMAIL_OUTBOX_BACKEND="companies.utils.smtp_pool.PooledEmailBackend",
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        # The pool is per process and reads the settings when created
+        smtp_pool._pool = None
+        self.addCleanup(self._shutdown_pool)
+
+    @staticmethod
+    def _shutdown_pool():
+        if smtp_pool._pool is not None:
+            smtp_pool._pool.shutdown()
+            smtp_pool._pool = None
+
+    def start_server(self):
+        controller = Controller(self.handler, hostname="127.0.0.1", port=self.port)
+        controller.start()
+        self.addCleanup(controller.stop)
+
+    def test_outbox_batches_reuse_pooled_connections(self):
+        self.start_server()
+        for i in range(6):
+            queue_email(f"Notice {i}", "Body", [f"director{i}@example.com"])
+
+        for _ in range(2):  # two drain iterations, as drain_outbox would run them
+            deliver_outbox_batch(claim_outbox_batch(limit=3), outbox_connection())
+
+        self.assertEqual(OutboxEmail.objects.filter(status=OutboxEmail.STATUS_SENT).count(), 6)
+        self.assertEqual(len(self.handler.peers), 6)
+        self.assertLessEqual(len(set(self.handler.peers)), 2)
+        self.assertEqual(smtp_pool.get_smtp_pool().connections_opened(), len(set(self.handler.peers)))
+
+    def test_outbox_connect_failure_requeues_rows(self):
+        queue_email("Notice", "Body", ["director@example.com"])  # nothing listens on self.port
+
+        deliver_outbox_batch(claim_outbox_batch(), outbox_connection())
+
+        row = OutboxEmail.objects.get()
+        self.assertEqual(row.status, OutboxEmail.STATUS_PENDING)
+        self.assertEqual(row.attempts, 1)
+        self.assertIn("ConnectionRefusedError", row.last_error)
+
+    @override_settings(REMINDER_EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend")
+    def test_reminder_connect_failure_fails_each_message(self):
+        messages = [EmailMessage("Reminder", "Body", None, [f"d{i}@example.com"]) for i in range(2)]
+
+        with ReminderMailer(retries=0) as mailer, self.assertLogs("companies.utils.reminders", "WARNING"):
+            errors = mailer.send_batch(messages)
+
+        self.assertEqual([type(e) for e in errors], [ConnectionRefusedError] * 2)
+        self.assertEqual(mailer.report.failed, 2)
+
+
+class _BlockingTemplate:
+    """Compiled-template stand-in whose "hang" context blocks until released."""
+    template_bytes = b""
+    digest = "test"
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def render(self, context):
+        if context == "hang":
+            self.release.wait(10)
+        return context.encode()
+
+
+@override_settings(DOC_RENDER_WORKERS=1, DOC_RENDER_EXECUTOR="thread")
+class ParallelRenderTests(TestCase):
+    def setUp(self):
+        parallel_render._executor = None
+        self.template = _BlockingTemplate()
+        self.addCleanup(self.template.release.set)
+
+    def test_timed_out_render_does_not_hold_up_later_documents(self):
+        jobs = [("hung.docx", "hang"), ("next.docx", "next")]
+
+        with self.assertLogs("companies.utils.parallel_render", "ERROR"):
+            documents = list(parallel_render.render_documents(self.template, jobs, timeout=0.2))
+
+        self.assertEqual([name for name, _ in documents], ["hung_ERROR.txt", "next.docx"])
+        self.assertEqual(documents[1][1], b"next")
+        # The next request gets a fresh executor instead of queueing behind the hung worker
+        later = list(parallel_render.render_documents(self.template, [("later.docx", "later")], timeout=0.2))
+        self.assertEqual(later, [("later.docx", b"later")])
+
+
+def _sample_docx():
+    document = docx.Document()
+    document.add_paragraph("Directors' Circular Resolution")
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+@skipUnless(_find_soffice(), "LibreOffice is not installed")
+@skipUnless(_find_uno_python(), "no Python interpreter can import uno")
+class OfficeWorkerTests(TestCase):
+    """DOCX → PDF through the UNO bridge against the real soffice binary."""
+
+    def setUp(self):
+        self.worker = OfficeWorker(0)
+        self.addCleanup(shutil.rmtree, self.worker.profile_dir + "-cli", True)
+        self.addCleanup(shutil.rmtree, self.worker.profile_dir, True)
+        self.addCleanup(self.worker.stop)
+
+    def test_stream_conversion(self):
+        self.worker.start()
+        self.assertEqual(self.worker.mode, "uno")
+
+        pdf_bytes = self.worker.convert(_sample_docx(), timeout=60)
+
+        self.assertTrue(pdf_bytes.startswith(b"%PDF"))
+        self.assertEqual(self.worker.mode, "uno")  # no fallback needed
+
+    def test_stream_failure_falls_back_to_convert_to(self):
+        self.worker.start()
+        failure = LibreOfficeError("private:stream load failed")
+
+        with mock.patch.object(OfficeWorker, "_convert_uno", side_effect=failure), \
+                self.assertLogs("companies.utils.office_pool", "WARNING"):
+            pdf_bytes = self.worker.convert(_sample_docx(), timeout=60)
+
+        self.assertTrue(pdf_bytes.startswith(b"%PDF"))
+        self.assertEqual(self.worker.mode, "cli")
+
+
+class PdfCacheTests(TestCase):
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, True)
+        self.storage = FileSystemStorage(location=location)
+
+    def test_put_lists_storage_only_near_the_cap(self):
+        cache = pdf_cache.RenderedPdfCache(self.storage, max_bytes=1000, evict_interval=3600)
+
+        with mock.patch.object(cache, "_entries", wraps=cache._entries) as listings:
+            for key in range(5):
+                cache.put(1, 1, f"k{key}", b"x" * 100)
+            self.assertEqual(listings.call_count, 1)  # the first put, to learn the current size
+
+            for key in range(5, 11):
+                cache.put(1, 1, f"k{key}", b"x" * 100)
+            self.assertEqual(listings.call_count, 2)  # the put that passed 1000 bytes
+
+        # Evicted least-recently-used down to 90% of the cap
+        self.assertEqual(sum(size for _, size, _ in cache._entries()), 900)
+        self.assertIsNone(cache.get(1, 1, "k0"))
+        self.assertIsNotNone(cache.get(1, 1, "k10"))
+
+    def test_saves_invalidate_each_company_once_on_commit(self):
+        with mock.patch.object(pdf_cache, "_invalidate") as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                company = Company.objects.create(ssm_number="123-A", nature_of_business_1="Trading")
+                for i in range(3):
+                    Director.objects.create(company=company, full_name=f"Director {i}", ic_passport=str(i),
+                                            appointment_date=date(2020, 1, 1))
+                self.assertFalse(invalidate.called)
+
+        invalidate.assert_called_once_with(company_id=company.pk, template_id=None)
+
+    def test_rolled_back_saves_invalidate_nothing(self):
+        with mock.patch.object(pdf_cache, "_invalidate") as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertRaises(RuntimeError), transaction.atomic():
+                    Company.objects.create(ssm_number="123-A", nature_of_business_1="Trading")
+                    raise RuntimeError
+                company = Company.objects.create(ssm_number="456-B", nature_of_business_1="Trading")
+
+        invalidate.assert_called_once_with(company_id=company.pk, template_id=None)
+
+
+class EmailTemplateValidationTests(TestCase):
+    def test_save_rejects_unknown_placeholder(self):
+        template = EmailTemplate(name="Reminder", subject="{{ company_name }}", body="Dear {{ director }}")
+
+        with self.assertRaises(ValidationError) as raised:
+            template.save()
+
+        self.assertIn("body", raised.exception.message_dict)
+        self.assertFalse(EmailTemplate.objects.exists())
+
+    def test_save_rejects_syntax_error(self):
+        with self.assertRaises(ValidationError):
+            EmailTemplate.objects.create(name="Reminder", subject="{% if %}", body="Body")
+
+    def test_fixture_load_rejects_unknown_placeholder(self):
+        fixture = '[{"model": "companies.emailtemplate", "pk": 1, "fields": ' \
+                  '{"name": "Reminder", "subject": "{{ nope }}", "body": "Body", "created_at": "2024-01-01T00:00:00Z"}}]'
+
+        with self.assertRaises(ValidationError):
+            for obj in serializers.deserialize("json", fixture):
+                obj.save()  # raw save, as loaddata does
+
+        self.assertFalse(EmailTemplate.objects.exists())
+
+    def test_save_accepts_known_placeholders(self):
+        EmailTemplate.objects.create(name="Reminder", subject="{{ company_name }}", body="Body")
+
+        template = EmailTemplate.objects.get()
+        template.name = "Renamed"
+        template.save(update_fields=["name"])
+
+
+class DueForReminderTests(TestCase):
+    """The anniversary_md window of Company.objects.due_for_reminder and due_anniversary."""
+
+    def company(self, incorporation_date):
+        return Company.objects.create(ssm_number=str(incorporation_date), nature_of_business_1="Trading",
+                                      incorporation_date=incorporation_date)
+
+    def assertDue(self, company, offset_days, today, anniversary, window_days=0):
+        due = Company.objects.due_for_reminder(offset_days, today, window_days)
+        if anniversary is None:
+            self.assertNotIn(company, due)
+        else:
+            self.assertIn(company, due)
+        self.assertEqual(due_anniversary(company.incorporation_date, offset_days, today, window_days), anniversary)
+
+    def test_anniversary_md_is_kept_in_step(self):
+        company = self.company(date(2020, 3, 31))
+        self.assertEqual(company.anniversary_md, 331)
+
+        company.incorporation_date = date(2020, 4, 1)
+        company.save(update_fields=["incorporation_date"])
+
+        company.refresh_from_db()
+        self.assertEqual(company.anniversary_md, 401)
+
+    def test_reminder_on_the_day(self):
+        company = self.company(date(2020, 3, 31))
+        self.assertDue(company, 0, date(2025, 3, 31), date(2025, 3, 31))
+        self.assertDue(company, 0, date(2025, 3, 30), None)
+        self.assertDue(company, 23, date(2025, 4, 23), date(2025, 3, 31))
+
+    def test_reminder_before_a_january_anniversary_wraps_the_year(self):
+        company = self.company(date(2020, 1, 10))
+        self.assertDue(company, -30, date(2025, 12, 11), date(2026, 1, 10))
+        self.assertDue(company, -30, date(2025, 12, 12), None)
+
+    def test_29_february_falls_on_28_february_in_other_years(self):
+        company = self.company(date(2020, 2, 29))
+        self.assertDue(company, 0, date(2025, 2, 28), date(2025, 2, 28))
+        self.assertDue(company, 0, date(2025, 3, 1), None)
+        self.assertDue(company, 0, date(2024, 2, 28), None)
+        self.assertDue(company, 0, date(2024, 2, 29), date(2024, 2, 29))
+
+    def test_28_february_company_is_not_due_on_29_february(self):
+        company = self.company(date(2019, 2, 28))
+        self.assertDue(company, 0, date(2024, 2, 29), None)
+        self.assertDue(company, 0, date(2025, 2, 28), date(2025, 2, 28))
+
+    def test_catch_up_window(self):
+        company = self.company(date(2020, 3, 1))
+        self.assertDue(company, 0, date(2025, 3, 3), date(2025, 3, 1), window_days=2)
+        self.assertDue(company, 0, date(2025, 3, 3), None, window_days=1)
+
+    def test_no_reminder_before_the_first_anniversary(self):
+        company = self.company(date(2025, 3, 31))
+        self.assertDue(company, 0, date(2025, 3, 31), None)
+        self.assertDue(company, -30, date(2025, 3, 1), None)
+
+
+@override_settings(REMINDER_EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class ReminderDispatchTests(TestCase):
+    def setUp(self):
+        # Due for the "second" stage (on the anniversary) today
+        today = timezone.localdate()
+        self.anniversary = today
+        years_back = 4 if (today.month, today.day) == (2, 29) else 3
+        self.company = Company.objects.create(
+            ssm_number="123-A", company_name="Acme Sdn Bhd", nature_of_business_1="Trading",
+            incorporation_date=today.replace(year=today.year - years_back),
+        )
+        Director.objects.create(company=self.company, full_name="Tan Ah Kow", ic_passport="900101",
+                                appointment_date=date(2020, 1, 1), email="tan@example.com")
+
+    def send(self, **options):
+        call_command("send_reminders", stage=["second"], stdout=io.StringIO(), **options)
+
+    def test_ledger_records_a_stage_once_per_year(self):
+        delivered = [(self.company, self.anniversary, ["tan@example.com"])]
+        record_dispatches("second", delivered)
+        record_dispatches("second", delivered)
+
+        self.assertEqual(ReminderDispatch.objects.count(), 1)
+        self.assertEqual(sent_dispatches("second", [(self.company.pk, self.anniversary.year)]),
+                         {(self.company.pk, self.anniversary.year)})
+        self.assertEqual(sent_dispatches("first", [(self.company.pk, self.anniversary.year)]), set())
+
+    def test_second_run_on_the_same_day_sends_nothing(self):
+        self.send()
+        self.send()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["tan@example.com"])
+        self.assertEqual(ReminderDispatch.objects.get().cycle_year, self.anniversary.year)
+
+    def test_test_send_does_not_block_the_real_reminder(self):
+        self.send(test=True)
+        self.send(test=True)
+        self.send()
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(ReminderDispatch.objects.filter(test_mode=True).count(), 2)
+        self.assertEqual(ReminderDispatch.objects.filter(test_mode=False).count(), 1)
+
+
+class ShareholderSyncTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(ssm_number="123-A", nature_of_business_1="Trading")
+        self.admin = DirectorAdmin(Director, admin.site)
+
+    def director(self, full_name="Tan Ah Kow", ic_passport="900101-14-1234", **fields):
+        return Director.objects.create(company=self.company, full_name=full_name, ic_passport=ic_passport,
+                                       appointment_date=date(2020, 1, 1), **fields)
+
+    def edit(self, director, **data):
+        """Save `data` over `director` through DirectorAdmin, as its change form does."""
+        Form = modelform_factory(Director, fields=["full_name", "ic_passport", "email", "appointment_date",
+                                                   "is_shareholder"])
+        initial = Form(instance=director).initial
+        form = Form({**initial, **data}, instance=director)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.admin.save_model(None, form.save(commit=False), form, change=True)
+
+    def test_create(self):
+        directors = [self.director(is_shareholder=True, email="tan@example.com"),
+                     self.director("Lim Mei", "880202", is_shareholder=False)]
+
+        self.assertEqual(sync_shareholders([(d, None) for d in directors]), (1, 0))
+
+        shareholder = Shareholder.objects.get()
+        self.assertEqual((shareholder.full_name, shareholder.email, shareholder.shareholding),
+                         ("Tan Ah Kow", "tan@example.com", 0))
+        # Matched by person_key (case and spacing ignored), not duplicated
+        directors[0].full_name = "tan  ah kow"
+        self.assertEqual(sync_shareholders([(directors[0], None)]), (0, 0))
+
+    def test_contact_changes_propagate(self):
+        director = self.director(is_shareholder=True)
+        sync_shareholders([(director, None)])
+
+        self.edit(director, email="new@example.com")
+
+        self.assertEqual(Shareholder.objects.get().email, "new@example.com")
+
+    def test_rename_renames_the_shareholder(self):
+        director = self.director(is_shareholder=True)
+        sync_shareholders([(director, None)])
+
+        self.edit(director, full_name="Tan Ah Kow Bin Ali", ic_passport="900101-14-9999")
+
+        shareholder = Shareholder.objects.get()
+        self.assertEqual((shareholder.full_name, shareholder.ic_passport), ("Tan Ah Kow Bin Ali", "900101-14-9999"))
+
+    def test_delete_removes_the_placeholder_shareholder(self):
+        director = self.director(is_shareholder=True)
+        sync_shareholders([(director, None)])
+
+        self.admin.delete_model(None, director)
+
+        self.assertFalse(Shareholder.objects.exists())
+
+    def test_delete_keeps_shareholders_with_shares_or_another_director(self):
+        holder = self.director(is_shareholder=True)
+        twin = self.director("Lim Mei", "880202", is_shareholder=True)
+        duplicate = self.director("Lim Mei", "880202", is_shareholder=True)
+        sync_shareholders([(d, None) for d in (holder, twin)])
+        Shareholder.objects.filter(full_name="Tan Ah Kow").update(shareholding=500)
+
+        self.admin.delete_queryset(None, Director.objects.filter(pk__in=[holder.pk, twin.pk]))
+
+        self.assertEqual(sorted(Shareholder.objects.values_list("full_name", flat=True)), ["Lim Mei", "Tan Ah Kow"])
+
+        # Once the last Lim Mei director goes, so does her placeholder
+        duplicate.delete()
+        self.assertEqual(remove_shareholders([duplicate]), 1)
+        self.assertEqual(list(Shareholder.objects.values_list("full_name", flat=True)), ["Tan Ah Kow"])
+
+
+class DocumentJobQueueTests(TestCase):
+    """Claiming, lease takeover and owner-only finish of the DocumentJob queue."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, True)
+        overrides = override_settings(MEDIA_ROOT=media_root, DOC_JOB_LEASE_SECONDS=600, DOC_JOB_MAX_ATTEMPTS=3)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        company = Company.objects.create(ssm_number="123-A", nature_of_business_1="Trading")
+        template = DocumentTemplate.objects.create(name="Resolution")
+        self.job = doc_jobs.enqueue_document_job(company, template)
+
+    def expire_lease(self):
+        DocumentJob.objects.filter(pk=self.job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+    def test_two_workers_claiming_the_same_job(self):
+        rival = []
+
+        def racing_lease_token():
+            # Worker B claims between worker A's read of the queue and its UPDATE
+            if not rival:
+                rival.append(None)
+                rival[0] = doc_jobs.claim_next_job()
+                return "worker-a"
+            return "worker-b"
+
+        with mock.patch.object(doc_jobs, "lease_token", side_effect=racing_lease_token):
+            claimed = doc_jobs.claim_next_job()
+
+        self.assertIsNone(claimed)
+        self.assertEqual(rival[0].pk, self.job.pk)
+        job = DocumentJob.objects.get()
+        self.assertEqual((job.status, job.attempts, job.locked_by), (DocumentJob.STATUS_RUNNING, 1, "worker-b"))
+
+    def test_expired_lease_is_taken_over(self):
+        first = doc_jobs.claim_next_job()
+        self.assertIsNone(doc_jobs.claim_next_job())  # leased and still running
+
+        self.expire_lease()
+        second = doc_jobs.claim_next_job()
+
+        self.assertEqual(second.pk, first.pk)
+        self.assertEqual(second.attempts, 2)
+        self.assertNotEqual(second.locked_by, first.locked_by)
+        # The first worker's heartbeat notices it no longer holds the job
+        heartbeat = doc_jobs.JobHeartbeat(first)
+        heartbeat.beat()
+        self.assertTrue(heartbeat.lost)
+
+    def test_heartbeat_extends_the_lease(self):
+        job = doc_jobs.claim_next_job()
+        DocumentJob.objects.filter(pk=job.pk).update(locked_until=timezone.now() + timedelta(seconds=1))
+
+        heartbeat = doc_jobs.JobHeartbeat(job)
+        heartbeat.beat()
+
+        self.assertFalse(heartbeat.lost)
+        self.assertGreater(DocumentJob.objects.get().locked_until, timezone.now() + timedelta(seconds=590))
+
+    def test_job_out_of_attempts_fails(self):
+        for _ in range(3):
+            doc_jobs.claim_next_job()
+            self.expire_lease()
+
+        self.assertIsNone(doc_jobs.claim_next_job())
+        self.assertEqual(DocumentJob.objects.get().status, DocumentJob.STATUS_FAILED)
+
+    @mock.patch.object(doc_jobs, "generate_document",
+                       return_value=GeneratedDocument("resolution.docx", "application/octet-stream", b"docx"))
+    def test_only_the_lease_holder_finishes_the_job(self, generate_document):
+        stale = doc_jobs.claim_next_job()
+        self.expire_lease()
+        current = doc_jobs.claim_next_job()
+
+        with self.assertLogs("companies.utils.doc_jobs", "WARNING"):
+            stale = doc_jobs.run_job(stale)
+
+        # The stale worker's result is discarded and the row still belongs to the current worker
+        self.assertEqual((stale.status, stale.locked_by), (DocumentJob.STATUS_RUNNING, current.locked_by))
+        self.assertFalse(stale.result)
+        self.assertEqual([files for _, _, files in os.walk(settings.MEDIA_ROOT) if files], [])
+
+        current = doc_jobs.run_job(current)
+
+        self.assertEqual(current.status, DocumentJob.STATUS_SUCCEEDED)
+        job = DocumentJob.objects.get()
+        self.assertEqual((job.status, job.result_name), (DocumentJob.STATUS_SUCCEEDED, "resolution.docx"))
+        with job.result.open("rb") as f:
+            self.assertEqual(f.read(), b"docx")
+
+
+class TemplateCacheTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        self.cache = TemplateCache(root=root, ttl=3600)
+
+    @mock.patch("companies.utils.template_cache.requests.get", side_effect=AssertionError("no download expected"))
+    def test_put_seeds_a_fresh_entry(self, get):
+        digest = self.cache.put("https://example.com/resolution.docx", b"docx bytes")
+
+        self.assertEqual(self.cache.get("https://example.com/resolution.docx"), (b"docx bytes", digest))
+        # Blobs are shared by content
+        self.assertEqual(self.cache.put("https://example.com/copy.docx", b"docx bytes"), digest)
+        self.assertEqual(len(os.listdir(self.cache.blob_dir)), 1)
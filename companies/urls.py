@@ -9,5 +9,9 @@ urlpatterns = [
     path('choose-template/<int:company_id>/', views.choose_template, name='choose_template'),
     path('generate-doc/<int:company_id>/<int:template_id>/<str:director_id>/', views.generate_company_doc, name='generate_company_doc_with_director'),
     path('companies/<int:company_id>/template/<int:template_id>/email/', views.choose_email_template, name='choose_email_template'),
+    path('document-jobs/<int:job_id>/', views.document_job_status, name='document_job_status'),
+    path('document-jobs/<int:job_id>/download/', views.document_job_download, name='document_job_download'),
+    path('template-cache/stats/', views.template_cache_status, name='template_cache_status'),
+    path('metrics/', views.document_metrics, name='document_metrics'),
 
 ]
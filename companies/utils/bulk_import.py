@@ -0,0 +1,436 @@
+# companies/utils/bulk_import.py
+"""
+Bulk import of companies and their directors, shareholders and compliance
+information from a (multi-sheet) workbook.
+
+The row-by-row CompanyResource import does a lookup and a save() per row;
+this path loads existing companies in one query, converts and normalizes the
+rows in one pass, and writes with bulk_create/bulk_update, i.e. a few queries
+per `batch_size` rows. Sheets (matched by name, case-insensitive):
+
+- companies (or the first sheet): CompanyResource columns and Company fields
+- directors / shareholders: model fields plus `company_ssm_number`
+- compliance: ComplianceInformation fields plus `company_ssm_number`
+
+Headers are matched case-insensitively with spaces as underscores, so an
+export from the admin ("Financial Year End", ...) imports as is. Rows are
+keyed like the admin does: companies by SSM number, compliance by company,
+directors and shareholders by shareholder_sync.person_key. Directors marked
+is_shareholder are then synced to shareholders. Unchanged rows are skipped;
+rows are never deleted.
+"""
+import time
+from collections import Counter
+from datetime import date, datetime
+
+import tablib
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+
+from ..models import Company, ComplianceInformation, Director, Shareholder, anniversary_key
+from .pdf_cache import invalidate_on_commit
+from .shareholder_sync import person_key, sync_shareholders
+
+DATE_FORMATS = ("%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d %B %Y", "%d %b %Y")
+TRUE_VALUES = {"1", "true", "t", "yes", "y"}
+FALSE_VALUES = {"0", "false", "f", "no", "n"}
+
+SHEETS = ("companies", "directors", "shareholders", "compliance")
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+class _Rollback(Exception):
+    pass
+
+
+def header_key(header):
+    return str(header or "").strip().lower().replace(" ", "_")
+
+
+def _importable_fields(model):
+    return {
+        f.name: f for f in model._meta.concrete_fields
+        if not f.primary_key and not f.is_relation and f.editable
+    }
+
+
+def required_fields(model):
+    """Importable fields a new row must have a value for (no default, not nullable)."""
+    required = []
+    for name, field in _importable_fields(model).items():
+        try:
+            convert_value(field, None)
+        except ImportRowError:
+            required.append(name)
+    return required
+
+
+def convert_value(field, raw):
+    """Spreadsheet cell → Python value for `field` (dates, booleans, numbers, choices)."""
+    if isinstance(raw, str):
+        raw = raw.strip()
+    elif isinstance(raw, float) and raw.is_integer():
+        raw = int(raw)  # Excel stores IC numbers and share counts as floats
+
+    if raw is None or raw == "":
+        if field.has_default():
+            return field.get_default()
+        if field.null:
+            return None
+        if isinstance(field, models.CharField):
+            return ""
+        raise ImportRowError(f"{field.name} is required")
+
+    if isinstance(field, models.DateField):
+        if isinstance(raw, datetime):
+            return raw.date()
+        if isinstance(raw, date):
+            return raw
+        try:
+            return field.to_python(str(raw))
+        except ValidationError:
+            for fmt in DATE_FORMATS:
+                try:
+                    return datetime.strptime(str(raw), fmt).date()
+                except ValueError:
+                    pass
+        raise ImportRowError(f"{field.name}: invalid date {raw!r}")
+
+    if isinstance(field, models.BooleanField):
+        text = str(raw).lower()
+        if text in TRUE_VALUES:
+            return True
+        if text in FALSE_VALUES:
+            return False
+        raise ImportRowError(f"{field.name}: expected yes/no, got {raw!r}")
+
+    if isinstance(field, models.IntegerField):
+        try:
+            return int(float(raw))
+        except (TypeError, ValueError):
+            raise ImportRowError(f"{field.name}: expected a number, got {raw!r}")
+
+    value = str(raw)
+    if field.choices:
+        # Accept the stored value or the label, any case ("Cheras" → "CHERAS")
+        for choice, label in field.flatchoices:
+            if value.lower() in (str(choice).lower(), str(label).lower()):
+                return choice
+        raise ImportRowError(f"{field.name}: unknown choice {raw!r}")
+    return value
+
+
+def normalize_company(values):
+    """What Company.save() would do, applied to a row of values."""
+    for name in Company.UPPERCASE_FIELDS:
+        if values.get(name):
+            values[name] = values[name].upper()
+    if "incorporation_date" in values:
+        values["anniversary_md"] = anniversary_key(values["incorporation_date"])
+    return values
+
+
+def load_workbook(path):
+    """{sheet name: Dataset} from an .xlsx workbook or a single-sheet .csv file."""
+    if str(path).lower().endswith(".csv"):
+        with open(path, encoding="utf-8-sig") as f:
+            return {"companies": tablib.Dataset().load(f.read(), format="csv")}
+    with open(path, "rb") as f:
+        book = tablib.Databook().load(f.read(), format="xlsx")
+    sheets = {}
+    for i, sheet in enumerate(book.sheets()):
+        name = header_key(sheet.title)
+        if name in SHEETS:
+            sheets[name] = sheet
+        elif i == 0:
+            sheets.setdefault("companies", sheet)
+    return sheets
+
+
+class ImportReport:
+    """Per-sheet counts, the diff of changed rows, and row errors."""
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.counts = {sheet: Counter() for sheet in SHEETS}
+        self.diff = []  # (sheet, key, {field: (old, new)}, is_new)
+        self.errors = []  # (sheet, row number, message)
+        self.synced_shareholders = (0, 0)  # (created, updated) from directors marked is_shareholder
+        self.elapsed = 0.0
+
+    def add(self, sheet, key, changes, new):
+        self.counts[sheet]["new" if new else "updated"] += 1
+        self.diff.append((sheet, key, changes, new))
+
+    @property
+    def rolled_back(self):
+        return self.dry_run or bool(self.errors)
+
+    def summary(self):
+        parts = []
+        for sheet in SHEETS:
+            c = self.counts[sheet]
+            if sum(c.values()):
+                parts.append(f"{sheet}: {c['new']} new, {c['updated']} updated, {c['unchanged']} unchanged")
+        if any(self.synced_shareholders):
+            parts.append("shareholders from directors: {} new, {} updated".format(*self.synced_shareholders))
+        return "; ".join(parts) or "nothing to import"
+
+
+class BulkCompanyImporter:
+    """
+    Imports workbook sheets (see module docstring). Everything runs in one
+    transaction; with `dry_run`, or if any row fails to convert, it is rolled
+    back and the report holds the diff that would have been applied.
+    """
+
+    def __init__(self, batch_size=None, dry_run=False):
+        self.batch_size = batch_size or getattr(settings, "BULK_IMPORT_BATCH_SIZE", 1000)
+        self.dry_run = dry_run
+        self.report = ImportReport(dry_run)
+        self.touched_companies = set()
+
+    # --- parsing ----------------------------------------------------------
+
+    def parse(self, sheet_name, dataset, model, extra=None):
+        """
+        [(row number, {field: value}, {extra key: value})] for the sheet;
+        errors go to the report. Rows missing a required field (its column is
+        absent or the cell empty) are kept with the field left out, as they
+        can still update an existing record; they are reported if they would
+        create one (see _missing_required).
+        """
+        fields = _importable_fields(model)
+        required = set(required_fields(model))
+        extra = extra or {}
+        columns = []
+        for header in dataset.headers or []:
+            key = header_key(header)
+            if key in extra:
+                columns.append(extra[key])
+            elif key in fields:
+                columns.append(("", fields[key]))
+            else:
+                columns.append(None)  # ignored (e.g. the `id` column of an export)
+
+        rows = []
+        for number, raw_row in enumerate(dataset, start=2):
+            if not any(cell not in (None, "") for cell in raw_row):
+                continue
+            values, related = {}, {}
+            try:
+                for column, cell in zip(columns, raw_row):
+                    if column is None:
+                        continue
+                    target, field = column
+                    if target == "key":
+                        related[field] = str(cell).strip().upper() if cell not in (None, "") else ""
+                    elif target:
+                        related.setdefault(target, {})[field.name] = convert_value(field, cell)
+                    elif field.name in required and cell in (None, ""):
+                        continue
+                    else:
+                        values[field.name] = convert_value(field, cell)
+            except ImportRowError as e:
+                self.report.errors.append((sheet_name, number, str(e)))
+                continue
+            rows.append((number, values, related))
+        return rows
+
+    def parse_companies(self, dataset):
+        from ..admin import CompanyResource
+
+        # CompanyResource's compliance columns ("Financial Year End", ...) land on ComplianceInformation
+        compliance_fields = _importable_fields(ComplianceInformation)
+        extra = {}
+        for resource_field in CompanyResource().fields.values():
+            if resource_field.attribute and resource_field.attribute.startswith("compliance_info__"):
+                name = resource_field.attribute.split("__", 1)[1]
+                extra[header_key(resource_field.column_name)] = ("compliance", compliance_fields[name])
+
+        rows, seen = [], set()
+        for number, values, related in self.parse("companies", dataset, Company, extra):
+            normalize_company(values)
+            ssm = values.get("ssm_number")
+            if not ssm:
+                self.report.errors.append(("companies", number, "ssm_number is required"))
+            elif ssm in seen:
+                self.report.errors.append(("companies", number, f"duplicate ssm_number {ssm}"))
+            else:
+                seen.add(ssm)
+                rows.append((number, values, related))
+        return rows
+
+    def parse_related(self, sheet_name, dataset, model):
+        extra = {"company_ssm_number": ("key", "company_ssm_number")}
+        if "ssm_number" not in _importable_fields(model):
+            extra["ssm_number"] = ("key", "company_ssm_number")
+        rows = []
+        for number, values, related in self.parse(sheet_name, dataset, model, extra):
+            if not related.get("company_ssm_number"):
+                self.report.errors.append((sheet_name, number, "company_ssm_number is required"))
+                continue
+            rows.append((number, values, related["company_ssm_number"]))
+        return rows
+
+    # --- writing ----------------------------------------------------------
+
+    @staticmethod
+    def _changes(instance, values):
+        return {
+            name: (getattr(instance, name), value)
+            for name, value in values.items()
+            if getattr(instance, name) != value
+        }
+
+    def _missing_required(self, sheet_name, number, model, values):
+        """Report a row that would create a `model` without all its required fields; True if it did."""
+        missing = [name for name in required_fields(model) if name not in values]
+        if missing:
+            self.report.errors.append((sheet_name, number, f"new row is missing {', '.join(missing)}"))
+        return bool(missing)
+
+    def _batches(self, rows):
+        for start in range(0, len(rows), self.batch_size):
+            yield rows[start:start + self.batch_size]
+
+    def write_companies(self, rows, companies):
+        """Create/update company rows; `companies` (ssm → Company) gains the new ones."""
+        for batch in self._batches(rows):
+            new, changed, fields = [], [], set()
+            for number, values, _ in batch:
+                company = companies.get(values["ssm_number"])
+                if company is None:
+                    if self._missing_required("companies", number, Company, values):
+                        continue
+                    company = Company(**values)
+                    new.append(company)
+                    self.report.add("companies", values["ssm_number"], {k: (None, v) for k, v in values.items()}, new=True)
+                    continue
+                changes = self._changes(company, values)
+                if not changes:
+                    self.report.counts["companies"]["unchanged"] += 1
+                    continue
+                for name, (_, value) in changes.items():
+                    setattr(company, name, value)
+                fields.update(changes)
+                changed.append(company)
+                self.touched_companies.add(company.pk)
+                self.report.add("companies", values["ssm_number"], changes, new=False)
+
+            if new:
+                Company.objects.bulk_create(new, batch_size=self.batch_size)
+                if any(c.pk is None for c in new):
+                    # Backends that can't return ids from a bulk insert: one query to fetch them
+                    ids = dict(Company.objects.filter(ssm_number__in=[c.ssm_number for c in new]).values_list("ssm_number", "pk"))
+                    for c in new:
+                        c.pk = ids[c.ssm_number]
+                for c in new:
+                    companies[c.ssm_number] = c
+            if changed:
+                Company.objects.bulk_update(changed, sorted(fields), batch_size=self.batch_size)
+
+    def write_related(self, sheet_name, model, rows, companies, key):
+        """
+        Create/update rows of `model` matched on `key(company_id, values)`:
+        one SELECT, one INSERT and one UPDATE per batch. Returns the written
+        objects as (obj, changed field names), None for new objects.
+        """
+        written = []
+        for batch in self._batches(rows):
+            resolved = []
+            for number, values, ssm in batch:
+                company = companies.get(ssm)
+                if company is None:
+                    self.report.errors.append((sheet_name, number, f"unknown company {ssm}"))
+                    continue
+                resolved.append((number, company, values))
+
+            existing = {}
+            for obj in model.objects.filter(company_id__in={c.pk for _, c, _ in resolved}).order_by("-pk"):
+                existing[key(obj.company_id, obj.__dict__)] = obj  # lowest pk wins on duplicates
+
+            new, changed, fields = [], [], set()
+            for number, company, values in resolved:
+                row_key = key(company.pk, values)
+                label = f"{company.ssm_number} / {values.get('full_name') or company.company_name}"
+                obj = existing.get(row_key)
+                if obj is None:
+                    if self._missing_required(sheet_name, number, model, values):
+                        continue
+                    obj = existing[row_key] = model(company_id=company.pk, **values)
+                    new.append(obj)
+                    self.touched_companies.add(company.pk)
+                    self.report.add(sheet_name, label, {k: (None, v) for k, v in values.items()}, new=True)
+                    continue
+                if obj.pk is None:
+                    # The same person twice in the sheet: the later row wins
+                    for name, value in values.items():
+                        setattr(obj, name, value)
+                    continue
+                changes = self._changes(obj, values)
+                if not changes:
+                    self.report.counts[sheet_name]["unchanged"] += 1
+                    continue
+                for name, (_, value) in changes.items():
+                    setattr(obj, name, value)
+                fields.update(changes)
+                if obj not in changed:
+                    changed.append(obj)
+                self.touched_companies.add(company.pk)
+                self.report.add(sheet_name, label, changes, new=False)
+
+            if new:
+                model.objects.bulk_create(new, batch_size=self.batch_size)
+            if changed:
+                model.objects.bulk_update(changed, sorted(fields), batch_size=self.batch_size)
+            written += [(obj, None) for obj in new] + [(obj, fields) for obj in changed]
+        return written
+
+    # --- entry point ------------------------------------------------------
+
+    def run(self, sheets):
+        """Import `sheets` ({name: tablib.Dataset}, see load_workbook) and return the ImportReport."""
+        started = time.perf_counter()
+        company_rows = self.parse_companies(sheets["companies"]) if "companies" in sheets else []
+        director_rows = self.parse_related("directors", sheets["directors"], Director) if "directors" in sheets else []
+        shareholder_rows = self.parse_related("shareholders", sheets["shareholders"], Shareholder) if "shareholders" in sheets else []
+        compliance_rows = self.parse_related("compliance", sheets["compliance"], ComplianceInformation) if "compliance" in sheets else []
+        # Compliance columns on the company sheet (CompanyResource layout)
+        compliance_rows += [
+            (number, related["compliance"], values["ssm_number"])
+            for number, values, related in company_rows
+            if any(value not in (None, "") for value in related.get("compliance", {}).values())
+        ]
+
+        # Every company the workbook mentions, in one query
+        ssm_numbers = {values["ssm_number"] for _, values, _ in company_rows}
+        ssm_numbers.update(ssm for rows in (director_rows, shareholder_rows, compliance_rows) for _, _, ssm in rows)
+        companies = Company.objects.in_bulk(list(ssm_numbers), field_name="ssm_number") if ssm_numbers else {}
+
+        def person(company_id, values):
+            return person_key(company_id, values.get("full_name"), values.get("ic_passport"))
+
+        try:
+            with transaction.atomic():
+                self.write_companies(company_rows, companies)
+                self.write_related("compliance", ComplianceInformation, compliance_rows, companies,
+                                   key=lambda company_id, values: company_id)
+                directors = self.write_related("directors", Director, director_rows, companies, key=person)
+                self.write_related("shareholders", Shareholder, shareholder_rows, companies, key=person)
+                # After the shareholders sheet, so its explicit rows are matched rather than duplicated
+                self.report.synced_shareholders = sync_shareholders(directors)
+                if self.report.rolled_back:
+                    raise _Rollback
+                # bulk_update sends no post_save, so drop cached PDFs of changed companies here
+                for company_id in self.touched_companies:
+                    invalidate_on_commit(company_id=company_id)
+        except _Rollback:
+            pass
+
+        self.report.elapsed = time.perf_counter() - started
+        return self.report
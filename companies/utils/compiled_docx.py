@@ -0,0 +1,153 @@
+# companies/utils/compiled_docx.py
+import hashlib
+import io
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+
+import docx.oxml.ns
+from django.conf import settings
+from docxtpl import DocxTemplate
+from jinja2 import Environment
+from lxml import etree
+
+from .template_cache import get_template_cache
+
+FOOTNOTES_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.footnotes+xml"
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+# Core properties docxtpl renders as Jinja (see DocxTemplate.render_properties)
+TEMPLATED_PROPERTIES = ("author", "comments", "identifier", "language", "subject", "title")
+
+
+class CompiledDocxTemplate:
+    """
+    A .docx template parsed and compiled once, renderable many times.
+
+    ``DocxTemplate.render()`` re-opens the package with python-docx, re-runs the
+    regex clean-up in ``patch_xml`` and recompiles Jinja for every call. Here that
+    work happens in ``__init__``; ``render()`` only evaluates the compiled Jinja
+    templates and swaps the rendered XML parts into a copy of the original zip.
+    Output matches ``DocxTemplate.render()`` for body, headers, footers and
+    footnotes. Templates with Jinja in their core properties fall back to
+    docxtpl for every render.
+
+    Instances are immutable after construction and safe to share between threads.
+    """
+
+    def __init__(self, template_bytes, jinja_env=None, digest=None):
+        self.template_bytes = template_bytes
+        self.digest = digest or hashlib.sha256(template_bytes).hexdigest()
+        self.jinja_env = jinja_env or Environment()
+
+        tpl = DocxTemplate(io.BytesIO(template_bytes))
+        tpl.render_init()
+        # Kept only for docxtpl's stateless helpers (patch_xml, resolve_listing, fix_tables)
+        self._tpl = tpl
+
+        main = tpl.docx.part
+        self._parts = OrderedDict()  # zip member name -> (compiled jinja template, is_body)
+        self._parts[main.partname.lstrip("/")] = (self._compile(tpl.xml_to_string(tpl.docx.element)), True)
+
+        for rel in main.rels.values():
+            if rel.is_external or rel.reltype not in (tpl.HEADER_URI, tpl.FOOTER_URI):
+                continue
+            part = rel.target_part
+            if part.blob:
+                self._parts[part.partname.lstrip("/")] = (self._compile(tpl.get_part_xml(part)), False)
+
+        for part in main.package.parts:
+            if part.content_type == FOOTNOTES_CONTENT_TYPE:
+                blob = part.blob.decode("utf-8") if isinstance(part.blob, bytes) else part.blob
+                blob = re.sub(r"^\s*<\?xml[^>]*\?>\s*", "", blob)  # XML_DECLARATION is re-added on render
+                self._parts[part.partname.lstrip("/")] = (self._compile(blob), False)
+
+        props = tpl.docx.core_properties
+        self.fallback = any(
+            "{{" in value or "{%" in value
+            for value in (getattr(props, name) or "" for name in TEMPLATED_PROPERTIES)
+        )
+
+        with zipfile.ZipFile(io.BytesIO(template_bytes)) as zin:
+            self._members = [(info, zin.read(info.filename)) for info in zin.infolist()]
+
+    def _compile(self, xml):
+        xml = self._tpl.patch_xml(xml)
+        xml = re.sub(r"<w:p([ >])", r"\n<w:p\1", xml)
+        return self.jinja_env.from_string(xml)
+
+    def _render_xml(self, template, context):
+        xml = template.render(context)
+        xml = re.sub(r"\n<w:p([ >])", r"<w:p\1", xml)
+        xml = (
+            xml.replace("{_{", "{{")
+            .replace("}_}", "}}")
+            .replace("{_%", "{%")
+            .replace("%_}", "%}")
+        )
+        return self._tpl.resolve_listing(xml)
+
+    def _render_body(self, template, context):
+        tree = self._tpl.fix_tables(self._render_xml(template, context))
+        # Same renumbering as DocxTemplate.fix_docpr_ids, starting from its default index
+        docpr_id = 1000
+        for elt in tree.xpath("//wp:docPr", namespaces=docx.oxml.ns.nsmap):
+            docpr_id += 1
+            elt.attrib["id"] = str(docpr_id)
+        return etree.tostring(tree, encoding="UTF-8", xml_declaration=True, standalone=True)
+
+    def render(self, context):
+        """Render ``context`` and return the .docx as bytes."""
+        if self.fallback:
+            tpl = DocxTemplate(io.BytesIO(self.template_bytes))
+            tpl.render(context, self.jinja_env)
+            buf = io.BytesIO()
+            tpl.save(buf)
+            return buf.getvalue()
+
+        rendered = {}
+        for name, (template, is_body) in self._parts.items():
+            if is_body:
+                rendered[name] = self._render_body(template, context)
+            else:
+                rendered[name] = (XML_DECLARATION + self._render_xml(template, context)).encode("utf-8")
+
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zout:
+            for info, data in self._members:
+                # Fresh ZipInfo per render: writestr() mutates it, and renders run in parallel threads
+                member = zipfile.ZipInfo(info.filename, info.date_time)
+                member.compress_type = info.compress_type
+                member.external_attr = info.external_attr
+                zout.writestr(member, rendered.get(info.filename, data))
+        return buf.getvalue()
+
+
+# Compiled templates keyed by content hash, so an edited template on GitHub
+# (new bytes → new hash) is recompiled automatically.
+_compiled = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+def compile_template_bytes(template_bytes, digest):
+    with _compiled_lock:
+        compiled = _compiled.get(digest)
+        if compiled is not None:
+            _compiled.move_to_end(digest)
+            return compiled
+
+    compiled = CompiledDocxTemplate(template_bytes, digest=digest)
+
+    with _compiled_lock:
+        _compiled[digest] = compiled
+        _compiled.move_to_end(digest)
+        while len(_compiled) > getattr(settings, "DOC_TEMPLATE_COMPILED_CACHE_SIZE", 16):
+            _compiled.popitem(last=False)
+    return compiled
+
+
+def get_compiled_template(url):
+    """Fetch ``url`` through the template cache and return its compiled form."""
+    content, digest = get_template_cache().get(url)
+    return compile_template_bytes(content, digest)
@@ -0,0 +1,93 @@
+# companies/utils/doc_bulk.py
+import io
+import logging
+
+from django.utils.text import slugify
+from docx import Document
+from docxcompose.composer import Composer
+
+from .compiled_docx import compile_template_bytes
+from .doc_context import CompanyDocumentContext
+from .doc_generate import DocumentGenerationError, GeneratedDocument
+from .parallel_render import render_documents
+from .template_cache import TemplateFetchError, get_template_cache
+from .word_to_pdf import convert_docx_to_pdf
+from .zip_stream import stream_zip
+
+logger = logging.getLogger(__name__)
+
+# Companies loaded per round trip; each chunk costs 3 queries (companies with contact/compliance, directors, shareholders)
+BULK_CHUNK_SIZE = 200
+
+
+class BulkStats:
+    def __init__(self):
+        self.documents = 0
+        self.errors = 0
+
+
+def _bulk_jobs(company_ids, doc_template):
+    """(filename, context) for every document of every company, one folder per company in ZIPs."""
+    per_director = getattr(doc_template, "per_director", False)
+    for context in CompanyDocumentContext.batch(company_ids, chunk_size=BULK_CHUNK_SIZE):
+        company = context.company
+        safe_company = slugify(company.company_name) or f"company-{company.id}"
+        if per_director:
+            for director in context.directors:
+                safe_director = slugify(director.full_name) or "director"
+                yield f"{safe_company}/{safe_company}_{safe_director}_{doc_template.name}.docx", context.director(director)
+        else:
+            yield f"{safe_company}_{doc_template.name}.docx", context.single
+
+
+def _counted(documents, stats):
+    for name, data in documents:
+        if name.endswith("_ERROR.txt"):
+            stats.errors += 1
+        else:
+            stats.documents += 1
+        yield name, data
+
+
+def generate_bulk_documents(company_ids, doc_template, output_format="zip"):
+    """
+    Render ``doc_template`` for every company in ``company_ids``.
+
+    Returns ``(GeneratedDocument, BulkStats)``. For "zip" the content is a
+    streamed archive and the stats fill in as it is consumed; for "pdf" every
+    document is merged with docxcompose and converted by LibreOffice once.
+    """
+    try:
+        template_bytes, template_digest = get_template_cache().get(doc_template.github_url)
+    except TemplateFetchError:
+        raise DocumentGenerationError("Error downloading template from GitHub.", status=500)
+
+    compiled = compile_template_bytes(template_bytes, template_digest)
+    stats = BulkStats()
+    documents = _counted(render_documents(compiled, _bulk_jobs(company_ids, doc_template)), stats)
+    base_name = slugify(doc_template.name) or "documents"
+
+    if output_format != "pdf":
+        return GeneratedDocument(f"{base_name}_bulk.zip", "application/zip", stream_zip(documents)), stats
+
+    composer = None
+    for name, data in documents:
+        if name.endswith("_ERROR.txt"):
+            logger.warning("Skipping %s in merged PDF", name)
+            continue
+        doc = Document(io.BytesIO(data))
+        if composer is None:
+            composer = Composer(doc)
+        else:
+            composer.doc.add_page_break()
+            composer.append(doc)
+
+    if composer is None:
+        raise DocumentGenerationError("No documents could be generated for the selected companies.")
+
+    buf = io.BytesIO()
+    composer.save(buf)
+    # One LibreOffice run for the whole batch; allow it more time than a single document
+    pdf_bytes = convert_docx_to_pdf(buf.getvalue(), timeout=max(60, stats.documents))
+    return GeneratedDocument(f"{base_name}_bulk.pdf", "application/pdf", pdf_bytes), stats
+
@@ -0,0 +1,155 @@
+# companies/utils/doc_context.py
+from datetime import date
+from functools import cached_property
+from itertools import zip_longest
+
+from django.db.models import Prefetch
+
+from ..models import Company, ContactPerson, ComplianceInformation, Director, Shareholder
+
+
+def safe_date(dt):
+    return dt.strftime("%Y-%m-%d") if dt else ''
+
+
+def document_companies():
+    """
+    Companies with everything a document needs, in 3 queries however many are
+    loaded: companies + contact person + compliance info (JOIN), directors,
+    shareholders.
+    """
+    return (
+        Company.objects
+        .select_related('contactperson', 'compliance_info')
+        .prefetch_related(
+            Prefetch('director_set', queryset=Director.objects.order_by('id')),
+            Prefetch('shareholder_set', queryset=Shareholder.objects.order_by('id')),
+        )
+    )
+
+
+class CompanyDocumentContext:
+    """
+    The one place document contexts are built: the Generate Document page,
+    previews, e-mail attachments, background jobs and bulk runs.
+
+    Build it from a company loaded by ``document_companies()`` (``load()`` and
+    ``batch()`` do that); ``of(company)`` memoizes it on the instance, so a
+    request that handles one company object builds the context once.
+    """
+
+    def __init__(self, company, today=None):
+        self.company = company
+        self.today = today or date.today()
+
+    @classmethod
+    def load(cls, company_id):
+        return cls.of(document_companies().get(pk=company_id))
+
+    @classmethod
+    def of(cls, company):
+        context = getattr(company, "_document_context", None)
+        if context is None:
+            context = company._document_context = cls(company)
+        return context
+
+    @classmethod
+    def batch(cls, company_ids, chunk_size=200, order_by=('company_name', 'id')):
+        """Providers for many companies, 3 queries per `chunk_size` companies."""
+        companies = document_companies().filter(id__in=company_ids).order_by(*order_by)
+        for company in companies.iterator(chunk_size=chunk_size):
+            yield cls.of(company)
+
+    # --- related rows (prefetched when loaded via document_companies) -----
+
+    @cached_property
+    def directors(self):
+        return list(self.company.director_set.all())
+
+    @cached_property
+    def shareholders(self):
+        return list(self.company.shareholder_set.all())
+
+    @cached_property
+    def contact_person(self):
+        try:
+            return self.company.contactperson
+        except ContactPerson.DoesNotExist:
+            return None
+
+    @cached_property
+    def compliance(self):
+        try:
+            return self.company.compliance_info
+        except ComplianceInformation.DoesNotExist:
+            return None
+
+    # --- contexts ----------------------------------------------------------
+
+    @cached_property
+    def base(self):
+        """Base context used for single-doc generation and as part of per-director generation."""
+        company = self.company
+        directors = self.directors
+        contact = self.contact_person
+        compliance = self.compliance
+
+        # director_rows = [ {'left': {...} or None, 'right': {...} or None}, ... ]
+        director_rows = []
+        for left, right in zip_longest(*(iter(directors),) * 2, fillvalue=None):
+            director_rows.append({
+                'left': {'name': left.full_name, 'line': '___________________'} if left else None,
+                'right': {'name': right.full_name, 'line': '___________________'} if right else None,
+            })
+
+        return {
+            "company_name": company.company_name or '',
+            "ssm_number": company.ssm_number or '',
+            "incorporation_date": safe_date(company.incorporation_date),
+            "amr_cosec_branch": getattr(company, 'amr_cosec_branch', ''),
+            "generated_date": self.today.strftime("%d %B %Y"),
+            "directors": [{"name": d.full_name, "ic": getattr(d, 'ic_passport', '')} for d in directors],
+            "shareholders": [{"name": s.full_name, "ic": getattr(s, 'ic_passport', '')} for s in self.shareholders],
+            "director_rows": director_rows,
+            "contact_person_name": contact.name if contact else '',
+            "contact_person_email": contact.email if contact else '',
+            "contact_person_phone": contact.phone_number if contact else '',
+            "financial_year_end": (compliance.financial_year_end or '') if compliance else '',
+            "auditor_name": (compliance.auditor_name or '') if compliance else '',
+            "tax_agent_name": (compliance.tax_agent_name or '') if compliance else '',
+        }
+
+    def director(self, director):
+        """Context for one director's copy of a per-director template."""
+        ctx = dict(self.base)
+        ctx.update({
+            "director_name": director.full_name or '',
+            "director_ic": getattr(director, 'ic_passport', '') or '',
+            "director_address": getattr(director, 'residential_address', '') or '',
+            "director_email": getattr(director, 'email', '') or '',
+        })
+        return ctx
+
+    def find_director(self, director_id):
+        return next((d for d in self.directors if str(d.id) == str(director_id)), None)
+
+    @cached_property
+    def single(self):
+        """Context for one document per company: adds numbered director_N / shareholder_N slots."""
+        context = dict(self.base)
+
+        for i, d in enumerate(self.directors, start=1):
+            context[f"director_{i}_name"] = d.full_name or ''
+            context[f"director_{i}_ic"] = getattr(d, 'ic_passport', '') or ''
+
+        for i in range(len(self.directors) + 1, 6):
+            context[f"director_{i}_name"] = ''
+            context[f"director_{i}_ic"] = ''
+
+        for i, s in enumerate(self.shareholders, start=1):
+            context[f"shareholder_{i}_name"] = s.full_name or ''
+
+        for i in range(len(self.shareholders) + 1, 6):
+            context[f"shareholder_{i}_name"] = ''
+
+        return context
@@ -0,0 +1,105 @@
+# companies/utils/doc_generate.py
+from collections import namedtuple
+
+from django.utils.text import slugify
+
+from .compiled_docx import compile_template_bytes
+from .doc_context import CompanyDocumentContext
+from .parallel_render import render_documents
+from .pdf_cache import get_pdf_cache
+from .template_cache import TemplateFetchError, get_template_cache
+from .timing import TimedIterator, stage
+from .word_to_pdf import convert_docx_to_pdf
+from .zip_stream import stream_zip
+
+DOCX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+# content is either bytes or an iterator of byte chunks (streamed ZIP bundles)
+GeneratedDocument = namedtuple("GeneratedDocument", ["filename", "content_type", "content"])
+
+
+class DocumentGenerationError(Exception):
+    """A document could not be produced; ``status`` is the HTTP status the view should use."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def generate_document(company, doc_template, director_id=None, action="generate"):
+    """
+    Produce the document the "Generate Document" page asks for:
+      - a specific director           → one .docx
+      - a per-director template       → a ZIP with one .docx per director (streamed)
+      - otherwise                     → one .docx, or a PDF when action == "preview"
+    Shared by the web view and the background job worker.
+    """
+    template_url = doc_template.github_url
+    if not template_url:
+        raise DocumentGenerationError("No GitHub URL set for this template.", status=400)
+
+    # Download the file from GitHub (served from the local template cache when fresh)
+    try:
+        with stage("fetch"):
+            template_bytes, template_digest = get_template_cache().get(template_url)
+    except TemplateFetchError:
+        raise DocumentGenerationError("Error downloading template from GitHub.", status=500)
+
+    # Memoized on the company object; one query set for the whole request
+    with stage("context"):
+        context_provider = CompanyDocumentContext.of(company)
+        directors = context_provider.directors
+
+    # === Specific director selection ===
+    if director_id and director_id != "all":
+        director = context_provider.find_director(director_id)
+        if director is None:
+            raise DocumentGenerationError("Director not found for this company.", status=404)
+        with stage("render"):
+            compiled = compile_template_bytes(template_bytes, template_digest)
+            content = compiled.render(context_provider.director(director))
+        filename = f"{slugify(company.company_name)}_{slugify(director.full_name)}_{doc_template.name}.docx"
+        return GeneratedDocument(filename, DOCX_CONTENT_TYPE, content)
+
+    # ---- Per-director mode: create one file per director and return a ZIP ----
+    if getattr(doc_template, "per_director", False):
+        if not directors:
+            raise DocumentGenerationError("No directors found for this company.", status=400)
+
+        # Parse + compile the template once, then render it for every director
+        compiled = compile_template_bytes(template_bytes, template_digest)
+        safe_company = slugify(company.company_name) or "company"
+
+        def director_jobs():
+            for director in directors:
+                safe_director = slugify(director.full_name) or "director"
+                file_name = f"{safe_company}_{safe_director}_{doc_template.name}.docx"
+                yield file_name, context_provider.director(director)
+
+        # Render directors in parallel (results keep director order) and stream the ZIP;
+        # a director that fails to render becomes an *_ERROR.txt entry instead of a 500
+        # (both happen while the response streams, so they are timed as it is consumed)
+        documents = TimedIterator(render_documents(compiled, director_jobs()), "render")
+        content = TimedIterator(stream_zip(documents), "zip", nested=documents, finish=True)
+        return GeneratedDocument(f"{safe_company}_directors.zip", "application/zip", content)
+
+    # ---- Normal single-document generation ----
+    with stage("context"):
+        context = context_provider.single
+
+    def render_docx():
+        # Straight from the cached template bytes into memory: no temp files, no MEDIA_ROOT copy
+        with stage("render"):
+            return compile_template_bytes(template_bytes, template_digest).render(context)
+
+    filename = f"{company.company_name or 'company'}_{doc_template.name}"
+
+    if action == "preview":
+        # Unchanged template + unchanged company data → cached PDF, no render and no LibreOffice
+        pdf_bytes = get_pdf_cache().get_or_render(
+            company.id, doc_template.id, template_digest, context,
+            lambda: convert_docx_to_pdf(render_docx()),
+        )
+        return GeneratedDocument(f"{filename}.pdf", "application/pdf", pdf_bytes)
+
+    return GeneratedDocument(f"{filename}.docx", DOCX_CONTENT_TYPE, render_docx())
@@ -0,0 +1,217 @@
+# companies/utils/doc_jobs.py
+import logging
+import os
+import secrets
+import socket
+import tempfile
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import DocumentJob
+from .doc_bulk import generate_bulk_documents
+from .doc_context import document_companies
+from .doc_generate import generate_document
+from .timing import timing
+
+logger = logging.getLogger(__name__)
+
+
+def lease_token():
+    """DocumentJob.locked_by for one claim: the worker process plus a token unique to the claim."""
+    return f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+
+
+def enqueue_document_job(company, doc_template, director_id="all", action="generate", user=None):
+    return DocumentJob.objects.create(
+        company=company,
+        template=doc_template,
+        director_id=str(director_id or "all"),
+        action=action,
+        requested_by=user if user is not None and user.is_authenticated else None,
+    )
+
+
+def enqueue_bulk_document_job(company_ids, doc_template, output_format="zip", user=None):
+    return DocumentJob.objects.create(
+        company_ids=list(company_ids),
+        template=doc_template,
+        action="bulk",
+        output_format=output_format,
+        requested_by=user if user is not None and user.is_authenticated else None,
+    )
+
+
+def claim_next_job():
+    """
+    Atomically take the oldest runnable job, or return None.
+
+    Claiming is a conditional UPDATE on the row's current (status, locked_until),
+    so two workers can never both win the same job — this works the same on
+    SQLite and Postgres without SELECT ... FOR UPDATE. A RUNNING job whose lease
+    has expired (worker killed mid-job; run_job keeps the lease of a live one
+    extended) is picked up again until it has used DOC_JOB_MAX_ATTEMPTS attempts.
+    """
+    now = timezone.now()
+    lease = timedelta(seconds=getattr(settings, "DOC_JOB_LEASE_SECONDS", 600))
+    max_attempts = getattr(settings, "DOC_JOB_MAX_ATTEMPTS", 3)
+
+    candidates = (
+        DocumentJob.objects
+        .filter(Q(status=DocumentJob.STATUS_QUEUED) | Q(status=DocumentJob.STATUS_RUNNING, locked_until__lt=now))
+        .order_by('created_at')
+        .values_list('pk', 'status', 'locked_until', 'attempts')[:10]
+    )
+    for pk, status, locked_until, attempts in candidates:
+        row = DocumentJob.objects.filter(pk=pk, status=status, locked_until=locked_until)
+
+        if status == DocumentJob.STATUS_RUNNING and attempts >= max_attempts:
+            row.update(
+                status=DocumentJob.STATUS_FAILED,
+                error="Worker stopped responding while processing this job.",
+                locked_until=None,
+                finished_at=now,
+            )
+            continue
+
+        claimed = row.update(
+            status=DocumentJob.STATUS_RUNNING,
+            locked_until=now + lease,
+            locked_by=lease_token(),
+            started_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            job = DocumentJob.objects.select_related('template').get(pk=pk)
+            if job.company_id:
+                job.company = document_companies().get(pk=job.company_id)
+            return job
+    return None
+
+
+class JobHeartbeat:
+    """
+    Extends a running job's lease every third of DOC_JOB_LEASE_SECONDS from a
+    background thread, so a job that runs longer than the lease (a large bulk
+    job) is not taken for abandoned and run again by another worker. `lost` is
+    set once the row is no longer held by this worker.
+    """
+
+    def __init__(self, job, lease=None):
+        self.job = job
+        self.lease = lease or getattr(settings, "DOC_JOB_LEASE_SECONDS", 600)
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"job-{job.pk}-heartbeat", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def beat(self):
+        extended = (
+            DocumentJob.objects
+            .filter(pk=self.job.pk, status=DocumentJob.STATUS_RUNNING, locked_by=self.job.locked_by)
+            .update(locked_until=timezone.now() + timedelta(seconds=self.lease))
+        )
+        if not extended:
+            self.lost = True
+
+    def _run(self):
+        try:
+            while not self.lost and not self._stop.wait(self.lease / 3):
+                try:
+                    self.beat()
+                except Exception:
+                    # Try again next beat; the lease still has two thirds left
+                    logger.warning("Document job %s: lease extension failed", self.job.pk, exc_info=True)
+            if self.lost:
+                logger.warning("Document job %s: lease lost to another worker", self.job.pk)
+        finally:
+            connection.close()  # this thread's own DB connection
+
+
+def run_job(job):
+    """
+    Generate the job's document and store it in MEDIA storage. The final
+    state is written only while this worker still holds the job; otherwise
+    the result is discarded and `job` is reloaded with the row's current state.
+    """
+    stats = None
+    try:
+        with timing(job.template.name, job=job.pk, action=job.action), JobHeartbeat(job):
+            if job.action == "bulk":
+                document, stats = generate_bulk_documents(job.company_ids, job.template, job.output_format)
+            else:
+                document = generate_document(job.company, job.template, job.director_id, job.action)
+
+            # Spool through a temp file so streamed ZIP bundles never sit fully in memory
+            with tempfile.TemporaryFile() as fh:
+                if isinstance(document.content, bytes):
+                    fh.write(document.content)
+                else:
+                    for chunk in document.content:
+                        fh.write(chunk)
+                fh.seek(0)
+                job.result.save(document.filename, File(fh), save=False)
+
+        job.result_name = document.filename
+        job.documents_count = stats.documents if stats else 1
+        job.failed_count = stats.errors if stats else 0
+        job.result_content_type = document.content_type
+        job.status = DocumentJob.STATUS_SUCCEEDED
+        job.error = ""
+    except Exception as e:
+        logger.exception("Document job %s failed", job.pk)
+        job.status = DocumentJob.STATUS_FAILED
+        job.error = f"{type(e).__name__}: {e}"
+
+    job.finished_at = timezone.now()
+    job.locked_until = None
+    finished = (
+        DocumentJob.objects
+        .filter(pk=job.pk, status=DocumentJob.STATUS_RUNNING, locked_by=job.locked_by)
+        .update(
+            status=job.status,
+            error=job.error,
+            result=job.result.name,
+            result_name=job.result_name,
+            result_content_type=job.result_content_type,
+            documents_count=job.documents_count,
+            failed_count=job.failed_count,
+            finished_at=job.finished_at,
+            locked_until=None,
+        )
+    )
+    if not finished:
+        logger.warning("Document job %s was taken over by another worker; discarding this run's result", job.pk)
+        if job.result:
+            job.result.delete(save=False)
+        job.refresh_from_db()
+    return job
+
+
+def purge_finished_jobs(days=None):
+    """Delete finished jobs (and their files) older than DOC_JOB_RETENTION_DAYS."""
+    days = days if days is not None else getattr(settings, "DOC_JOB_RETENTION_DAYS", 7)
+    cutoff = timezone.now() - timedelta(days=days)
+    old = DocumentJob.objects.filter(
+        status__in=[DocumentJob.STATUS_SUCCEEDED, DocumentJob.STATUS_FAILED],
+        finished_at__lt=cutoff,
+    )
+    count = 0
+    for job in old.iterator():
+        if job.result:
+            job.result.delete(save=False)
+        job.delete()
+        count += 1
+    return count
@@ -0,0 +1,113 @@
+# companies/utils/email_templates.py
+"""
+Compiled EmailTemplate rendering.
+
+Subjects and bodies are Django template strings using the placeholders in
+EMAIL_CONTEXT_SCHEMA. Each (subject, body) pair is compiled once and cached
+per process; the entry for an EmailTemplate row is dropped on post_save and
+post_delete, and entries are also checked against the row's current text, so
+a worker process never renders a stale copy edited elsewhere. Rows are
+validated on pre_save too, so a bad template is rejected however it is saved.
+"""
+import threading
+
+from django.core.exceptions import ValidationError
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.template import Context, Engine, TemplateSyntaxError
+from django.template.base import VariableNode
+
+# Placeholders available to every e-mail template (dates are dd-mm-YYYY)
+EMAIL_CONTEXT_SCHEMA = {
+    "company_name": "Company name",
+    "ssm_number": "SSM registration number",
+    "incorporation_date": "Incorporation date",
+    "anniversary_date": "Next (or reminder) anniversary date",
+    "due_date": "Annual return due date (anniversary + 30 days)",
+    "generated_date": "Today's date",
+}
+
+# Plain-text mail: no HTML escaping, standalone so project TEMPLATES settings don't apply
+_engine = Engine(autoescape=False)
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class CompiledEmailTemplate:
+    def __init__(self, subject, body):
+        self.subject_source = subject
+        self.body_source = body
+        self.subject = _engine.from_string(subject)
+        self.body = _engine.from_string(body)
+
+    def render(self, context):
+        """(subject, body) for one context dict."""
+        ctx = Context(context, autoescape=False)
+        # Header values cannot span lines
+        subject = " ".join(self.subject.render(ctx).split())
+        return subject, self.body.render(ctx)
+
+    def render_many(self, contexts):
+        """(subject, body) per context, reusing one Context for the whole batch."""
+        ctx = Context(autoescape=False)
+        for context in contexts:
+            with ctx.push(context):
+                yield " ".join(self.subject.render(ctx).split()), self.body.render(ctx)
+
+
+def template_placeholders(text):
+    """Root variable names used in a template string, e.g. {'company_name'} for '{{ company_name|upper }}'."""
+    names = set()
+    for node in _engine.from_string(text).nodelist.get_nodes_by_type(VariableNode):
+        var = node.filter_expression.var
+        lookups = getattr(var, "lookups", None)
+        if lookups:
+            names.add(lookups[0])
+    return names
+
+
+def validate_template_text(text):
+    """Raise ValidationError for a syntax error or a placeholder outside EMAIL_CONTEXT_SCHEMA."""
+    try:
+        unknown = template_placeholders(text) - EMAIL_CONTEXT_SCHEMA.keys()
+    except TemplateSyntaxError as e:
+        raise ValidationError(f"Template error: {e}")
+    if unknown:
+        raise ValidationError(
+            "Unknown placeholder(s): %(unknown)s. Available: %(known)s.",
+            params={
+                "unknown": ", ".join("{{ %s }}" % name for name in sorted(unknown)),
+                "known": ", ".join("{{ %s }}" % name for name in EMAIL_CONTEXT_SCHEMA),
+            },
+        )
+
+
+def compile_email_template(subject, body, key=None):
+    """Compiled form of (subject, body), cached under `key` (defaults to the text itself)."""
+    key = key if key is not None else (subject, body)
+    compiled = _cache.get(key)
+    if compiled is None or compiled.subject_source != subject or compiled.body_source != body:
+        compiled = CompiledEmailTemplate(subject, body)
+        with _cache_lock:
+            _cache[key] = compiled
+    return compiled
+
+
+def get_compiled_email_template(template):
+    """Compiled form of an EmailTemplate row."""
+    return compile_email_template(template.subject, template.body, key=("EmailTemplate", template.pk))
+
+
+@receiver(pre_save, sender="companies.EmailTemplate")
+def _validate_before_save(sender, instance, update_fields=None, **kwargs):
+    # The shell, fixtures and imports never run the admin form's clean()
+    if update_fields is None or {"subject", "body"} & set(update_fields):
+        instance.validate_placeholders()
+
+
+@receiver(post_save, sender="companies.EmailTemplate")
+@receiver(post_delete, sender="companies.EmailTemplate")
+def _forget_compiled_template(sender, instance, **kwargs):
+    with _cache_lock:
+        _cache.pop(("EmailTemplate", instance.pk), None)
@@ -0,0 +1,129 @@
+# companies/utils/export_stream.py
+"""
+Streaming CSV/XLSX export of an import-export Resource.
+
+tablib builds the whole Dataset (and the whole file) in memory before the
+response starts; here rows come from ``.iterator(chunk_size)`` and are
+encoded and sent as they are produced, so memory stays flat however many
+companies are exported. XLSX is written as a minimal SpreadsheetML package
+(inline strings, no styles) through stream_zip.
+"""
+import csv
+import re
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .zip_stream import stream_zip
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Characters XML 1.0 cannot carry (Excel refuses the file otherwise)
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_LINES_PER_CHUNK = 200
+
+
+def export_rows(resource, queryset, chunk_size=None):
+    """Header row, then one row per object, read `chunk_size` at a time."""
+    chunk_size = chunk_size or getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+    yield resource.get_export_headers()
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        yield resource.export_resource(obj)
+
+
+class _Echo:
+    """csv.writer target that returns the line instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    yield "\ufeff".encode("utf-8")  # BOM so Excel opens UTF-8 names correctly
+    lines = []
+    for row in rows:
+        lines.append(writer.writerow(["" if v is None else v for v in row]))
+        if len(lines) >= _LINES_PER_CHUNK:
+            yield "".join(lines).encode("utf-8")
+            lines.clear()
+    if lines:
+        yield "".join(lines).encode("utf-8")
+
+
+def _xlsx_cell(value):
+    if value is None or value == "":
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f"<c><v>{value}</v></c>"
+    if isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    text = escape(_XML_ILLEGAL.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_sheet(rows):
+    yield (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+    ).encode("utf-8")
+    lines = []
+    for row in rows:
+        lines.append("<row>" + "".join(_xlsx_cell(v) for v in row) + "</row>")
+        if len(lines) >= _LINES_PER_CHUNK:
+            yield "".join(lines).encode("utf-8")
+            lines.clear()
+    lines.append("</sheetData></worksheet>")
+    yield "".join(lines).encode("utf-8")
+
+
+def stream_xlsx(rows, sheet_name="Sheet1"):
+    parts = [
+        ("[Content_Types].xml",
+         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+         '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+         '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+         '<Default Extension="xml" ContentType="application/xml"/>'
+         '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+         '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+         '</Types>'),
+        ("_rels/.rels",
+         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+         '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+         '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+         '</Relationships>'),
+        ("xl/workbook.xml",
+         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+         '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+         'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+         f'<sheets><sheet name="{escape(sheet_name, {chr(34): "&quot;"})}" sheetId="1" r:id="rId1"/></sheets>'
+         '</workbook>'),
+        ("xl/_rels/workbook.xml.rels",
+         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+         '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+         '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+         '</Relationships>'),
+    ]
+    entries = [(name, xml.encode("utf-8")) for name, xml in parts]
+    entries.append(("xl/worksheets/sheet1.xml", _xlsx_sheet(rows)))
+    return stream_zip(entries)
+
+
+def streaming_export_response(resource, queryset, file_format, basename):
+    """StreamingHttpResponse exporting `queryset` through `resource` as csv or xlsx."""
+    rows = export_rows(resource, queryset)
+    content = stream_xlsx(rows, sheet_name=basename[:31]) if file_format == "xlsx" else stream_csv(rows)
+    response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[file_format])
+    filename = f"{basename}-{timezone.localtime():%Y-%m-%d-%H%M%S}.{file_format}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,105 @@
+# companies/utils/office_bridge.py
+"""
+Tiny UNO bridge for one long-lived headless LibreOffice instance.
+
+This script is NOT imported by Django. It is started by ``office_pool`` under a
+Python interpreter that can ``import uno`` (Debian's python3-uno, or the Python
+bundled with LibreOffice), because the app's own interpreter usually cannot.
+
+Protocol (one JSON object per line; documents travel base64-encoded, so no
+file touches the disk — LibreOffice reads and writes "private:stream"):
+  stdin:  {"docx": "<base64>"}
+  stdout: {"ok": true, "pdf": "<base64>"} or {"ok": false, "error": "..."}
+The first line written is {"ready": true} once soffice accepts connections.
+"""
+import base64
+import json
+import sys
+import time
+
+import uno
+import unohelper
+from com.sun.star.beans import PropertyValue
+from com.sun.star.io import XOutputStream
+
+
+def _prop(name, value):
+    p = PropertyValue()
+    p.Name = name
+    p.Value = value
+    return p
+
+
+class _BytesOutput(unohelper.Base, XOutputStream):
+    """XOutputStream collecting what LibreOffice writes into memory."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writeBytes(self, seq):
+        self.data.extend(seq.value)
+
+    def flush(self):
+        pass
+
+    def closeOutput(self):
+        pass
+
+
+def _connect(port, startup_timeout):
+    local = uno.getComponentContext()
+    resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+    url = f"uno:socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext"
+    deadline = time.monotonic() + startup_timeout
+    while True:
+        try:
+            ctx = resolver.resolve(url)
+            return ctx, ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def _convert(ctx, desktop, docx_bytes):
+    stream = ctx.ServiceManager.createInstanceWithContext("com.sun.star.io.SequenceInputStream", ctx)
+    stream.initialize((uno.ByteSequence(docx_bytes),))
+    doc = desktop.loadComponentFromURL(
+        "private:stream", "_blank", 0,
+        (_prop("InputStream", stream), _prop("Hidden", True), _prop("ReadOnly", True)),
+    )
+    if doc is None:
+        raise RuntimeError("LibreOffice could not load the document.")
+    output = _BytesOutput()
+    try:
+        doc.storeToURL("private:stream", (_prop("FilterName", "writer_pdf_Export"), _prop("OutputStream", output)))
+    finally:
+        doc.close(True)
+    return bytes(output.data)
+
+
+def _reply(payload):
+    sys.stdout.write(json.dumps(payload) + "\n")
+    sys.stdout.flush()
+
+
+def main():
+    port = int(sys.argv[1])
+    startup_timeout = float(sys.argv[2]) if len(sys.argv) > 2 else 30
+    ctx, desktop = _connect(port, startup_timeout)
+    _reply({"ready": True})
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+            pdf = _convert(ctx, desktop, base64.b64decode(job["docx"]))
+            _reply({"ok": True, "pdf": base64.b64encode(pdf).decode("ascii")})
+        except Exception as e:
+            _reply({"ok": False, "error": str(e)})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+# companies/utils/office_pool.py
+import atexit
+import base64
+import json
+import logging
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+BRIDGE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "office_bridge.py")
+
+
+class LibreOfficeError(RuntimeError):
+    pass
+
+
+class LibreOfficeTimeout(LibreOfficeError):
+    pass
+
+
+class LibreOfficeBusy(LibreOfficeError):
+    """Raised when the conversion queue is full or no worker frees up in time."""
+    pass
+
+
+def _find_soffice():
+    # Render/Debian images expose it as 'soffice'
+    return shutil.which("soffice") or shutil.which("libreoffice")
+
+
+_uno_python = None
+_uno_python_checked = False
+
+
+def _find_uno_python():
+    """Interpreter that can ``import uno`` (the app's own usually can't), or None."""
+    global _uno_python, _uno_python_checked
+    if _uno_python_checked:
+        return _uno_python
+
+    configured = getattr(settings, "LIBREOFFICE_PYTHON", "")
+    candidates = [configured] if configured else [
+        "/usr/lib/libreoffice/program/python",
+        "/usr/bin/python3",
+    ]
+    for candidate in candidates:
+        if not candidate or not os.path.exists(candidate):
+            continue
+        try:
+            subprocess.run([candidate, "-c", "import uno"], check=True, timeout=15,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except (OSError, subprocess.SubprocessError):
+            continue
+        _uno_python = candidate
+        break
+
+    _uno_python_checked = True
+    return _uno_python
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _kill(proc):
+    if proc is None or proc.poll() is not None:
+        return
+    proc.kill()
+    try:
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        pass
+
+
+class OfficeWorker:
+    """
+    One warm headless LibreOffice instance with its own user profile.
+
+    In "uno" mode soffice stays running and documents are handed over through
+    ``office_bridge.py``; a conversion is just load + export. If no UNO-capable
+    Python is available the worker falls back to "cli" mode: one ``--convert-to``
+    run per job, but reusing a persistent profile so LibreOffice skips the
+    first-start profile creation. A "uno" worker whose stream conversion fails
+    on a document that ``--convert-to`` handles switches to "cli" mode as well.
+    """
+
+    def __init__(self, index, startup_timeout=30):
+        self.index = index
+        self.startup_timeout = startup_timeout
+        self.profile_dir = os.path.join(tempfile.gettempdir(), f"lo-profile-{os.getpid()}-{index}")
+        self.soffice = None
+        self.bridge = None
+        self.mode = None
+        self._replies = None
+        self.jobs_done = 0
+        self.restarts = 0
+
+    @property
+    def _profile_url(self):
+        return "file://" + self.profile_dir
+
+    def _soffice_args(self, soffice, profile_url=None):
+        return [
+            soffice,
+            "--headless",
+            "--invisible",
+            "--nologo",
+            "--nodefault",
+            "--nolockcheck",
+            "--norestore",
+            f"-env:UserInstallation={profile_url or self._profile_url}",
+        ]
+
+    def _alive(self):
+        if self.mode == "cli":
+            return True
+        return (
+            self.mode == "uno"
+            and self.soffice is not None and self.soffice.poll() is None
+            and self.bridge is not None and self.bridge.poll() is None
+        )
+
+    def start(self):
+        soffice = _find_soffice()
+        if not soffice:
+            raise LibreOfficeError("LibreOffice/soffice binary not found in PATH.")
+
+        uno_python = _find_uno_python()
+        if not uno_python:
+            self.mode = "cli"
+            return
+
+        port = _free_port()
+        self.soffice = subprocess.Popen(
+            self._soffice_args(soffice) + [f"--accept=socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        self.bridge = subprocess.Popen(
+            [uno_python, BRIDGE_SCRIPT, str(port), str(self.startup_timeout)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, bufsize=1,
+        )
+        self._replies = queue.Queue()
+        threading.Thread(target=self._read_replies, args=(self.bridge, self._replies), daemon=True).start()
+
+        try:
+            ready = self._replies.get(timeout=self.startup_timeout + 5)
+        except queue.Empty:
+            ready = None
+        if not ready or not ready.get("ready"):
+            self.stop()
+            raise LibreOfficeError("LibreOffice worker did not become ready in time.")
+        self.mode = "uno"
+        logger.info("LibreOffice worker %s ready on port %s", self.index, port)
+
+    @staticmethod
+    def _read_replies(bridge, replies):
+        for line in bridge.stdout:
+            try:
+                replies.put(json.loads(line))
+            except ValueError:
+                continue
+        replies.put(None)  # bridge exited
+
+    def stop(self):
+        _kill(self.bridge)
+        _kill(self.soffice)
+        self.bridge = None
+        self.soffice = None
+        self.mode = None
+
+    def restart(self):
+        self.restarts += 1
+        logger.warning("Restarting LibreOffice worker %s", self.index)
+        self.stop()
+        # Only a half-written profile would make the next start hang, so start clean.
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+        self.start()
+
+    def convert(self, docx_bytes, timeout):
+        """DOCX bytes in, PDF bytes out."""
+        if not self._alive():
+            self.stop()
+            self.start()
+
+        if self.mode == "cli":
+            pdf_bytes = self._convert_cli(docx_bytes, timeout)
+        else:
+            try:
+                pdf_bytes = self._convert_uno(docx_bytes, timeout)
+            except LibreOfficeTimeout:
+                raise
+            except LibreOfficeError as exc:
+                pdf_bytes = self._fall_back_to_cli(docx_bytes, timeout, exc)
+        self.jobs_done += 1
+        return pdf_bytes
+
+    def _fall_back_to_cli(self, docx_bytes, timeout, error):
+        """
+        Retry a document the private:stream path failed on with --convert-to.
+        If that works the stream path is what is broken, so the worker stays in
+        "cli" mode; if not, the document itself is bad and ``error`` stands.
+        """
+        logger.warning("Stream conversion failed on LibreOffice worker %s (%s); retrying with --convert-to",
+                       self.index, error)
+        # The warm soffice holds the worker's profile, so the fallback run gets its own
+        try:
+            pdf_bytes = self._convert_cli(docx_bytes, timeout, profile_url=self._profile_url + "-cli")
+        except LibreOfficeTimeout:
+            raise
+        except LibreOfficeError:
+            raise error
+        logger.error("LibreOffice worker %s switched to --convert-to: the stream conversion is not working",
+                     self.index)
+        self.stop()
+        self.mode = "cli"
+        return pdf_bytes
+
+    def _convert_uno(self, docx_bytes, timeout):
+        # Drop any stale reply left over from a job that timed out
+        while not self._replies.empty():
+            self._replies.get_nowait()
+
+        # Piped through the bridge and LibreOffice's private:stream: no files on disk
+        self.bridge.stdin.write(json.dumps({"docx": base64.b64encode(docx_bytes).decode("ascii")}) + "\n")
+        self.bridge.stdin.flush()
+        try:
+            reply = self._replies.get(timeout=timeout)
+        except queue.Empty:
+            raise LibreOfficeTimeout(f"LibreOffice conversion exceeded {timeout}s.")
+        if reply is None:
+            raise LibreOfficeError("LibreOffice worker exited during conversion.")
+        if not reply.get("ok"):
+            raise LibreOfficeError(f"LibreOffice failed to convert DOCX → PDF: {reply.get('error')}")
+        return base64.b64decode(reply["pdf"])
+
+    def _convert_cli(self, docx_bytes, timeout, profile_url=None):
+        # soffice --convert-to only reads and writes files, so this fallback still needs a temp dir
+        with tempfile.TemporaryDirectory() as outdir:
+            in_path = os.path.join(outdir, "input.docx")
+            with open(in_path, "wb") as f:
+                f.write(docx_bytes)
+            cmd = self._soffice_args(_find_soffice(), profile_url) + [
+                # Note: writer_pdf_Export gives good fidelity for Word-like docs
+                "--convert-to", "pdf:writer_pdf_Export",
+                "--outdir", outdir,
+                in_path,
+            ]
+            try:
+                result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                raise LibreOfficeTimeout(f"LibreOffice conversion exceeded {timeout}s.")
+
+            produced = os.path.join(outdir, "input.pdf")
+            # LibreOffice sometimes returns 0 even if it fails; check for output file
+            if not os.path.exists(produced):
+                output = result.stdout.decode(errors="ignore")
+                raise LibreOfficeError(f"LibreOffice failed to convert DOCX → PDF.\nCommand: {' '.join(cmd)}\nOutput:\n{output}")
+            with open(produced, "rb") as f:
+                return f.read()
+
+
+class OfficePool:
+    """
+    Fixed set of warm LibreOffice workers behind a bounded queue.
+
+    ``convert()`` waits at most ``acquire_timeout`` seconds for a free worker and
+    refuses new jobs outright once ``max_queue`` callers are already waiting.
+    A job that overruns ``job_timeout`` kills and restarts its worker.
+    """
+
+    def __init__(self, size=None, max_queue=None, job_timeout=None, acquire_timeout=None):
+        self.size = size or getattr(settings, "LIBREOFFICE_POOL_SIZE", 1)
+        self.max_queue = max_queue if max_queue is not None else getattr(settings, "LIBREOFFICE_POOL_MAX_QUEUE", 8)
+        self.job_timeout = job_timeout or getattr(settings, "LIBREOFFICE_JOB_TIMEOUT", 60)
+        self.acquire_timeout = acquire_timeout or getattr(settings, "LIBREOFFICE_ACQUIRE_TIMEOUT", 60)
+
+        self._idle = queue.Queue()
+        self._workers = [OfficeWorker(i) for i in range(self.size)]
+        for w in self._workers:
+            self._idle.put(w)
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    def convert(self, docx_bytes, timeout=None):
+        """DOCX bytes in, PDF bytes out."""
+        timeout = timeout or self.job_timeout
+
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                raise LibreOfficeBusy("Too many documents are waiting for PDF conversion; try again shortly.")
+            self._waiting += 1
+        try:
+            worker = self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise LibreOfficeBusy("No LibreOffice worker became free in time.")
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        try:
+            started = time.monotonic()
+            try:
+                pdf_bytes = worker.convert(docx_bytes, timeout)
+            except LibreOfficeTimeout:
+                self._recycle(worker)
+                raise
+            except LibreOfficeError:
+                if not worker._alive():
+                    self._recycle(worker)
+                raise
+            logger.debug("Converted DOCX → PDF on worker %s in %.3fs", worker.index, time.monotonic() - started)
+            return pdf_bytes
+        finally:
+            self._idle.put(worker)
+
+    def _recycle(self, worker):
+        try:
+            worker.restart()
+        except LibreOfficeError:
+            # Leave it stopped; the next job on this worker tries to start it again
+            logger.exception("LibreOffice worker %s failed to restart", worker.index)
+            worker.stop()
+
+    def warm_up(self):
+        """Start every worker now instead of on first use."""
+        for w in self._workers:
+            if not w._alive():
+                w.start()
+
+    def shutdown(self):
+        for w in self._workers:
+            w.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_office_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = OfficePool()
+                atexit.register(_pool.shutdown)
+    return _pool
@@ -0,0 +1,152 @@
+# companies/utils/outbox.py
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import OutboxEmail
+from .compiled_docx import compile_template_bytes
+from .doc_context import CompanyDocumentContext, document_companies
+from .pdf_cache import get_pdf_cache
+from .template_cache import get_template_cache
+from .timing import stage
+from .word_to_pdf import convert_docx_to_pdf
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(subject, body, to, company=None, attachment_template=None, user=None):
+    """Store a rendered e-mail for the drain worker; call inside the user action's transaction."""
+    return OutboxEmail.objects.create(
+        company=company,
+        attachment_template=attachment_template,
+        requested_by=user if user is not None and user.is_authenticated else None,
+        subject=subject,
+        body=body,
+        from_email=settings.DEFAULT_FROM_EMAIL or "",
+        to=list(to),
+    )
+
+
+def render_attachment(company, doc_template):
+    """(filename, pdf_bytes) of `doc_template` for the company, same context (and PDF cache entry) as a preview."""
+    with stage("fetch"):
+        template_bytes, template_digest = get_template_cache().get(doc_template.github_url)
+    with stage("context"):
+        context = CompanyDocumentContext.of(company).single
+
+    def render_pdf():
+        with stage("render"):
+            docx_bytes = compile_template_bytes(template_bytes, template_digest).render(context)
+        return convert_docx_to_pdf(docx_bytes)
+
+    pdf_bytes = get_pdf_cache().get_or_render(company.id, doc_template.id, template_digest, context, render_pdf)
+    return f"{company.company_name}_document.pdf", pdf_bytes
+
+
+def claim_outbox_batch(limit=None):
+    """
+    Atomically take up to `limit` due rows (pending and due, or sending with an
+    expired lease), using the same conditional-UPDATE claim as document jobs.
+    """
+    limit = limit or getattr(settings, "EMAIL_OUTBOX_BATCH_SIZE", 20)
+    now = timezone.now()
+    lease = timedelta(seconds=getattr(settings, "EMAIL_OUTBOX_LEASE_SECONDS", 300))
+
+    candidates = (
+        OutboxEmail.objects
+        .filter(
+            Q(status=OutboxEmail.STATUS_PENDING, next_attempt_at__lte=now)
+            | Q(status=OutboxEmail.STATUS_SENDING, locked_until__lt=now)
+        )
+        .order_by('next_attempt_at')
+        .values_list('pk', 'status', 'locked_until')[:limit]
+    )
+    claimed = []
+    for pk, status, locked_until in candidates:
+        if OutboxEmail.objects.filter(pk=pk, status=status, locked_until=locked_until).update(
+            status=OutboxEmail.STATUS_SENDING,
+            locked_until=now + lease,
+            attempts=F('attempts') + 1,
+        ):
+            claimed.append(pk)
+    rows = list(
+        OutboxEmail.objects.filter(pk__in=claimed)
+        .select_related('attachment_template')
+        .order_by('next_attempt_at')
+    )
+    # Attachment data for the whole batch in 3 queries
+    companies = document_companies().in_bulk({row.company_id for row in rows if row.company_id})
+    for row in rows:
+        if row.company_id:
+            row.company = companies.get(row.company_id)
+    return rows
+
+
+def _failed(row, error, now):
+    max_attempts = getattr(settings, "EMAIL_OUTBOX_MAX_ATTEMPTS", 5)
+    backoff = getattr(settings, "EMAIL_OUTBOX_RETRY_BACKOFF", 60)
+    row.last_error = f"{type(error).__name__}: {error}"
+    row.locked_until = None
+    if row.attempts >= max_attempts:
+        row.status = OutboxEmail.STATUS_FAILED
+    else:
+        row.status = OutboxEmail.STATUS_PENDING
+        row.next_attempt_at = now + timedelta(seconds=backoff * (2 ** (row.attempts - 1)))
+
+
+def outbox_connection():
+    """Mail connection for the drain worker: EMAIL_OUTBOX_BACKEND (pooled by default), kept across batches."""
+    return get_connection(getattr(settings, "EMAIL_OUTBOX_BACKEND", None), fail_silently=False)
+
+
+def deliver_outbox_batch(rows, connection=None):
+    """
+    Generate attachments and send `rows` as one batch (concurrently on the
+    pooled backend). Failures go back to pending with exponential backoff
+    until EMAIL_OUTBOX_MAX_ATTEMPTS, then stay failed for review.
+    """
+    connection = connection or outbox_connection()
+    messages, ready = [], []
+    for row in rows:
+        try:
+            message = EmailMessage(row.subject, row.body, row.from_email or None, row.to, connection=connection)
+            if row.attachment_template_id and row.company_id:
+                message.attach(*render_attachment(row.company, row.attachment_template), "application/pdf")
+        except Exception as e:
+            logger.exception("Outbox email %s: attachment failed", row.pk)
+            _failed(row, e, timezone.now())
+            continue
+        messages.append(message)
+        ready.append(row)
+
+    with stage("send"):
+        if hasattr(connection, "send_each"):
+            errors = connection.send_each(messages)
+        else:
+            errors = []
+            for message in messages:
+                try:
+                    message.send()
+                    errors.append(None)
+                except Exception as e:
+                    errors.append(e)
+
+    now = timezone.now()
+    for row, error in zip(ready, errors):
+        if error is None:
+            row.status = OutboxEmail.STATUS_SENT
+            row.sent_at = now
+            row.locked_until = None
+            row.last_error = ""
+        else:
+            _failed(row, error, now)
+
+    with transaction.atomic():
+        for row in rows:
+            row.save(update_fields=['status', 'attempts', 'next_attempt_at', 'locked_until', 'last_error', 'sent_at'])
+    return rows
@@ -0,0 +1,107 @@
+# companies/utils/parallel_render.py
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from django.conf import settings
+
+from .compiled_docx import compile_template_bytes
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_render_executor():
+    """
+    Shared executor for document rendering, sized by DOC_RENDER_WORKERS.
+    DOC_RENDER_EXECUTOR="process" sidesteps the GIL for large bundles at the cost
+    of sending the template bytes and context to the worker with every job.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = getattr(settings, "DOC_RENDER_WORKERS", 4)
+                if getattr(settings, "DOC_RENDER_EXECUTOR", "thread") == "process":
+                    _executor = ProcessPoolExecutor(max_workers=workers)
+                else:
+                    _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="docrender")
+    return _executor
+
+
+def _render_in_process(template_bytes, digest, context):
+    # Runs inside a worker process; the compiled template is cached there per digest
+    return compile_template_bytes(template_bytes, digest).render(context)
+
+
+def error_entry(filename, message):
+    """Placeholder written into a bundle in place of a document that failed."""
+    base, _ = os.path.splitext(filename)
+    return f"{base}_ERROR.txt", f"This document could not be generated.\n\n{message}\n".encode("utf-8")
+
+
+def _retire_executor(executor):
+    """
+    Stop handing out `executor` after one of its renders timed out: a hung
+    render keeps its worker busy (a thread can't be interrupted), so later
+    calls get a fresh executor with every worker free. Work already queued
+    on the old one still completes; its threads/processes exit once idle.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not executor:
+            return  # already replaced
+        _executor = None
+    executor.shutdown(wait=False)
+
+
+def render_documents(compiled, jobs, timeout=None):
+    """
+    Render ``jobs`` — an iterable of ``(filename, context)`` — on the shared
+    executor and yield ``(filename, docx_bytes)`` in the original order.
+
+    At most two jobs per worker are in flight, so memory stays bounded while
+    the results are streamed. A document that raises or takes longer than
+    ``timeout`` seconds is replaced by an ``*_ERROR.txt`` entry instead of
+    failing the whole bundle; after a timeout the executor is retired and
+    this call's jobs that had not started yet move to the new one.
+    """
+    timeout = timeout or getattr(settings, "DOC_RENDER_TIMEOUT", 60)
+    window = getattr(settings, "DOC_RENDER_WORKERS", 4) * 2
+
+    def submit(context):
+        executor = get_render_executor()
+        if isinstance(executor, ProcessPoolExecutor):
+            future = executor.submit(_render_in_process, compiled.template_bytes, compiled.digest, context)
+        else:
+            future = executor.submit(compiled.render, context)
+        return executor, future
+
+    def collect():
+        filename, context, executor, future = pending.popleft()
+        try:
+            return filename, future.result(timeout=timeout)
+        except FutureTimeout:
+            future.cancel()
+            logger.error("Rendering %s exceeded %ss", filename, timeout)
+            _retire_executor(executor)
+            for i, (name, ctx, queued_on, queued) in enumerate(pending):
+                if queued_on is executor and queued.cancel():
+                    pending[i] = (name, ctx, *submit(ctx))
+            return error_entry(filename, f"Rendering took longer than {timeout} seconds.")
+        except Exception as e:
+            logger.exception("Rendering %s failed", filename)
+            return error_entry(filename, f"{type(e).__name__}: {e}")
+
+    pending = deque()
+    for filename, context in jobs:
+        pending.append((filename, context, *submit(context)))
+        if len(pending) >= window:
+            yield collect()
+    while pending:
+        yield collect()
@@ -0,0 +1,274 @@
+# companies/utils/pdf_cache.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Per-process counters (each gunicorn worker keeps its own)
+_stats_lock = threading.Lock()
+_stats = {
+    "hits": 0,          # PDF served without rendering or LibreOffice
+    "misses": 0,
+    "evictions": 0,
+    "invalidations": 0,
+}
+
+
+def _bump(key, n=1):
+    with _stats_lock:
+        _stats[key] += n
+
+
+def pdf_cache_stats():
+    with _stats_lock:
+        snapshot = dict(_stats)
+    looked_up = snapshot["hits"] + snapshot["misses"]
+    snapshot["hit_ratio"] = round(snapshot["hits"] / looked_up, 3) if looked_up else 0.0
+    return snapshot
+
+
+def context_fingerprint(context):
+    """Stable hash of a render context (dicts, lists, strings, dates)."""
+    payload = json.dumps(context, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RenderedPdfCache:
+    """
+    Converted PDFs keyed by template content hash + context fingerprint.
+
+    Layout in ``storage``: c<company_id>/t<template_id>-<sha256>.pdf. A change
+    in the template bytes or in any value of the context gives a new key, so a
+    stale PDF is never served even after bulk updates that bypass signals;
+    the signals below just free space early by dropping a company's (or a
+    template's) files. Files are evicted least-recently-used once the cache
+    exceeds ``max_bytes``, down to 90% of it.
+
+    Listing the storage is the expensive part, so ``put`` only does it when
+    the size seen at the last listing plus what this process stored since
+    passes ``max_bytes``, or every ``evict_interval`` seconds to catch what
+    other processes stored.
+
+    ``storage`` is any Django storage; the default is a FileSystemStorage at
+    DOC_PDF_CACHE_DIR, or the class named by DOC_PDF_CACHE_STORAGE. LRU order
+    uses modification times, refreshed on hits where the storage has local paths.
+    """
+
+    def __init__(self, storage=None, max_bytes=None, evict_interval=None):
+        if storage is None:
+            storage_class = getattr(settings, "DOC_PDF_CACHE_STORAGE", "")
+            storage = import_string(storage_class)() if storage_class else FileSystemStorage(
+                location=getattr(settings, "DOC_PDF_CACHE_DIR", os.path.join(settings.BASE_DIR, ".cache", "pdf"))
+            )
+        self.storage = storage
+        self.max_bytes = max_bytes if max_bytes is not None else getattr(settings, "DOC_PDF_CACHE_MAX_BYTES", 200 * 1024 * 1024)
+        self.evict_interval = (evict_interval if evict_interval is not None
+                               else getattr(settings, "DOC_PDF_CACHE_EVICT_INTERVAL", 60))
+        self._size_lock = threading.Lock()
+        self._estimated_bytes = None  # total at the last listing + what this process stored since
+        self._listed_at = 0.0
+
+    @staticmethod
+    def _name(company_id, template_id, key):
+        return f"c{company_id}/t{template_id}-{key}.pdf"
+
+    def _touch(self, name):
+        try:
+            os.utime(self.storage.path(name))
+        except (NotImplementedError, OSError):
+            pass
+
+    def get(self, company_id, template_id, key):
+        name = self._name(company_id, template_id, key)
+        try:
+            with self.storage.open(name, "rb") as f:
+                data = f.read()
+        except (FileNotFoundError, OSError):
+            return None
+        self._touch(name)
+        return data
+
+    def put(self, company_id, template_id, key, data):
+        name = self._name(company_id, template_id, key)
+        stored = 0
+        if not self.storage.exists(name):
+            self.storage.save(name, ContentFile(data))
+            stored = len(data)
+        if self._needs_eviction(stored):
+            self.evict()
+
+    def _needs_eviction(self, stored):
+        with self._size_lock:
+            if self._estimated_bytes is None:
+                return True
+            self._estimated_bytes += stored
+            return (self._estimated_bytes > self.max_bytes
+                    or time.monotonic() - self._listed_at >= self.evict_interval)
+
+    def get_or_render(self, company_id, template_id, template_digest, context, render):
+        """PDF bytes for this template + context; ``render()`` runs only on a miss."""
+        key = hashlib.sha256(f"{template_digest}:{context_fingerprint(context)}".encode("ascii")).hexdigest()
+        cached = self.get(company_id, template_id, key)
+        if cached is not None:
+            _bump("hits")
+            return cached
+
+        _bump("misses")
+        data = render()
+        try:
+            self.put(company_id, template_id, key, data)
+        except Exception:
+            # A full or read-only cache must never fail the document itself
+            logger.warning("Could not store rendered PDF in cache", exc_info=True)
+        return data
+
+    def _entries(self, dirs=None):
+        """(modified_time, size, name) for every cached file (in ``dirs`` only, if given)."""
+        if dirs is None:
+            try:
+                dirs, _ = self.storage.listdir("")
+            except (FileNotFoundError, OSError):
+                return []
+        entries = []
+        for directory in dirs:
+            try:
+                _, files = self.storage.listdir(directory)
+            except (FileNotFoundError, OSError):
+                continue
+            for filename in files:
+                name = f"{directory}/{filename}"
+                try:
+                    entries.append((self.storage.get_modified_time(name), self.storage.size(name), name))
+                except (FileNotFoundError, OSError):
+                    continue
+        return entries
+
+    def evict(self):
+        """Once over ``max_bytes``, drop least-recently-used PDFs down to 90% of it."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        if total > self.max_bytes:
+            # Leave headroom so the next few puts don't list the storage again
+            target = self.max_bytes * 9 // 10
+            for _, size, name in sorted(entries):
+                if total <= target:
+                    break
+                self.storage.delete(name)
+                total -= size
+                removed += 1
+        with self._size_lock:
+            self._estimated_bytes = total
+            self._listed_at = time.monotonic()
+        if removed:
+            _bump("evictions", removed)
+        return removed
+
+    def invalidate(self, company_id=None, template_id=None):
+        """Delete cached PDFs of a company and/or a template."""
+        removed = 0
+        dirs = [f"c{company_id}"] if company_id is not None else None
+        for _, _, name in self._entries(dirs):
+            directory, filename = name.split("/", 1)
+            if company_id is not None and directory != f"c{company_id}":
+                continue
+            if template_id is not None and not filename.startswith(f"t{template_id}-"):
+                continue
+            self.storage.delete(name)
+            removed += 1
+        if removed:
+            _bump("invalidations", removed)
+        return removed
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_pdf_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RenderedPdfCache()
+    return _cache
+
+
+def _invalidate(**kwargs):
+    try:
+        get_pdf_cache().invalidate(**kwargs)
+    except Exception:
+        logger.warning("PDF cache invalidation failed", exc_info=True)
+
+
+class _PendingInvalidations:
+    """Companies/templates whose PDFs to drop once the current transaction commits."""
+
+    def __init__(self):
+        self.targets = set()
+        self.flushed = False
+
+    def flush(self):
+        self.flushed = True
+        for company_id, template_id in self.targets:
+            _invalidate(company_id=company_id, template_id=template_id)
+
+
+# Only the on_commit callback holds the batch, so it is gone once the
+# transaction commits or rolls back and the next one starts a fresh batch
+_pending = threading.local()
+
+
+def invalidate_on_commit(company_id=None, template_id=None):
+    """
+    Drop a company's (and/or a template's) cached PDFs after the current
+    transaction commits, or right away outside one. Each company/template is
+    invalidated once per transaction however many of its rows were saved.
+    """
+    if not connection.in_atomic_block:
+        _invalidate(company_id=company_id, template_id=template_id)
+        return
+    ref = getattr(_pending, "batch", None)
+    batch = ref() if ref is not None else None
+    if batch is None or batch.flushed:
+        batch = _PendingInvalidations()
+        _pending.batch = weakref.ref(batch)
+        transaction.on_commit(batch.flush)
+    batch.targets.add((company_id, template_id))
+
+
+@receiver(post_save, sender="companies.Company")
+@receiver(post_delete, sender="companies.Company")
+def _company_changed(sender, instance, **kwargs):
+    invalidate_on_commit(company_id=instance.pk)
+
+
+@receiver(post_save, sender="companies.Director")
+@receiver(post_delete, sender="companies.Director")
+@receiver(post_save, sender="companies.Shareholder")
+@receiver(post_delete, sender="companies.Shareholder")
+@receiver(post_save, sender="companies.ContactPerson")
+@receiver(post_delete, sender="companies.ContactPerson")
+@receiver(post_save, sender="companies.ComplianceInformation")
+@receiver(post_delete, sender="companies.ComplianceInformation")
+def _company_data_changed(sender, instance, **kwargs):
+    invalidate_on_commit(company_id=instance.company_id)
+
+
+@receiver(post_save, sender="companies.DocumentTemplate")
+@receiver(post_delete, sender="companies.DocumentTemplate")
+def _template_changed(sender, instance, **kwargs):
+    invalidate_on_commit(template_id=instance.pk)
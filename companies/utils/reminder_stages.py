@@ -0,0 +1,105 @@
+# companies/utils/reminder_stages.py
+"""
+Default annual-return reminder stages used by `manage.py send_reminders`.
+
+Each stage is sent at anniversary + `offset_days`. Subject and body are Django
+template strings rendered per company with: company_name, ssm_number,
+incorporation_date, anniversary_date, due_date (dates as dd-mm-YYYY).
+
+Any stage can be overridden without a deploy by creating an EmailTemplate named
+as in `email_template`, or in settings via REMINDER_STAGES (same shape, merged
+per stage over these defaults).
+"""
+
+DEFAULT_REMINDER_STAGES = {
+    "first": {
+        "offset_days": -30,
+        "email_template": "Annual Return - First Reminder",
+        "subject": "[FIRST REMINDER] UPCOMING ANNUAL RETURN SUBMISSION FOR {{ company_name }}",
+        "body": """\
+Dear Sir/Madam,
+
+We wish to inform you that your company’s anniversary date is approaching, and your Annual Return will soon be due for submission to the Companies Commission of Malaysia (SSM).
+
+You are receiving this email 30 days in advance of your company's anniversary date.
+
+Here are your company details:
+  • Company Name: {{ company_name }}
+  • SSM Number: {{ ssm_number }}
+  • Incorporation Date: {{ incorporation_date }}
+  • Anniversary Date: {{ anniversary_date }}
+  • Due Date for Annual Return Submission: {{ due_date }}
+
+To ensure timely submission, please be ready to:
+  1. Review the draft Annual Return (to be provided by us); and
+  2. Arrange payment for our service fees of RM450 (excluding SST, if applicable) before the submission is made.
+
+Completing this early will give you peace of mind knowing your company remains fully compliant with SSM.
+
+Thank you.
+
+Best regards,  
+AMR Secretarial Services Sdn. Bhd. and its related companies
+""",
+    },
+    "second": {
+        "offset_days": 0,
+        "email_template": "Annual Return - Second Reminder",
+        "subject": "[SECOND REMINDER] ANNUAL RETURN SUBMISSION DUE FOR {{ company_name }}",
+        "body": """\
+Dear Sir/Madam,
+
+This is a reminder that today is your company’s anniversary date, and your Annual Return must be submitted to the Companies Commission of Malaysia (SSM) within 30 days from today.
+
+Here are your company details:
+  • Company Name: {{ company_name }}
+  • SSM Number: {{ ssm_number }}
+  • Incorporation Date: {{ incorporation_date }}
+  • Anniversary Date: {{ anniversary_date }}
+  • Due Date for Annual Return Submission: {{ due_date }}
+
+Under Section 68 of the Companies Act 2016, failure to submit within the stipulated period may result in:
+  • Late filing fee of up to RM200.00; and
+  • Compound of up to RM50,000.00.
+
+Completing this early will help ensure your company stays in good standing with SSM and avoids unnecessary penalties. 
+If you have not yet done so, please review the draft Annual Return and arrange payment so we can proceed with the submission.
+
+Thank you.
+
+Best regards,  
+AMR Secretarial Services Sdn. Bhd. and its related companies
+""",
+    },
+    "third": {
+        "offset_days": 23,
+        "email_template": "Annual Return - Third Reminder",
+        "subject": "[THIRD REMINDER] URGENT - ANNUAL RETURN DUE SOON FOR {{ company_name }}",
+        "body": """\
+Dear Sir/Madam,
+
+This is an urgent reminder that your company’s Annual Return must be submitted to the Companies Commission of Malaysia (SSM) within the next 7 days to avoid penalties.
+
+Here are your company details:
+  • Company Name: {{ company_name }}
+  • SSM Number: {{ ssm_number }}
+  • Incorporation Date: {{ incorporation_date }}
+  • Anniversary Date: {{ anniversary_date }}
+  • Due Date for Annual Return Submission: {{ due_date }}
+
+Failure to submit on time will result in:
+  • Late filing fee of up to RM200.00; and
+  • Compound of up to RM50,000.00.
+
+To protect your company from these penalties and maintain good standing with SSM, please review the draft Annual Return and arrange payment immediately so we can proceed with submission without delay.
+
+
+[Please IGNORE this email if your Annual Return has already been SUBMITTED]
+
+Thank you.
+
+Best regards,  
+AMR Secretarial Services Sdn. Bhd. and its related companies
+""",
+    },
+}
@@ -0,0 +1,327 @@
+# companies/utils/reminders.py
+import logging
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from ..models import (
+    AR_DUE_DAYS,
+    Company,
+    ContactPerson,
+    Director,
+    EmailTemplate,
+    ReminderDispatch,
+    anniversary_in_year,
+)
+from .email_templates import compile_email_template, get_compiled_email_template
+from .reminder_stages import DEFAULT_REMINDER_STAGES
+from .smtp_pool import DeliveryReport, is_retryable
+
+logger = logging.getLogger(__name__)
+
+
+def reminder_companies():
+    """
+    Companies with everything needed to address a reminder, in 2 queries total:
+    companies + contact person (JOIN), then all directors with an email (prefetch).
+    """
+    return (
+        Company.objects
+        .select_related('contactperson')
+        .prefetch_related(Prefetch(
+            'director_set',
+            queryset=Director.objects.exclude(email='').only('id', 'company_id', 'email').order_by('id'),
+        ))
+        .order_by('id')
+    )
+
+
+def next_anniversary(incorporation_date, today):
+    """Next anniversary on or after `today` (used by --test runs, which ignore the date)."""
+    anniversary = anniversary_in_year(incorporation_date, today.year)
+    if anniversary < today:
+        anniversary = anniversary_in_year(incorporation_date, today.year + 1)
+    return anniversary
+
+
+def reminder_anniversary(offset_days, today):
+    """The anniversary a reminder sent `today` is about, for reminders sent at anniversary + `offset_days`."""
+    return today - timedelta(days=offset_days)
+
+
+def due_anniversary(incorporation_date, offset_days, today, window_days=0):
+    """
+    The anniversary whose reminder date (anniversary + `offset_days`) falls
+    between `today - window_days` and `today`, latest first, or None.
+    """
+    latest = reminder_anniversary(offset_days, today)
+    for back in range(window_days + 1):
+        day = latest - timedelta(days=back)
+        anniversary = anniversary_in_year(incorporation_date, day.year)
+        if anniversary == day and incorporation_date < anniversary:
+            return anniversary
+    return None
+
+
+def sent_dispatches(stage_key, pairs):
+    """
+    (company_id, cycle_year) pairs among `pairs` that already had the stage's
+    reminder sent for real (test sends don't count): one query on the unique
+    index per batch.
+    """
+    if not pairs:
+        return set()
+    company_ids = {company_id for company_id, _ in pairs}
+    years = {year for _, year in pairs}
+    return set(
+        ReminderDispatch.objects
+        .filter(stage=stage_key, company_id__in=company_ids, cycle_year__in=years, test_mode=False)
+        .values_list('company_id', 'cycle_year')
+    )
+
+
+def record_dispatches(stage_key, delivered, test_mode=False):
+    """Ledger rows for (company, anniversary, recipients) just sent, in one INSERT per batch."""
+    ReminderDispatch.objects.bulk_create([
+        ReminderDispatch(
+            company=company,
+            stage=stage_key,
+            cycle_year=anniversary.year,
+            anniversary_date=anniversary,
+            recipients=", ".join(recipients),
+            test_mode=test_mode,
+        )
+        for company, anniversary, recipients in delivered
+    ], ignore_conflicts=True)
+
+
+def company_recipients(company):
+    """Director emails then the contact person's, de-duplicated, without extra queries."""
+    recipients = []
+
+    # Directors
+    for director in company.director_set.all():
+        if director.email and director.email not in recipients:
+            recipients.append(director.email)
+
+    # Contact person
+    try:
+        contact = company.contactperson
+        if contact.email and contact.email not in recipients:
+            recipients.append(contact.email)
+    except ContactPerson.DoesNotExist:
+        pass
+
+    return recipients
+
+
+def company_email_context(company, anniversary=None, today=None):
+    """Values for EMAIL_CONTEXT_SCHEMA placeholders; `anniversary` defaults to the next one."""
+    today = today or timezone.localdate()
+    if anniversary is None and company.incorporation_date:
+        anniversary = next_anniversary(company.incorporation_date, today)
+    due_date = anniversary + timedelta(days=AR_DUE_DAYS) if anniversary else None
+    return {
+        "company_name": company.company_name or "",
+        "ssm_number": company.ssm_number or "",
+        "incorporation_date": company.incorporation_date.strftime('%d-%m-%Y') if company.incorporation_date else "",
+        "anniversary_date": anniversary.strftime('%d-%m-%Y') if anniversary else "",
+        "due_date": due_date.strftime('%d-%m-%Y') if due_date else "",
+        "generated_date": today.strftime('%d-%m-%Y'),
+    }
+
+
+class ReminderStage:
+    def __init__(self, key, offset_days, template, email_template=""):
+        self.key = key
+        self.offset_days = offset_days
+        self.email_template = email_template
+        self.template = template  # CompiledEmailTemplate
+
+    def render(self, company, anniversary):
+        return self.template.render(company_email_context(company, anniversary))
+
+    def render_many(self, items):
+        """(subject, body) for each (company, anniversary), in order."""
+        today = timezone.localdate()
+        return self.template.render_many(
+            company_email_context(company, anniversary, today) for company, anniversary in items
+        )
+
+
+def reminder_stages(keys=None):
+    """
+    Reminder stages in send order: DEFAULT_REMINDER_STAGES, overridden per stage
+    by settings.REMINDER_STAGES, then by an EmailTemplate with the stage's
+    `email_template` name (all looked up in one query).
+    """
+    configured = {}
+    for key, stage in DEFAULT_REMINDER_STAGES.items():
+        configured[key] = {**stage, **getattr(settings, "REMINDER_STAGES", {}).get(key, {})}
+    for key, stage in getattr(settings, "REMINDER_STAGES", {}).items():
+        configured.setdefault(key, stage)
+
+    if keys:
+        configured = {key: configured[key] for key in keys}
+
+    names = [stage["email_template"] for stage in configured.values() if stage.get("email_template")]
+    overrides = {t.name: t for t in EmailTemplate.objects.filter(name__in=names)}
+
+    stages = []
+    for key, stage in configured.items():
+        template = overrides.get(stage.get("email_template"))
+        stages.append(ReminderStage(
+            key,
+            stage["offset_days"],
+            get_compiled_email_template(template) if template
+            else compile_email_template(stage["subject"], stage["body"]),
+            stage.get("email_template", ""),
+        ))
+    return stages
+
+
+def build_reminders(stage, outgoing):
+    """EmailMessages for (company, anniversary, recipients) items, rendered as one batch."""
+    rendered = stage.render_many((company, anniversary) for company, anniversary, _ in outgoing)
+    return [
+        EmailMessage(subject, body, None, recipients)
+        for (subject, body), (_, _, recipients) in zip(rendered, outgoing)
+    ]
+
+
+class ReminderMailer:
+    """
+    Sends reminders over one SMTP connection, reopened every `batch_size`
+    messages (providers cap messages per session), at most `rate` messages per
+    second (0 = no limit). A message that fails with a connection-level error
+    is retried on a fresh connection up to `retries` times with exponential
+    backoff; anything else fails that message only.
+
+    Connections come from REMINDER_EMAIL_BACKEND. With the pooled backend
+    (companies.utils.smtp_pool) send_batch() hands the whole batch to the
+    pool, which sends concurrently with the same rate and retry settings.
+    """
+
+    def __init__(self, batch_size=None, rate=None, retries=None, backoff=None):
+        self.batch_size = max(1, batch_size or getattr(settings, "REMINDER_BATCH_SIZE", 50))
+        self.rate = rate if rate is not None else getattr(settings, "REMINDER_RATE_PER_SECOND", 0)
+        self.retries = retries if retries is not None else getattr(settings, "REMINDER_MAX_RETRIES", 3)
+        self.backoff = backoff if backoff is not None else getattr(settings, "REMINDER_RETRY_BACKOFF", 2.0)
+        self.connection = None
+        self.sent_on_connection = 0
+        self.connections_opened = 0
+        self.report = DeliveryReport()
+        self._last_send = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self):
+        # Backends ignore keyword arguments they don't use; the pooled one takes these
+        self.connection = get_connection(
+            getattr(settings, "REMINDER_EMAIL_BACKEND", None),
+            fail_silently=False, rate=self.rate, retries=self.retries, backoff=self.backoff,
+        )
+        self.connection.open()
+        self.connections_opened += 1
+        self.sent_on_connection = 0
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                logger.warning("Error closing SMTP connection", exc_info=True)
+            self.connection = None
+
+    def _throttle(self):
+        if self.rate:
+            wait = self._last_send + 1.0 / self.rate - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+        self._last_send = time.monotonic()
+
+    def send(self, message):
+        attempt = 0
+        started = time.monotonic()
+        while True:
+            try:
+                if self.connection is None or self.sent_on_connection >= self.batch_size:
+                    self.close()
+                    self.open()
+                self._throttle()
+                message.connection = self.connection
+                self.connection.send_messages([message])
+                self.sent_on_connection += 1
+                self.report.add(time.monotonic() - started, True)
+                return
+            except Exception as e:
+                retryable = is_retryable(e)
+                if retryable:
+                    self.close()
+                if not retryable or attempt >= self.retries:
+                    self.report.add(time.monotonic() - started, False)
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                attempt += 1
+                logger.warning("SMTP error (%s), retry %s/%s in %.1fs", e, attempt, self.retries, delay)
+                time.sleep(delay)
+
+    def send_batch(self, messages):
+        """Send `messages`; returns one exception (or None when sent) per message, in order."""
+        if not messages:
+            return []
+        if self.connection is None:
+            try:
+                self.open()
+            except Exception as e:
+                # send() below reconnects with retries and fails message by message
+                logger.warning("Could not open SMTP connection (%s)", e)
+                self.close()
+        if hasattr(self.connection, "send_each"):
+            results = self.connection.send_each(messages)
+            self.report.merge(self.connection.last_report)
+            return results
+
+        results = []
+        for message in messages:
+            try:
+                self.send(message)
+                results.append(None)
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+class RunStats:
+    def __init__(self):
+        self.queries = 0
+        self.elapsed = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def summary(self):
+        return f"📊 {self.queries} queries in {self.elapsed:.2f}s"
+
+
+@contextmanager
+def run_stats():
+    """Count queries and wall time for a reminder run (used by --stats)."""
+    stats = RunStats()
+    started = time.perf_counter()
+    with connection.execute_wrapper(stats):
+        try:
+            yield stats
+        finally:
+            stats.elapsed = time.perf_counter() - started
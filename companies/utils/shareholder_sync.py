@@ -0,0 +1,126 @@
+# companies/utils/shareholder_sync.py
+"""
+Keeps shareholders in step with directors marked `is_shareholder`.
+
+Used by the Director inline formset, DirectorAdmin and the bulk importer,
+so all of them match a director to a shareholder the same way
+(`person_key`). Each call handles a whole batch: the companies' existing
+shareholders are read in one query, and the missing ones are created and
+changed ones updated with one bulk_create and one bulk_update in a
+transaction. Deleting directors removes the shareholders the sync created
+for them, as long as no shares were recorded on them since.
+"""
+
+from django.db import transaction
+
+from ..models import Director, Shareholder
+from .pdf_cache import invalidate_on_commit
+
+# Director fields copied to the linked shareholder
+SYNCED_FIELDS = (
+    'address_line1', 'address_line2', 'address_line3', 'postcode', 'town', 'state',
+    'phone_number', 'email',
+)
+
+IDENTITY_FIELDS = ('full_name', 'ic_passport')
+
+
+def person_key(company_id, full_name, ic_passport):
+    """The one identity for directors and shareholders: company, name (any case/spacing), IC."""
+    return (company_id, " ".join((full_name or "").split()).upper(), (ic_passport or "").strip().upper())
+
+
+def sync_shareholders(changes, previous=None):
+    """
+    `changes`: (director, changed_fields) pairs for saved directors, the
+    shape of a formset's `changed_objects`; `changed_fields` None means a
+    new director. `previous`: {director pk: (full_name, ic_passport)} as
+    they were before the edit, for directors whose name or IC changed.
+
+    Directors with is_shareholder get a shareholder (shareholding 0,
+    ordinary) if the company has none with the same person_key. An existing
+    one receives the director's changed SYNCED_FIELDS (all non-empty ones
+    for a new director). A renamed director's shareholder is found by the
+    previous name/IC and renamed with it instead of being duplicated.
+    Returns (created, updated).
+    """
+    changes = [(d, fields) for d, fields in changes if d.is_shareholder and d.company_id]
+    if not changes:
+        return 0, 0
+
+    existing = {}
+    shareholders = Shareholder.objects.filter(company_id__in={d.company_id for d, _ in changes}).order_by('-pk')
+    for shareholder in shareholders:
+        # Lowest pk wins if the company already has duplicates
+        existing[person_key(shareholder.company_id, shareholder.full_name, shareholder.ic_passport)] = shareholder
+
+    previous = previous or {}
+    new, changed = [], {}
+    for director, fields in changes:
+        key = person_key(director.company_id, director.full_name, director.ic_passport)
+        shareholder = existing.get(key)
+        if shareholder is None and director.pk in previous:
+            shareholder = existing.get(person_key(director.company_id, *previous[director.pk]))
+            if shareholder is not None and shareholder.pk is not None:
+                shareholder.full_name = director.full_name
+                shareholder.ic_passport = director.ic_passport
+                existing[key] = shareholder
+                changed[shareholder.pk] = shareholder
+        if shareholder is None:
+            shareholder = existing[key] = Shareholder(
+                company_id=director.company_id,
+                full_name=director.full_name,
+                ic_passport=director.ic_passport,
+                shareholding=0,  # User needs to fill this later
+                shareholder_type='ordinary',
+                **{name: getattr(director, name) for name in SYNCED_FIELDS},
+            )
+            new.append(shareholder)
+            continue
+        if shareholder.pk is None:
+            continue  # created earlier in this batch
+        if fields is None:
+            names = [name for name in SYNCED_FIELDS if getattr(director, name)]
+        else:
+            names = [name for name in SYNCED_FIELDS if name in fields]
+        for name in names:
+            value = getattr(director, name)
+            if getattr(shareholder, name) != value:
+                setattr(shareholder, name, value)
+                changed[shareholder.pk] = shareholder
+
+    if new or changed:
+        with transaction.atomic():
+            if new:
+                Shareholder.objects.bulk_create(new)
+            if changed:
+                Shareholder.objects.bulk_update(list(changed.values()), IDENTITY_FIELDS + SYNCED_FIELDS)
+            # Bulk writes send no post_save; drop the companies' cached PDFs ourselves
+            for company_id in {s.company_id for s in new} | {s.company_id for s in changed.values()}:
+                invalidate_on_commit(company_id=company_id)
+    return len(new), len(changed)
+
+
+def remove_shareholders(directors):
+    """
+    After `directors` were deleted, delete their companies' shareholders with
+    the same person_key that still hold no shares (the placeholders
+    sync_shareholders creates), unless another director of the company is
+    the same person. Returns the number deleted.
+    """
+    removed = {person_key(d.company_id, d.full_name, d.ic_passport) for d in directors
+               if d.is_shareholder and d.company_id}
+    if not removed:
+        return 0
+
+    company_ids = {company_id for company_id, _, _ in removed}
+    remaining = Director.objects.filter(company_id__in=company_ids, is_shareholder=True)
+    removed -= {person_key(d.company_id, d.full_name, d.ic_passport)
+                for d in remaining.only('company_id', 'full_name', 'ic_passport')}
+    placeholders = Shareholder.objects.filter(company_id__in=company_ids, shareholding=0)
+    pks = [s.pk for s in placeholders.only('company_id', 'full_name', 'ic_passport')
+           if person_key(s.company_id, s.full_name, s.ic_passport) in removed]
+    if pks:
+        # A queryset delete sends post_delete per row, which queues the cache invalidation
+        Shareholder.objects.filter(pk__in=pks).delete()
+    return len(pks)
@@ -0,0 +1,261 @@
+# companies/utils/smtp_pool.py
+"""
+Pooled SMTP email backend.
+
+The backend of send_reminders and drain_outbox (REMINDER_EMAIL_BACKEND,
+EMAIL_OUTBOX_BACKEND). It keeps EMAIL_POOL_SIZE authenticated SMTP
+connections open per process and sends
+from a worker thread per connection, so a batch of N messages costs roughly
+N / EMAIL_POOL_SIZE round trips instead of N. Each connection is recycled
+after EMAIL_POOL_MAX_MESSAGES_PER_CONNECTION messages (providers cap messages
+per session), and reopened transparently when the server has dropped it or
+it sat idle for more than EMAIL_POOL_IDLE_SECONDS.
+
+Connection settings are Django's own (EMAIL_HOST, EMAIL_PORT, EMAIL_USE_TLS,
+...), so pointing EMAIL_HOST/EMAIL_PORT at a local aiosmtpd server is enough
+to exercise it end to end.
+"""
+import atexit
+import logging
+import math
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.smtp import EmailBackend as SMTPBackend
+
+logger = logging.getLogger(__name__)
+
+# Errors after which a fresh connection is worth a retry; other SMTPExceptions
+# (refused recipients, bad credentials) are permanent
+RETRYABLE_SMTP = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, smtplib.SMTPHeloError)
+
+
+def is_retryable(error):
+    if isinstance(error, smtplib.SMTPException):
+        return isinstance(error, RETRYABLE_SMTP)
+    return isinstance(error, OSError)  # socket errors, timeouts
+
+
+class DeliveryReport:
+    """Sent/failed counts and per-message latency (seconds, including retries)."""
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    def add(self, latency, ok):
+        with self._lock:
+            self.latencies.append(latency)
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+
+    def merge(self, other):
+        with self._lock:
+            self.latencies.extend(other.latencies)
+            self.sent += other.sent
+            self.failed += other.failed
+
+    def percentile(self, p):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))]
+
+    def as_dict(self):
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "p50_ms": self._ms(50),
+            "p90_ms": self._ms(90),
+            "p99_ms": self._ms(99),
+            "max_ms": self._ms(100),
+        }
+
+    def _ms(self, p):
+        value = self.percentile(p)
+        return round(value * 1000, 1) if value is not None else None
+
+    def summary(self):
+        if not self.latencies:
+            return "📨 0 sent, 0 failed"
+        d = self.as_dict()
+        return (f"📨 {d['sent']} sent, {d['failed']} failed; latency p50 {d['p50_ms']}ms, "
+                f"p90 {d['p90_ms']}ms, p99 {d['p99_ms']}ms, max {d['max_ms']}ms")
+
+
+class _PooledConnection:
+    def __init__(self):
+        self.backend = SMTPBackend(fail_silently=False)
+        self.sent = 0
+        self.opened = 0
+        self.last_used = 0.0
+
+    def ensure_open(self, max_messages, idle_seconds=None):
+        if self.backend.connection is not None and (
+            self.sent >= max_messages
+            # Servers drop idle sessions; reconnect instead of failing on a dead socket
+            or idle_seconds and time.monotonic() - self.last_used > idle_seconds
+        ):
+            self.close()
+        if self.backend.connection is None:
+            self.backend.open()
+            self.sent = 0
+            self.opened += 1
+
+    def close(self):
+        try:
+            self.backend.close()
+        except Exception:
+            logger.warning("Error closing pooled SMTP connection", exc_info=True)
+        self.backend.connection = None
+
+
+class SMTPPool:
+    def __init__(self, size=None, max_messages=None):
+        self.size = max(1, size or getattr(settings, "EMAIL_POOL_SIZE", 4))
+        self.max_messages = max(1, max_messages or getattr(settings, "EMAIL_POOL_MAX_MESSAGES_PER_CONNECTION", 100))
+        self.idle_seconds = getattr(settings, "EMAIL_POOL_IDLE_SECONDS", 60)
+        self._all = [_PooledConnection() for _ in range(self.size)]
+        self._connections = queue.Queue()
+        for conn in self._all:
+            self._connections.put(conn)
+        # One worker per connection, so a worker never waits for a free connection
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="smtp-pool")
+        self.report = DeliveryReport()  # cumulative for the process
+
+    def submit(self, fn, *args):
+        return self._executor.submit(fn, *args)
+
+    def send_one(self, message, retries=0, backoff=1.0):
+        """Send `message` on a pooled connection, retrying connection errors on a fresh one."""
+        attempt = 0
+        conn = self._connections.get()
+        try:
+            while True:
+                try:
+                    conn.ensure_open(self.max_messages, self.idle_seconds)
+                    conn.backend.send_messages([message])
+                    conn.sent += 1
+                    conn.last_used = time.monotonic()
+                    return
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    conn.close()
+                    if attempt >= retries:
+                        raise
+                    delay = backoff * (2 ** attempt)
+                    attempt += 1
+                    logger.warning("SMTP error (%s), retry %s/%s in %.1fs", e, attempt, retries, delay)
+                    time.sleep(delay)
+        finally:
+            self._connections.put(conn)
+
+    def connections_opened(self):
+        return sum(conn.opened for conn in self._all)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        for conn in self._all:
+            conn.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_smtp_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SMTPPool()
+                atexit.register(_pool.shutdown)
+    return _pool
+
+
+class PooledEmailBackend(BaseEmailBackend):
+    """
+    Django email backend over the process-wide SMTPPool.
+
+    Extra keyword arguments (via get_connection()): `rate` caps messages per
+    second for this backend instance (0 = no limit), `retries` and `backoff`
+    control retries on connection errors. `last_report` holds the
+    DeliveryReport of the latest send_messages()/send_each() call.
+    """
+
+    def __init__(self, fail_silently=False, rate=None, retries=None, backoff=None, **kwargs):
+        super().__init__(fail_silently=fail_silently, **kwargs)
+        self.rate = rate if rate is not None else getattr(settings, "EMAIL_POOL_RATE_PER_SECOND", 0)
+        self.retries = retries if retries is not None else getattr(settings, "EMAIL_POOL_MAX_RETRIES", 2)
+        self.backoff = backoff if backoff is not None else 1.0
+        self.last_report = DeliveryReport()
+        self._next_slot = 0.0
+        self._rate_lock = threading.Lock()
+
+    @property
+    def pool(self):
+        return get_smtp_pool()
+
+    def open(self):
+        # Connections belong to the pool and stay open between calls
+        self.pool
+        return False
+
+    def close(self):
+        pass
+
+    def _throttle(self):
+        if not self.rate:
+            return
+        with self._rate_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate
+        if slot > now:
+            time.sleep(slot - now)
+
+    def _send(self, message, report):
+        started = time.monotonic()
+        try:
+            self._throttle()
+            self.pool.send_one(message, self.retries, self.backoff)
+        except Exception as e:
+            elapsed = time.monotonic() - started
+            report.add(elapsed, False)
+            self.pool.report.add(elapsed, False)
+            return e
+        elapsed = time.monotonic() - started
+        report.add(elapsed, True)
+        self.pool.report.add(elapsed, True)
+        return None
+
+    def send_each(self, email_messages):
+        """Send concurrently; returns one exception (or None) per message, in order."""
+        report = DeliveryReport()
+        futures = [
+            self.pool.submit(self._send, message, report)
+            for message in email_messages
+            if message.recipients()
+        ]
+        results = iter([future.result() for future in futures])
+        self.last_report = report
+        return [next(results) if message.recipients() else None for message in email_messages]
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        errors = self.send_each(email_messages)
+        failures = [e for e in errors if e is not None]
+        if failures and not self.fail_silently:
+            raise failures[0]
+        return self.last_report.sent
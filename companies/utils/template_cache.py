@@ -0,0 +1,231 @@
+# companies/utils/template_cache.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateFetchError(RuntimeError):
+    pass
+
+
+# Per-process counters (each gunicorn worker keeps its own)
+_stats_lock = threading.Lock()
+_stats = {
+    "hits": 0,          # served from disk without touching the network
+    "revalidated": 0,   # 304 Not Modified from the origin
+    "misses": 0,        # full download
+    "evictions": 0,
+    "errors": 0,
+}
+
+
+def _bump(key, n=1):
+    with _stats_lock:
+        _stats[key] += n
+
+
+def template_cache_stats():
+    """Snapshot of hit/miss counters for this process."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    looked_up = snapshot["hits"] + snapshot["revalidated"] + snapshot["misses"]
+    snapshot["hit_ratio"] = round((snapshot["hits"] + snapshot["revalidated"]) / looked_up, 3) if looked_up else 0.0
+    return snapshot
+
+
+class TemplateCache:
+    """
+    Content-addressed disk cache for .docx templates downloaded from GitHub.
+
+    Layout under ``root``:
+      blobs/<sha256>      raw template bytes, shared by every URL with the same content
+      meta/<sha256(url)>  JSON: blob hash, ETag, Last-Modified, fetched_at
+
+    Within ``ttl`` seconds a cached entry is served straight from disk. After
+    that it is revalidated with If-None-Match / If-Modified-Since, so an
+    unchanged template costs one small 304 instead of a full download.
+    Blobs are evicted least-recently-used (by mtime) once ``max_bytes`` is exceeded.
+    """
+
+    def __init__(self, root=None, ttl=None, max_bytes=None, timeout=None):
+        self.root = str(root or getattr(settings, "DOC_TEMPLATE_CACHE_DIR", os.path.join(settings.BASE_DIR, ".cache", "templates")))
+        self.ttl = ttl if ttl is not None else getattr(settings, "DOC_TEMPLATE_CACHE_TTL", 300)
+        self.max_bytes = max_bytes if max_bytes is not None else getattr(settings, "DOC_TEMPLATE_CACHE_MAX_BYTES", 50 * 1024 * 1024)
+        self.timeout = timeout if timeout is not None else getattr(settings, "DOC_TEMPLATE_FETCH_TIMEOUT", 30)
+        self.blob_dir = os.path.join(self.root, "blobs")
+        self.meta_dir = os.path.join(self.root, "meta")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.meta_dir, exist_ok=True)
+
+    # --- paths -----------------------------------------------------------
+
+    def _meta_path(self, url):
+        return os.path.join(self.meta_dir, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def _blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest)
+
+    # --- metadata --------------------------------------------------------
+
+    def _read_meta(self, url):
+        try:
+            with open(self._meta_path(url), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, url, meta):
+        path = self._meta_path(url)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, path)  # atomic, safe across gunicorn workers
+
+    def _read_blob(self, digest):
+        path = self._blob_path(digest)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if hashlib.sha256(data).hexdigest() != digest:
+            return None  # truncated/corrupted write; treat as a miss
+        try:
+            os.utime(path)  # mark as recently used for LRU eviction
+        except OSError:
+            pass
+        return data
+
+    def _write_blob(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        else:
+            os.utime(path)
+        return digest
+
+    # --- public API ------------------------------------------------------
+
+    def get(self, url):
+        """Return ``(content_bytes, sha256)`` for ``url``, downloading only when needed."""
+        if not url:
+            raise TemplateFetchError("No GitHub URL set for this template.")
+
+        meta = self._read_meta(url)
+        cached = self._read_blob(meta["sha256"]) if meta else None
+
+        if cached is not None and time.time() - meta.get("fetched_at", 0) < self.ttl:
+            _bump("hits")
+            return cached, meta["sha256"]
+
+        headers = {}
+        if cached is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            r = requests.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            if cached is not None:
+                # Origin unreachable: a stale template beats a failed document
+                logger.warning("Template revalidation failed for %s, serving stale copy: %s", url, e)
+                _bump("hits")
+                return cached, meta["sha256"]
+            _bump("errors")
+            raise TemplateFetchError(f"Error downloading template: {e}") from e
+
+        if r.status_code == 304 and cached is not None:
+            meta["fetched_at"] = time.time()
+            self._write_meta(url, meta)
+            _bump("revalidated")
+            return cached, meta["sha256"]
+
+        if r.status_code != 200:
+            _bump("errors")
+            raise TemplateFetchError(f"Error downloading template (HTTP {r.status_code}).")
+
+        data = r.content
+        digest = self.put(url, data, etag=r.headers.get("ETag"), last_modified=r.headers.get("Last-Modified"))
+        _bump("misses")
+        return data, digest
+
+    def put(self, url, data, etag=None, last_modified=None):
+        """Store ``data`` as the content of ``url``, fresh for ``ttl`` seconds from now; returns its sha256."""
+        digest = self._write_blob(data)
+        self._write_meta(url, {
+            "url": url,
+            "sha256": digest,
+            "etag": etag,
+            "last_modified": last_modified,
+            "size": len(data),
+            "fetched_at": time.time(),
+        })
+        self.evict()
+        return digest
+
+    def evict(self):
+        """Drop least-recently-used blobs until the cache fits in ``max_bytes``."""
+        entries = []
+        total = 0
+        for name in os.listdir(self.blob_dir):
+            if name.endswith(".tmp"):
+                continue
+            path = self._blob_path(name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        if total <= self.max_bytes:
+            return 0
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        # Metadata pointing at an evicted blob is harmless: the next get() sees
+        # a missing blob and re-downloads.
+        if removed:
+            _bump("evictions", removed)
+        return removed
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_template_cache():
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = TemplateCache()
+    return _default_cache
+
+
+def fetch_template_bytes(url):
+    """Shortcut used by the views: template bytes for ``url`` via the shared cache."""
+    content, _ = get_template_cache().get(url)
+    return content
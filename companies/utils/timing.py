@@ -0,0 +1,195 @@
+# companies/utils/timing.py
+"""
+Per-stage timings for the document pipeline.
+
+Stages (fetch, context, render, zip, convert, send, ...) are recorded with
+``stage(name)`` into the StageTimer of the current request or job, and into
+process-wide histograms labelled by DocumentTemplate name. Views wrapped in
+``@server_timing`` return the stages as a ``Server-Timing`` header and log one
+JSON line per request; streamed responses log when the stream finishes, with
+the render/zip time spent while streaming included.
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger("companies.timing")
+
+_current = contextvars.ContextVar("document_stage_timer", default=None)
+
+# Histogram buckets in seconds (Prometheus "le" bounds)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class StageHistograms:
+    """Per-process histograms keyed by (template, stage)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def observe(self, template, stage, seconds):
+        with self._lock:
+            entry = self._data.get((template, stage))
+            if entry is None:
+                entry = self._data[(template, stage)] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    entry["buckets"][i] += 1
+            entry["sum"] += seconds
+            entry["count"] += 1
+
+    def prometheus(self):
+        """Prometheus text exposition format."""
+        def label(value):
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        lines = [
+            "# HELP document_stage_seconds Time spent in each document pipeline stage.",
+            "# TYPE document_stage_seconds histogram",
+        ]
+        with self._lock:
+            items = sorted((key, dict(entry, buckets=list(entry["buckets"]))) for key, entry in self._data.items())
+        for (template, stage_name), entry in items:
+            labels = f'template="{label(template)}",stage="{label(stage_name)}"'
+            for bound, count in zip(BUCKETS, entry["buckets"]):
+                lines.append(f'document_stage_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'document_stage_seconds_bucket{{{labels},le="+Inf"}} {entry["count"]}')
+            lines.append(f"document_stage_seconds_sum{{{labels}}} {entry['sum']:.6f}")
+            lines.append(f"document_stage_seconds_count{{{labels}}} {entry['count']}")
+        return "\n".join(lines) + "\n"
+
+
+HISTOGRAMS = StageHistograms()
+
+
+class StageTimer:
+    def __init__(self, label="", **fields):
+        self.label = label
+        self.fields = fields
+        self.stages = defaultdict(float)
+        self.started = time.perf_counter()
+        self.streaming = False
+        self.log_on_exit = False  # set by timing(): the block, not the stream, writes the log line
+
+    def add(self, name, seconds):
+        # Repeated stages (one render per director) add up
+        self.stages[name] += seconds
+
+    def server_timing(self):
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+    def log(self, **extra):
+        # Histograms are fed here, once the label (template name) is known
+        for name, seconds in self.stages.items():
+            HISTOGRAMS.observe(self.label, name, seconds)
+        logger.info(json.dumps({
+            "event": "document_timing",
+            "template": self.label,
+            **self.fields,
+            **extra,
+            "stages_ms": {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()},
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+        }))
+
+
+def current_timer():
+    return _current.get()
+
+
+def set_label(label):
+    """Name the current request's timings after its DocumentTemplate."""
+    timer = _current.get()
+    if timer is not None:
+        timer.label = label
+
+
+@contextmanager
+def stage(name, timer=None):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        timer = timer or _current.get()
+        if timer is not None:
+            timer.add(name, elapsed)
+        else:
+            HISTOGRAMS.observe("", name, elapsed)
+
+
+@contextmanager
+def timing(label="", **fields):
+    """A StageTimer for a non-request operation (background job, outbox batch); logged on exit."""
+    timer = StageTimer(label, **fields)
+    timer.log_on_exit = True
+    token = _current.set(timer)
+    try:
+        yield timer
+    finally:
+        _current.reset(token)
+        timer.log()
+
+
+class TimedIterator:
+    """
+    Wraps a lazy iterable and records the time spent producing its items as
+    stage ``name``, minus the time already recorded by a ``nested`` TimedIterator
+    it consumes (so a ZIP stream over rendered documents splits into render + zip).
+    With ``finish=True`` the timer's log line is written when iteration ends.
+    """
+
+    def __init__(self, iterable, name, timer=None, nested=None, finish=False):
+        self.iterable = iterable
+        self.name = name
+        self.timer = timer or _current.get()
+        self.nested = nested
+        self.finish = finish
+        self.elapsed = 0.0
+        if finish and self.timer is not None and not self.timer.log_on_exit:
+            self.timer.streaming = True
+
+    def __iter__(self):
+        it = iter(self.iterable)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    self.elapsed += time.perf_counter() - started
+                    return
+                self.elapsed += time.perf_counter() - started
+                yield item
+        finally:
+            own = self.elapsed - (self.nested.elapsed if self.nested else 0.0)
+            if self.timer is not None:
+                self.timer.add(self.name, own)
+                if self.finish and self.timer.streaming:
+                    self.timer.log(streamed=True)
+            else:
+                HISTOGRAMS.observe("", self.name, own)
+
+
+def server_timing(view):
+    """Time a view: Server-Timing header on the response plus one structured log line."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        timer = StageTimer(view=view.__name__, method=request.method)
+        token = _current.set(timer)
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            _current.reset(token)
+        response["Server-Timing"] = timer.server_timing()
+        if not timer.streaming:
+            timer.log(status=response.status_code)
+        return response
+    return wrapper
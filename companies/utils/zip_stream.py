@@ -0,0 +1,60 @@
+# companies/utils/zip_stream.py
+import io
+import zipfile
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only, non-seekable file object that hands back whatever was written
+    since the last ``drain()``. Because it cannot seek, ``zipfile`` writes each
+    entry with a trailing data descriptor instead of patching the local header.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries, compression=zipfile.ZIP_DEFLATED):
+    """
+    Yield a ZIP archive chunk by chunk from ``entries`` — an iterable of
+    ``(filename, bytes)``. Each entry is sent as soon as it is produced, so
+    memory stays at one document regardless of how many entries there are.
+    An entry's data may also be an iterable of bytes chunks (e.g. a large
+    XML part), which is compressed and sent as it is produced.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression) as zf:
+        for name, data in entries:
+            if isinstance(data, (bytes, bytearray, str)):
+                zf.writestr(name, data)
+            else:
+                with zf.open(name, "w", force_zip64=True) as dest:
+                    for part in data:
+                        dest.write(part)
+                        chunk = sink.drain()
+                        if chunk:
+                            yield chunk
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    # Central directory is written on close
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
@@ -1,100 +1,63 @@
-import os
-import tempfile
-import requests
-import io
-import zipfile
-import subprocess
-
-from datetime import date
 from django.conf import settings
-from django.http import FileResponse, HttpResponse
+from django.db import transaction
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
+from django.utils.crypto import constant_time_compare
 from .forms import DirectorForm
-from .models import Company, DocumentTemplate, Director, EmailTemplate  # ✅ Needed for document generation
-from docxtpl import DocxTemplate  # ✅ New import for document auto generator
-from django.utils.text import slugify
+from .models import Company, DocumentTemplate, Director, EmailTemplate, DocumentJob  # ✅ Needed for document generation
 from collections import defaultdict
-from django.core.mail import EmailMessage
-from .utils.word_to_pdf import convert_docx_to_pdf
+from .utils.word_to_pdf import LibreOfficeBusy
 from django.contrib import messages
 from docx import Document
-from .utils.doc_build import build_context, render_docx_bytes
+from .utils.template_cache import template_cache_stats
+from .utils.doc_context import CompanyDocumentContext, document_companies
+from .utils.doc_generate import DocumentGenerationError, generate_document
+from .utils.doc_jobs import enqueue_document_job
+from .utils.email_templates import get_compiled_email_template
+from .utils.outbox import queue_email
+from .utils.pdf_cache import pdf_cache_stats
+from .utils.reminders import company_email_context, company_recipients
+from .utils.timing import HISTOGRAMS, server_timing, set_label, stage
 
 # === New Function for Document Auto Generation ===
 
 # companies/views.py
+@server_timing
 def choose_email_template(request, company_id, template_id):
-    company = get_object_or_404(Company, id=company_id)
-    doc_template = get_object_or_404(DocumentTemplate, id=template_id)
-    templates = EmailTemplate.objects.all()
-
-    director_emails = list(
-    company.director_set.exclude(email="").values_list("email", flat=True)
-    )
-
-    contact_person_emails = list(
-    company.contactperson_set.exclude(email="").values_list("email", flat=True)
-    )
-
-    recipients = ", ".join(set(director_emails + list(contact_person_emails)))
-
-    # FIX: contact persons must be queried as a set
-    contact_person_emails = list(
-    company.contactperson_set.exclude(email="").values_list("email", flat=True)
-    )
-
-    # Merge directors + contact persons, remove duplicates
-    recipients = ", ".join(set(director_emails + contact_person_emails))
-
+    with stage("db"):
+        company = get_object_or_404(Company.objects.select_related('contactperson'), id=company_id)
+        doc_template = get_object_or_404(DocumentTemplate, id=template_id)
+        templates = list(EmailTemplate.objects.all())
+        # Directors then contact person, duplicates removed
+        recipients = ", ".join(company_recipients(company))
+    set_label(doc_template.name)
 
     if request.method == "POST":
         recipient = request.POST.get("recipient")
         subject = request.POST.get("subject")
         body = request.POST.get("body")
 
-        # --- Generate DOCX (same as in generate_company_doc) ---
-        r = requests.get(doc_template.github_url)
-        if r.status_code != 200:
-            messages.error(request, "Failed to fetch document template.")
-            return redirect("choose_template", company_id=company.id)
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp:
-            tmp.write(r.content)
-            tmp_path = tmp.name
-
-        try:
-            doc = DocxTemplate(tmp_path)
-
-            # Basic context (you can expand if needed)
-            context = {
-                "company_name": company.company_name or '',
-                "ssm_number": company.ssm_number or '',
-                "generated_date": date.today().strftime("%d %B %Y"),
-            }
-            doc.render(context)
-
-            buf = io.BytesIO()
-            doc.save(buf)
-            buf.seek(0)
-
-            pdf_bytes = convert_docx_to_pdf_bytes(buf.getvalue())
-
-            # --- Send email ---
-            email = EmailMessage(
-                subject=subject,
-                body=body,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[r.strip() for r in recipient.split(",") if r.strip()],
+        # Queued with the PDF attachment as a reference; drain_outbox generates and sends it
+        with stage("queue"), transaction.atomic():
+            queue_email(
+                subject,
+                body,
+                [r.strip() for r in recipient.split(",") if r.strip()],
+                company=company,
+                attachment_template=doc_template,
+                user=request.user,
             )
-            email.attach(f"{company.company_name}_document.pdf", pdf_bytes, "application/pdf")
-            email.send()
 
-            messages.success(request, "✅ Email sent successfully!")
-            return redirect("admin:companies_company_changelist")
+        messages.success(request, "📤 Email queued — it will be sent with the PDF attached shortly.")
+        return redirect("admin:companies_company_changelist")
 
-        finally:
-            os.remove(tmp_path)
+    # Fill each template's placeholders for this company so the form starts ready to send
+    with stage("render"):
+        email_context = company_email_context(company)
+        for t in templates:
+            t.rendered_subject, t.rendered_body = get_compiled_email_template(t).render(email_context)
 
     return render(request, "companies/choose_email_template.html", {
         "company": company,
@@ -119,14 +82,14 @@ def choose_template(request, company_id):
 
         template = get_object_or_404(DocumentTemplate, pk=template_id)
 
-        # ✅ Fetch selected directors
-        if director_id == "all":
-            selected_directors = directors
-        else:
-            selected_directors = directors.filter(pk=director_id)
-
         if template_id:
             action = request.POST.get('action', 'generate')  # 👈 which button was clicked
+
+            # Hand generate/preview off to the background worker and show the job page
+            if request.POST.get('background') and action in ("generate", "preview"):
+                job = enqueue_document_job(company, template, director_id or "all", action, request.user)
+                return redirect('document_job_status', job_id=job.id)
+
             url = reverse(
                 'generate_company_doc_with_director',
                 kwargs={
@@ -147,213 +110,107 @@ def choose_template(request, company_id):
     })
 
 
-def generate_company_doc(request, company_id, template_id, director_id=None):
-    company = get_object_or_404(Company, id=company_id)
-    doc_template = get_object_or_404(DocumentTemplate, id=template_id)
-
-    template_url = doc_template.github_url
-    if not template_url:
-        return HttpResponse("No GitHub URL set for this template.", status=400)
+def _document_response(document):
+    """HttpResponse for a GeneratedDocument: PDFs open inline, everything else downloads."""
+    if isinstance(document.content, bytes):
+        response = HttpResponse(document.content, content_type=document.content_type)
+    else:
+        response = StreamingHttpResponse(document.content, content_type=document.content_type)
+    if document.content_type != "application/pdf":
+        response['Content-Disposition'] = f'attachment; filename="{document.filename}"'
+    return response
 
-    # Download the file from GitHub
-    r = requests.get(template_url)
-    if r.status_code != 200:
-        return HttpResponse("Error downloading template from GitHub.", status=500)
 
-    # Save to a temporary file so DocxTemplate can load it
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp:
-        tmp.write(r.content)
-        tmp_path = tmp.name
+@server_timing
+def generate_company_doc(request, company_id, template_id, director_id=None):
+    # Directors, shareholders, contact person and compliance info come with the company (3 queries)
+    with stage("db"):
+        company = get_object_or_404(document_companies(), id=company_id)
+        doc_template = get_object_or_404(DocumentTemplate, id=template_id)
+    set_label(doc_template.name)
+
+    # ✅ Detect user action (Download, Preview, or Email)
+    action = request.GET.get("action", "generate")
+
+    if director_id and director_id != "all":
+        if CompanyDocumentContext.of(company).find_director(director_id) is None:
+            raise Http404("Director not found for this company.")
+    elif action == "email" and not doc_template.per_director:
+        # Instead of sending directly, redirect to choose_email_template page
+        return redirect(
+            "choose_email_template",
+            company_id=company.id,
+            template_id=doc_template.id,
+        )
 
     try:
-        # helper for dates
-        def safe_date(dt):
-            return dt.strftime("%Y-%m-%d") if dt else ''
-
-        # Base context used for single-doc generation and as part of per-director generation
-        directors_qs = company.director_set.all()
-        shareholders_qs = company.shareholder_set.all()
-
-        # create director_rows = [ {'left': {...} or None, 'right': {...} or None}, ... ]
-        director_list = list(directors_qs)  # list of Director model instances
-
-        from itertools import zip_longest
-        pairs = list(zip_longest(*(iter(director_list),) * 2, fillvalue=None))
-
-        director_rows = []
-        for left, right in pairs:
-            left_dict = {
-                'name': left.full_name if left else '',
-                'line': '___________________'
-            } if left else None
-
-            right_dict = {
-                'name': right.full_name if right else '',
-                'line': '___________________'
-            } if right else None
-
-            director_rows.append({
-                'left': left_dict,
-                'right': right_dict
-            })
-
-        base_context = {
-            "company_name": company.company_name or '',
-            "ssm_number": company.ssm_number or '',
-            "incorporation_date": safe_date(company.incorporation_date),
-            "amr_cosec_branch": getattr(company, 'amr_cosec_branch', ''),
-            "generated_date": date.today().strftime("%d %B %Y"),
-            "directors": [{"name": d.full_name, "ic": getattr(d, 'ic_passport', '')} for d in directors_qs],
-            "shareholders": [{"name": s.full_name, "ic": getattr(s, 'ic_passport', '')} for s in shareholders_qs],
-            "director_rows": director_rows
-        }
-        
-        # ✅ Detect user action (Download, Preview, or Email)
-        action = request.GET.get("action", "generate")
-
-        # === New: handle specific director selection ===
-        if director_id and director_id != "all":
-            director = get_object_or_404(company.director_set, id=director_id)
-            ctx = dict(base_context)
-            ctx.update({
-                "director_name": director.full_name or '',
-                "director_ic": getattr(director, 'ic_passport', '') or '',
-                "director_address": getattr(director, 'residential_address', '') or '',
-                "director_email": getattr(director, 'email', '') or '',
-            })
-            doc = DocxTemplate(tmp_path)
-            doc.render(ctx)
-            filename = f"{slugify(company.company_name)}_{slugify(director.full_name)}_{doc_template.name}.docx"
-
-            # Default: download Word
-            response = HttpResponse(
-                content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-            )
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            doc.save(response)
-            return response
-
-        # ---- Per-director mode: create one file per director and return a ZIP ----
-        if getattr(doc_template, "per_director", False):
-            directors = list(directors_qs)
-            if not directors:
-                return HttpResponse("No directors found for this company.", status=400)
-
-            zip_buffer = io.BytesIO()
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                for director in directors:
-                    ctx = dict(base_context)
-                    ctx.update({
-                        "director_name": director.full_name or '',
-                        "director_ic": getattr(director, 'ic_passport', '') or '',
-                        "director_address": getattr(director, 'residential_address', '') or '',
-                        "director_email": getattr(director, 'email', '') or '',
-                    })
-
-                    doc = DocxTemplate(tmp_path)
-                    doc.render(ctx)
-
-                    doc_io = io.BytesIO()
-                    doc.save(doc_io)
-                    doc_io.seek(0)
-
-                    safe_director = slugify(director.full_name) or "director"
-                    safe_company = slugify(company.company_name) or "company"
-                    file_name = f"{safe_company}_{safe_director}_{doc_template.name}.docx"
-
-                    zip_file.writestr(file_name, doc_io.read())
-
-            zip_buffer.seek(0)
-            response = HttpResponse(zip_buffer.getvalue(), content_type="application/zip")
-            response['Content-Disposition'] = f'attachment; filename="{slugify(company.company_name or "company")}_directors.zip"'
-            return response
-
-        # ---- Normal single-document generation ----
-        context = dict(base_context)
-
-        for i, d in enumerate(directors_qs, start=1):
-            context[f"director_{i}_name"] = d.full_name or ''
-            context[f"director_{i}_ic"] = getattr(d, 'ic_passport', '') or ''
-
-        for i in range(len(directors_qs) + 1, 6):
-            context[f"director_{i}_name"] = ''
-            context[f"director_{i}_ic"] = ''
-
-        for i, s in enumerate(shareholders_qs, start=1):
-            context[f"shareholder_{i}_name"] = s.full_name or ''
-
-        for i in range(len(shareholders_qs) + 1, 6):
-            context[f"shareholder_{i}_name"] = ''
-
-        doc = DocxTemplate(tmp_path)
-        doc.render(context)
-
-        filename = f"{company.company_name or 'company'}_{doc_template.name}"
-
-        os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
-
-        # Save generated DOCX file first
-        safe_company = slugify(company.company_name) or "company"
-        output_path = os.path.join(settings.MEDIA_ROOT, f"{safe_company}_{int(date.today().strftime('%Y%m%d'))}.docx")
-        doc.save(output_path)
-
-        # Handle action: preview, email, or download Word
-        if action == "preview":
-            ctx = build_context(company)
-            # Use the same .docx template path you already use
-            buf = io.BytesIO()
-            doc.save(buf)
-            docx_bytes = buf.getvalue()
-
-            pdf_bytes = convert_docx_to_pdf_bytes(docx_bytes)
-            return HttpResponse(pdf_bytes, content_type="application/pdf")
-
-
-        elif action == "email":
-            # Instead of sending directly, redirect to choose_email_template page
-            return redirect(
-                "choose_email_template",
-                company_id=company.id,
-                template_id=doc_template.id,
-            )
-
-
-        else:
-            # Default: download Word
-            response = HttpResponse(
-                content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-            )
-            response['Content-Disposition'] = f'attachment; filename="{filename}.docx"'
-            doc.save(response)
-            return response
-
-
-    finally:
-        try:
-            os.remove(tmp_path)
-        except Exception:
-            pass
-
-
-def convert_docx_to_pdf_bytes(docx_bytes):
-    """Convert DOCX bytes into PDF bytes using LibreOffice."""
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        input_path = os.path.join(tmpdirname, "input.docx")
-        output_dir = tmpdirname
-        output_path = os.path.join(output_dir, "input.pdf")
+        document = generate_document(company, doc_template, director_id, action)
+    except DocumentGenerationError as e:
+        return HttpResponse(str(e), status=e.status)
+    except LibreOfficeBusy:
+        return HttpResponse("PDF converter is busy. Please try again in a moment.", status=503)
+
+    return _document_response(document)
+
+
+@staff_member_required
+def document_job_status(request, job_id):
+    job = get_object_or_404(DocumentJob.objects.select_related('company', 'template'), id=job_id)
+    download_url = reverse('document_job_download', args=[job.id]) if job.status == DocumentJob.STATUS_SUCCEEDED else None
+
+    if request.GET.get("format") == "json":
+        return JsonResponse({
+            "id": job.id,
+            "status": job.status,
+            "error": job.error,
+            "created_at": job.created_at.isoformat(),
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+            "documents": job.documents_count,
+            "failed": job.failed_count,
+            "docs_per_second": job.throughput,
+            "download_url": download_url,
+        })
+
+    return render(request, 'companies/document_job.html', {
+        'job': job,
+        'download_url': download_url,
+    })
 
-        # Write DOCX to temp file
-        with open(input_path, "wb") as f:
-            f.write(docx_bytes)
 
-        # Run LibreOffice headless conversion
-        subprocess.run(
-            ["libreoffice", "--headless", "--convert-to", "pdf", "--outdir", output_dir, input_path],
-            check=True,
-        )
+@staff_member_required
+def document_job_download(request, job_id):
+    job = get_object_or_404(DocumentJob, id=job_id, status=DocumentJob.STATUS_SUCCEEDED)
+    if not job.result:
+        return HttpResponse("Result file is no longer available.", status=410)
+    return FileResponse(
+        job.result.open("rb"),
+        as_attachment=job.result_content_type != "application/pdf",
+        filename=job.result_name,
+        content_type=job.result_content_type,
+    )
 
-        # Read back PDF as bytes
-        with open(output_path, "rb") as f:
-            pdf_bytes = f.read()
 
-    return pdf_bytes
+@staff_member_required
+def template_cache_status(request):
+    """Hit/miss counters for the template and rendered-PDF caches of the worker serving this request."""
+    stats = template_cache_stats()
+    stats["pdf_cache"] = pdf_cache_stats()
+    return JsonResponse(stats)
+
+
+def document_metrics(request):
+    """
+    Per-stage timing histograms by DocumentTemplate in Prometheus text format
+    (this worker process only). Off unless DOC_METRICS_ENABLED; scrapers send
+    DOC_METRICS_TOKEN as a bearer token, otherwise a staff login is required.
+    """
+    if not getattr(settings, "DOC_METRICS_ENABLED", False):
+        raise Http404
+    token = getattr(settings, "DOC_METRICS_TOKEN", "")
+    if token:
+        if not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return HttpResponse("Unauthorized", status=401)
+    elif not (request.user.is_active and request.user.is_staff):
+        return HttpResponse("Unauthorized", status=401)
+    return HttpResponse(HISTOGRAMS.prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -7,6 +7,46 @@ python manage.py migrate --noinput
 echo "Collecting static files…"
 python manage.py collectstatic --noinput
 
+# Restart a background worker whenever it exits. If it keeps dying, stop the
+# container (SIGTERM to $$, which is Gunicorn after the exec below) so the
+# platform restarts it and the outage is visible instead of jobs silently stalling
+WORKER_RESTART_DELAY=${WORKER_RESTART_DELAY:-5}
+WORKER_MAX_RESTARTS=${WORKER_MAX_RESTARTS:-5}
+WORKER_RESTART_WINDOW=${WORKER_RESTART_WINDOW:-600}
+
+supervise() {
+  local name=$1
+  shift
+  local restarts=0 window_start=$SECONDS status
+  while true; do
+    status=0
+    "$@" || status=$?
+    if (( SECONDS - window_start > WORKER_RESTART_WINDOW )); then
+      restarts=0
+      window_start=$SECONDS
+    fi
+    restarts=$((restarts + 1))
+    if (( restarts > WORKER_MAX_RESTARTS )); then
+      echo "❌ $name exited (status $status) $restarts times in ${WORKER_RESTART_WINDOW}s; stopping the container" >&2
+      kill -TERM $$
+      return 1
+    fi
+    echo "⚠ $name exited (status $status); restart $restarts/$WORKER_MAX_RESTARTS in ${WORKER_RESTART_DELAY}s" >&2
+    sleep "$WORKER_RESTART_DELAY"
+  done
+}
+
+# Background document workers share this container's MEDIA_ROOT with the web process
+DOC_JOB_WORKERS=${DOC_JOB_WORKERS:-1}
+for i in $(seq 1 "$DOC_JOB_WORKERS"); do
+  echo "Starting document worker $i…"
+  supervise "Document worker $i" python manage.py run_document_worker &
+done
+
+# Web views queue e-mails in the outbox; this worker delivers them
+echo "Starting outbox worker…"
+supervise "Outbox worker" python manage.py drain_outbox &
+
 APP_MODULE=${APP_MODULE:-secretary.wsgi:application}
 
 echo "Starting Gunicorn…"
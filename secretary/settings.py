@@ -114,14 +114,84 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# --- Document template cache (GitHub .docx downloads) ---
+DOC_TEMPLATE_CACHE_DIR = os.getenv("DOC_TEMPLATE_CACHE_DIR", str(BASE_DIR / ".cache" / "templates"))
+DOC_TEMPLATE_CACHE_TTL = int(os.getenv("DOC_TEMPLATE_CACHE_TTL", "300"))  # seconds before revalidating
+DOC_TEMPLATE_CACHE_MAX_BYTES = int(os.getenv("DOC_TEMPLATE_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+DOC_TEMPLATE_FETCH_TIMEOUT = int(os.getenv("DOC_TEMPLATE_FETCH_TIMEOUT", "30"))
+DOC_PDF_CACHE_DIR = os.getenv("DOC_PDF_CACHE_DIR", str(BASE_DIR / ".cache" / "pdf"))
+DOC_PDF_CACHE_MAX_BYTES = int(os.getenv("DOC_PDF_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+DOC_PDF_CACHE_EVICT_INTERVAL = int(os.getenv("DOC_PDF_CACHE_EVICT_INTERVAL", "60"))  # seconds between full size checks
+DOC_PDF_CACHE_STORAGE = os.getenv("DOC_PDF_CACHE_STORAGE", "")  # dotted Storage class; default: files in DOC_PDF_CACHE_DIR
+DOC_TEMPLATE_COMPILED_CACHE_SIZE = int(os.getenv("DOC_TEMPLATE_COMPILED_CACHE_SIZE", "16"))  # parsed templates kept in memory
+
+# --- Parallel document rendering (per-director bundles) ---
+DOC_RENDER_WORKERS = int(os.getenv("DOC_RENDER_WORKERS", "4"))
+DOC_RENDER_EXECUTOR = os.getenv("DOC_RENDER_EXECUTOR", "thread")  # "thread" or "process"
+DOC_RENDER_TIMEOUT = int(os.getenv("DOC_RENDER_TIMEOUT", "60"))  # seconds per document
+
+# --- Background document jobs (run_document_worker) ---
+DOC_JOB_LEASE_SECONDS = int(os.getenv("DOC_JOB_LEASE_SECONDS", "600"))  # renewed while a job runs; retried once it lapses
+DOC_JOB_MAX_ATTEMPTS = int(os.getenv("DOC_JOB_MAX_ATTEMPTS", "3"))
+DOC_JOB_RETENTION_DAYS = int(os.getenv("DOC_JOB_RETENTION_DAYS", "7"))
+DOC_BULK_PDF_MAX_COMPANIES = int(os.getenv("DOC_BULK_PDF_MAX_COMPANIES", "200"))  # per merged-PDF bulk job
+
+# --- Bulk company import (manage.py import_companies) and streaming export ---
+BULK_IMPORT_BATCH_SIZE = int(os.getenv("BULK_IMPORT_BATCH_SIZE", "1000"))  # rows per bulk INSERT/UPDATE
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "2000"))  # rows fetched per query by the streaming export
+
+# --- Company change form: directors/shareholders beyond this many load lazily, page by page ---
+ADMIN_INLINE_LAZY_THRESHOLD = int(os.getenv("ADMIN_INLINE_LAZY_THRESHOLD", "10"))
+ADMIN_INLINE_PAGE_SIZE = int(os.getenv("ADMIN_INLINE_PAGE_SIZE", "25"))
+
+# --- Document pipeline timings (Server-Timing headers, "companies.timing" log) ---
+DOC_METRICS_ENABLED = os.getenv("DOC_METRICS_ENABLED", "False").lower() == "true"  # /metrics/ histograms
+DOC_METRICS_TOKEN = os.getenv("DOC_METRICS_TOKEN", "")  # bearer token for scrapers; staff login if empty
+
+# --- LibreOffice conversion pool (DOCX → PDF) ---
+LIBREOFFICE_POOL_SIZE = int(os.getenv("LIBREOFFICE_POOL_SIZE", "1"))  # warm soffice instances per gunicorn worker
+LIBREOFFICE_POOL_MAX_QUEUE = int(os.getenv("LIBREOFFICE_POOL_MAX_QUEUE", "8"))
+LIBREOFFICE_JOB_TIMEOUT = int(os.getenv("LIBREOFFICE_JOB_TIMEOUT", "60"))
+LIBREOFFICE_ACQUIRE_TIMEOUT = int(os.getenv("LIBREOFFICE_ACQUIRE_TIMEOUT", "60"))
+LIBREOFFICE_PYTHON = os.getenv("LIBREOFFICE_PYTHON", "")  # interpreter with python3-uno; autodetected if empty
+
+# Annual return reminders (manage.py send_reminders). REMINDER_STAGES may
+# override any default stage, e.g. {"first": {"offset_days": -45}}
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "50"))  # messages per SMTP connection
+REMINDER_RATE_PER_SECOND = float(os.getenv("REMINDER_RATE_PER_SECOND", "0"))  # 0 = no limit
+REMINDER_MAX_RETRIES = int(os.getenv("REMINDER_MAX_RETRIES", "3"))
+REMINDER_RETRY_BACKOFF = float(os.getenv("REMINDER_RETRY_BACKOFF", "2"))  # seconds, doubled per retry
+REMINDER_STAGES = {}
+REMINDER_CATCH_UP_DAYS = int(os.getenv("REMINDER_CATCH_UP_DAYS", "0"))  # resend window for missed cron days
+
 # --- Email (from environment) ---
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend")
 EMAIL_HOST = os.getenv("EMAIL_HOST", "smtp.gmail.com")
 EMAIL_PORT = int(os.getenv("EMAIL_PORT", "587"))
 EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "True").lower() == "true"
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER)
+EMAIL_TIMEOUT = int(os.getenv("EMAIL_TIMEOUT", "30"))
+EMAIL_POOL_SIZE = int(os.getenv("EMAIL_POOL_SIZE", "4"))
+EMAIL_POOL_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("EMAIL_POOL_MAX_MESSAGES_PER_CONNECTION", "100"))
+EMAIL_POOL_RATE_PER_SECOND = float(os.getenv("EMAIL_POOL_RATE_PER_SECOND", "0"))  # 0 = no limit
+EMAIL_POOL_MAX_RETRIES = int(os.getenv("EMAIL_POOL_MAX_RETRIES", "2"))
+EMAIL_POOL_IDLE_SECONDS = int(os.getenv("EMAIL_POOL_IDLE_SECONDS", "60"))  # idle connections are reopened before use
+# send_reminders and drain_outbox only: the pooled backend keeps EMAIL_POOL_SIZE SMTP
+# connections open across batches and sends concurrently (used when EMAIL_BACKEND is plain SMTP)
+REMINDER_EMAIL_BACKEND = os.getenv(
+    "REMINDER_EMAIL_BACKEND",
+    "companies.utils.smtp_pool.PooledEmailBackend"
+    if EMAIL_BACKEND == "django.core.mail.backends.smtp.EmailBackend" else EMAIL_BACKEND,
+)
+
+# Outbox for e-mails queued by web views (manage.py drain_outbox)
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", "20"))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "5"))
+EMAIL_OUTBOX_RETRY_BACKOFF = int(os.getenv("EMAIL_OUTBOX_RETRY_BACKOFF", "60"))  # seconds, doubled per attempt
+EMAIL_OUTBOX_LEASE_SECONDS = int(os.getenv("EMAIL_OUTBOX_LEASE_SECONDS", "300"))
+EMAIL_OUTBOX_BACKEND = os.getenv("EMAIL_OUTBOX_BACKEND", REMINDER_EMAIL_BACKEND)
 
 # --- Security toggles (auto-on when DEBUG=False) ---
 SECURE_SSL_REDIRECT = not DEBUG